@@ -1,2 +0,0 @@
-'namespace package'
-__import__('pkg_resources').declare_namespace(__name__)
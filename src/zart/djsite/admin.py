@@ -0,0 +1,323 @@
+'''admin site scaling to large tables
+
+Changelists of AdminSite count rows once, estimating counts of large
+tables from database statistics (SQLite: sqlite_stat1 written by
+ANALYZE; PostgreSQL: pg_class.reltuples) or caching exact counts for a
+while. They select related objects shown in list_display which Django
+does not (nullable foreign keys, "__" lookups), and page large tables
+ordered by primary key with keyset (seek) pagination instead of
+OFFSET.
+
+Settings:
+DJSITE_ADMIN_COUNT_TTL: seconds counts and estimates are cached
+(default: 60)
+DJSITE_ADMIN_EXACT_BELOW: estimates below are counted exactly
+(default: 10000)
+DJSITE_ADMIN_KEYSET_ABOVE: rows of table paged by keyset
+(default: 100000)
+'''
+import hashlib
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR, ChangeList
+from django.core.exceptions import (
+    EmptyResultSet,
+    FieldDoesNotExist,
+    ValidationError,
+)
+from django.core.paginator import Paginator
+from django.template.loader import select_template
+from django.db import DatabaseError, connections
+from django.db.models import QuerySet
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.functional import cached_property
+
+CURSOR_VAR = 'cursor'
+CHANGE_LIST_TEMPLATE = 'admin/djsite/change_list.html'
+
+
+def _setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+def _estimate(connection, table):
+    'Row count of table from database statistics, or None'
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+                )
+                if cursor.fetchone() is None:
+                    return None
+                cursor.execute(
+                    'SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table]
+                )
+                row = cursor.fetchone()
+                estimate = int(row[0].split()[0]) if row else None
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    [connection.ops.quote_name(table)],
+                )
+                row = cursor.fetchone()
+                estimate = int(row[0]) if row else None
+            else:
+                return None
+    except (DatabaseError, ValueError):
+        return None
+    return estimate if estimate and estimate > 0 else None
+
+
+def estimate_count(queryset, timeout=None):
+    '''Row count of model table from database statistics, or None.
+
+    Statistics change only with ANALYZE or autovacuum, so the estimate,
+    or lack of it, is cached for `timeout` seconds as exact counts are.
+    '''
+    from django.core.cache import cache
+
+    table = queryset.model._meta.db_table
+    key = 'djsite.admin.estimate:' + hashlib.md5(
+        (queryset.db + '.' + table).encode('utf-8')
+    ).hexdigest()
+    estimate = cache.get(key)
+    if estimate is None:
+        estimate = _estimate(connections[queryset.db], table) or 0
+        if timeout is None:
+            timeout = _setting('DJSITE_ADMIN_COUNT_TTL', 60)
+        cache.set(key, estimate, timeout)
+    return estimate or None
+
+
+def cached_count(queryset, timeout=None):
+    'Exact count of queryset, cached for `timeout` seconds'
+    from django.core.cache import cache
+
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    key = 'djsite.admin.count:' + hashlib.md5(
+        (queryset.db + sql).encode('utf-8')
+    ).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        if timeout is None:
+            timeout = _setting('DJSITE_ADMIN_COUNT_TTL', 60)
+        cache.set(key, count, timeout)
+    return count
+
+
+def unfiltered(queryset):
+    'Queryset selects all rows of its table'
+    query = queryset.query
+    return (
+        not query.where
+        and not query.distinct
+        and not query.low_mark
+        and query.high_mark is None
+    )
+
+
+class EstimatedCountPaginator(Paginator):
+    '''Paginator estimating count of large tables.
+
+    Unfiltered querysets of tables with statistics are estimated, other
+    ones counted exactly with count cached.
+    '''
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super(EstimatedCountPaginator, self).count
+        if unfiltered(queryset):
+            estimate = estimate_count(queryset)
+            if estimate is not None and estimate >= _setting(
+                'DJSITE_ADMIN_EXACT_BELOW', 10000
+            ):
+                return estimate
+        return cached_count(queryset)
+
+
+def related_path(model, name):
+    '''select_related() path of list_display entry, "" if none.
+
+    For "author" or "author__name", both are "author".
+    '''
+    opts = model._meta
+    parts = []
+    for part in name.split(LOOKUP_SEP):
+        try:
+            field = opts.get_field(part)
+        except FieldDoesNotExist:
+            break
+        if not (
+            field.is_relation
+            and field.related_model is not None
+            and (field.many_to_one or field.one_to_one)
+        ):
+            break
+        if part != field.name:  # "author_id" needs no join
+            break
+        parts.append(part)
+        opts = field.related_model._meta
+    return LOOKUP_SEP.join(parts)
+
+
+class KeysetChangeList(ChangeList):
+    '''Change list paged by primary key of last row shown.
+
+    Used when queryset is ordered by primary key only and table has at
+    least `keyset_above` rows; page number links are replaced by "next"
+    link with cursor.
+    '''
+
+    keyset = False
+    keyset_next_url = None
+    keyset_first_url = None
+
+    def get_filters_params(self, params=None):
+        params = super(KeysetChangeList, self).get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def keyset_order(self):
+        '''Primary key ordering "pk" or "-pk" of queryset, or None.
+
+        Repeated terms count once: ModelAdmin ordering "-pk" comes with
+        "-pk" added by ChangeList for deterministic order.
+        '''
+        pk = self.model._meta.pk
+        ordering = []
+        for field in self.queryset.query.order_by:
+            if isinstance(field, str):
+                name = field.lstrip('-')
+                if name in (pk.name, pk.attname):
+                    field = field[: len(field) - len(name)] + 'pk'
+            if field not in ordering:
+                ordering.append(field)
+        if ordering in (['pk'], ['-pk']):
+            return ordering[0]
+        return None
+
+    def get_results(self, request):
+        super(KeysetChangeList, self).get_results(request)
+        order = self.keyset_order()
+        if (
+            order is None
+            or self.show_all
+            or self.result_count < self.model_admin.keyset_above
+        ):
+            return
+        queryset = self.queryset
+        cursor = request.GET.get(CURSOR_VAR)
+        if cursor:
+            lookup = 'pk__lt' if order == '-pk' else 'pk__gt'
+            try:
+                queryset = queryset.filter(**{lookup: cursor})
+            except (ValueError, TypeError, ValidationError):
+                pass
+            self.keyset_first_url = self.get_query_string(
+                remove=[CURSOR_VAR, PAGE_VAR]
+            )
+        rows = list(queryset[: self.list_per_page + 1])
+        if len(rows) > self.list_per_page:
+            rows = rows[: self.list_per_page]
+            self.keyset_next_url = self.get_query_string(
+                {CURSOR_VAR: rows[-1].pk}, [PAGE_VAR]
+            )
+        self.result_list = rows
+        self.multi_page = bool(cursor) or self.keyset_next_url is not None
+        self.keyset = True
+
+
+class ScalableMixin(object):
+    '''ModelAdmin scaling to large tables.
+
+    Counts rows once, estimated for large tables, selects related
+    objects of list_display Django misses and pages large tables by
+    keyset.
+    '''
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def keyset_above(self):
+        return _setting('DJSITE_ADMIN_KEYSET_ABOVE', 100000)
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def changelist_view(self, request, extra_context=None):
+        '''Change list, with keyset links when paged by keyset.
+
+        CHANGE_LIST_TEMPLATE then extends template found as usual, so
+        per-app and per-model overrides still apply.
+        '''
+        response = super(ScalableMixin, self).changelist_view(
+            request, extra_context
+        )
+        context = getattr(response, 'context_data', None) or {}
+        if getattr(context.get('cl'), 'keyset', False):
+            names = response.template_name
+            if isinstance(names, str):
+                names = [names]
+            if CHANGE_LIST_TEMPLATE not in names:
+                context['change_list_parent'] = select_template(
+                    names
+                ).template
+                response.template_name = CHANGE_LIST_TEMPLATE
+        return response
+
+    def get_list_select_related(self, request):
+        '''Related objects of list_display, unless set explicitly.
+
+        Django selects related objects of foreign keys in list_display
+        with bare select_related(), which skips nullable ones, and does
+        not follow "__" lookups such as "author__name". Paths of all
+        related objects shown are listed only in these cases.
+        '''
+        if self.list_select_related is not False:
+            return self.list_select_related
+        related, missed = [], False
+        for name in self.get_list_display(request):
+            if not isinstance(name, str):
+                continue
+            path = related_path(self.model, name)
+            if not path:
+                continue
+            if path not in related:
+                related.append(path)
+            field = self.model._meta.get_field(path.split(LOOKUP_SEP)[0])
+            if LOOKUP_SEP in name or field.null:
+                missed = True
+        return related if missed else False
+
+
+class ModelAdmin(ScalableMixin, admin.ModelAdmin):
+    pass
+
+
+def scalable(admin_class):
+    'Subclass of ModelAdmin class with ScalableMixin'
+    if issubclass(admin_class, ScalableMixin):
+        return admin_class
+    return type(
+        admin_class.__name__,
+        (ScalableMixin, admin_class),
+        {'__module__': admin_class.__module__},
+    )
+
+
+class AdminSite(admin.AdminSite):
+    'Admin site with ScalableMixin in ModelAdmin of every model'
+
+    def register(self, model_or_iterable, admin_class=None, **options):
+        super(AdminSite, self).register(
+            model_or_iterable, scalable(admin_class or ModelAdmin), **options
+        )
@@ -0,0 +1,26 @@
+'django application config'
+from django.apps import AppConfig
+from django.conf import settings
+from django.contrib.admin import apps as admin_apps
+
+
+class DjsiteConfig(AppConfig):
+    'zart.djsite application'
+    name = 'zart.djsite'
+    label = 'djsite'
+    default = True
+
+    def ready(self):
+        from . import checks  # noqa: F401
+
+        if getattr(settings, 'DJSITE_SQLITE_TUNED', False):
+            from django.db.backends.signals import connection_created
+            from .sqlite import tune
+
+            connection_created.connect(tune, dispatch_uid='djsite.sqlite')
+
+
+class AdminConfig(admin_apps.AdminConfig):
+    'django.contrib.admin with zart.djsite.admin.AdminSite as admin.site'
+    default = False
+    default_site = 'zart.djsite.admin.AdminSite'
@@ -1,6 +1,10 @@
 'django asgi callable'
 from django.core.asgi import get_asgi_application
+from .health import HealthASGI
 from .setup import setup_settings
+from .warmup import get_application
 
 setup_settings()
-application = get_asgi_application()
+application = HealthASGI(
+    get_application(get_asgi_application, lifespan=True)
+)
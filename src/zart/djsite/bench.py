@@ -0,0 +1,438 @@
+'''in-process benchmark of django application
+
+asyncio and multiprocessing are imported when needed, they are slow to
+import and commands import this module.
+'''
+import io
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import logging
+import tempfile
+import platform
+import threading
+import tracemalloc
+
+ALLOC_REQUESTS = 50  # requests traced for allocations, single thread
+
+
+def scenarios():
+    '''Named (method, path, login, expected status) request scenarios.
+
+    Static files are served by staticfiles handler wrapped around the
+    application, as with runserver.
+    '''
+    from django.conf import settings
+
+    return {
+        'login': ('GET', '/admin/login/', False, 200),
+        'changelist': ('GET', '/admin/auth/user/', True, 200),
+        '404': ('GET', '/bench-not-found/', False, 404),
+        'static': (
+            'GET',
+            settings.STATIC_URL + 'admin/css/base.css',
+            False,
+            200,
+        ),
+    }
+
+
+def percentile(values, p):
+    'p-th percentile of sorted values, nearest rank'
+    if not values:
+        return 0.0
+    rank = int(round(p / 100.0 * len(values))) - 1
+    return values[max(0, min(len(values) - 1, rank))]
+
+
+def environ(method, path, cookie=None):
+    'Minimal WSGI environ, `path` may have query string'
+    path, _, query = path.partition('?')
+    env = {
+        'REQUEST_METHOD': method,
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': 'localhost',
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if cookie:
+        env['HTTP_COOKIE'] = cookie
+    return env
+
+
+class WSGIDriver(object):
+    'Call WSGI application directly'
+
+    def __init__(self, application):
+        self.application = application
+
+    def __call__(self, method, path, cookie=None):
+        status = []
+
+        def start_response(code, headers, exc_info=None):
+            status.append(int(code.split(None, 1)[0]))
+            return lambda data: None
+
+        env = environ(method, path, cookie)
+        result = self.application(env, start_response)
+        try:
+            for data in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0]
+
+    def run(self, calls, threads):
+        'Perform calls in threads, return (latencies, statuses)'
+        latencies, statuses = [], []
+        calls = list(calls)
+
+        def work(chunk):
+            for call in chunk:
+                start = time.perf_counter()
+                status = self(*call)
+                latencies.append(time.perf_counter() - start)
+                statuses.append(status)
+
+        workers = [
+            threading.Thread(target=work, args=(calls[i::threads],))
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return latencies, statuses
+
+
+class ASGIDriver(object):
+    'Call ASGI application directly, `threads` concurrent tasks'
+
+    def __init__(self, application):
+        self.application = application
+
+    async def call(self, method, path, cookie=None):
+        import asyncio
+
+        path, _, query = path.partition('?')
+        headers = [(b'host', b'localhost')]
+        if cookie:
+            headers.append((b'cookie', cookie.encode('latin-1')))
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode('utf-8'),
+            'query_string': query.encode('latin-1'),
+            'root_path': '',
+            'headers': headers,
+            'client': ('127.0.0.1', 0),
+            'server': ('localhost', 80),
+        }
+        status = []
+        sent = []
+
+        async def receive():
+            if not sent:
+                sent.append(True)
+                return {'type': 'http.request', 'body': b''}
+            await asyncio.Future()  # client never disconnects
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await self.application(scope, receive, send)
+        return status[0]
+
+    def __call__(self, method, path, cookie=None):
+        import asyncio
+
+        return asyncio.run(self.call(method, path, cookie))
+
+    def run(self, calls, threads):
+        import asyncio
+
+        latencies, statuses = [], []
+        calls = list(calls)
+
+        async def work(chunk):
+            for call in chunk:
+                start = time.perf_counter()
+                status = await self.call(*call)
+                latencies.append(time.perf_counter() - start)
+                statuses.append(status)
+
+        async def main():
+            await asyncio.gather(
+                *[work(calls[i::threads]) for i in range(threads)]
+            )
+
+        asyncio.run(main())
+        return latencies, statuses
+
+
+def driver(interface, static=False):
+    'Driver of zart.djsite application, `static` serves static files'
+    if interface == 'asgi':
+        from zart.djsite.asgi import application
+
+        if static:
+            from django.contrib.staticfiles.handlers import (
+                ASGIStaticFilesHandler,
+            )
+
+            application = ASGIStaticFilesHandler(application)
+        return ASGIDriver(application)
+    from zart.djsite.wsgi import application
+
+    if static:
+        from django.contrib.staticfiles.handlers import StaticFilesHandler
+
+        application = StaticFilesHandler(application)
+    return WSGIDriver(application)
+
+
+def allocations(drive, call, requests=ALLOC_REQUESTS):
+    '''Peak traced bytes and retained blocks per request.
+
+    Retained blocks are those allocated by requests and still alive
+    after them, counted at sites where live blocks grew, from tracemalloc
+    snapshots; blocks freed elsewhere do not offset them.
+    '''
+    drive(*call)  # exclude first request caches
+    tracemalloc.start()
+    try:
+        peak = 0
+        before = tracemalloc.take_snapshot()
+        for i in range(requests):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            drive(*call)
+            peak += tracemalloc.get_traced_memory()[1] - current
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    blocks = sum(
+        diff.count_diff
+        for diff in after.filter_traces(ignore).compare_to(
+            before.filter_traces(ignore), 'lineno'
+        )
+        if diff.count_diff > 0
+    )
+    return peak / requests, blocks / float(requests)
+
+
+def bench_caches(directory):
+    '''CACHES setting with cache files moved into `directory`.
+
+    Runs neither write into the developer's cache nor start warm with
+    entries left by earlier runs.
+    '''
+    from django.conf import settings
+    from django.core.cache.backends.filebased import FileBasedCache
+    from django.utils.module_loading import import_string
+    from zart.djsite.cache import SQLiteCache
+
+    caches = copy.deepcopy(settings.CACHES)
+    for alias, config in caches.items():
+        backend = import_string(config['BACKEND'])
+        if issubclass(backend, SQLiteCache):
+            config['LOCATION'] = os.path.join(directory, alias + '.sqlite3')
+        elif issubclass(backend, FileBasedCache):
+            config['LOCATION'] = os.path.join(directory, alias)
+    return caches
+
+
+def _quiet():
+    '''Do not log "Not Found" warnings of 404 scenario, errors still are.
+
+    Called once application is loaded, its setup configures logging.
+    '''
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+
+
+def _process(args):
+    'Benchmark worker process'
+    interface, database, caches, name, call, requests, threads = args
+    from zart.djsite.setup import setup_settings
+
+    setup_settings()
+    import django
+    from django.conf import settings
+    from django.db import connections
+    from django.test.utils import override_settings
+
+    django.setup()
+    settings.DATABASES['default']['NAME'] = database
+    connections['default'].settings_dict['NAME'] = database
+    override_settings(CACHES=caches).enable()
+    drive = driver(interface, name == 'static')
+    _quiet()
+    drive(*call)  # warm up
+    start = time.perf_counter()
+    latencies, statuses = drive.run([call] * requests, threads)
+    return time.perf_counter() - start, latencies, statuses
+
+
+def run(
+    names=None,
+    requests=1000,
+    threads=4,
+    processes=1,
+    interface='wsgi',
+    log=None,
+):
+    '''Run scenarios against test database, return results dict.
+
+    Test database and cache files are created in temporary directory
+    and destroyed here, so that worker processes share them.
+    '''
+    from zart.djsite.setup import setup_settings
+
+    setup_settings()
+    import django
+    from django.conf import settings
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import override_settings
+    from multiprocessing import Pool
+
+    django.setup()
+    available = scenarios()
+    names = names or sorted(available)
+    directory = tempfile.mkdtemp()
+    test = settings.DATABASES['default'].setdefault('TEST', {})
+    test['NAME'] = os.path.join(directory, 'bench.sqlite3')
+    caches = bench_caches(directory)
+    isolated = override_settings(CACHES=caches)
+    isolated.enable()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'interface': interface,
+            'requests': requests,
+            'threads': threads,
+            'processes': processes,
+            'caches': dict(
+                (alias, config['BACKEND']) for alias, config in caches.items()
+            ),
+        },
+        'scenarios': {},
+    }
+    try:
+        user = get_user_model().objects.create_superuser(
+            'bench', 'bench@example.com', 'bench'
+        )
+        client = Client()
+        client.force_login(user)
+        cookie = '; '.join(
+            '%s=%s' % (key, morsel.value)
+            for key, morsel in client.cookies.items()
+        )
+        database = connection.settings_dict['NAME']
+        connection.close()
+        pool = Pool(processes) if processes > 1 else None
+        for name in names:
+            method, path, login, expected = available[name]
+            call = (method, path, cookie if login else None)
+            if log:
+                log('Running %s: %s %s' % (name, method, path))
+            args = (
+                interface,
+                database,
+                caches,
+                name,
+                call,
+                requests // processes,
+                threads,
+            )
+            if pool is None:
+                parts = [_process(args)]
+            else:
+                parts = pool.map(_process, [args] * processes)
+            elapsed = max(part[0] for part in parts)
+            latencies = sorted(sum((part[1] for part in parts), []))
+            statuses = sum((part[2] for part in parts), [])
+            drive = driver(interface, name == 'static')
+            _quiet()
+            alloc, blocks = allocations(drive, call)
+            results['scenarios'][name] = {
+                'requests': len(latencies),
+                'errors': sum(status != expected for status in statuses),
+                'rps': len(latencies) / elapsed,
+                'p50': percentile(latencies, 50) * 1000,
+                'p95': percentile(latencies, 95) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'alloc_kb': alloc / 1024.0,
+                'retained_blocks': blocks,
+            }
+        if pool is not None:
+            pool.close()
+            pool.join()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        isolated.disable()  # closes caches
+        shutil.rmtree(directory)
+    return results
+
+
+def save(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, tolerance=0.1):
+    '''Compare results with baseline.
+
+    Returns list of (scenario, metric, old, new, regressed) for req/s
+    and latency percentiles; regressed when worse by more than
+    `tolerance` fraction.
+    '''
+    out = []
+    for name, new in sorted(results['scenarios'].items()):
+        old = baseline.get('scenarios', {}).get(name)
+        if old is None:
+            continue
+        for metric, higher_better in (
+            ('rps', True),
+            ('p50', False),
+            ('p95', False),
+            ('p99', False),
+        ):
+            a, b = old[metric], new[metric]
+            if higher_better:
+                regressed = b < a * (1 - tolerance)
+            else:
+                regressed = b > a * (1 + tolerance)
+            out.append((name, metric, a, b, regressed))
+    return out
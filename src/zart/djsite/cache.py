@@ -0,0 +1,276 @@
+'cache backends and helpers'
+import os
+import time
+import pickle
+import sqlite3
+import threading
+from collections import Counter, OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from .sqlite import pragmas
+
+MISSING = object()
+
+
+def default_path():
+    'DJSITE_CACHE_PATH setting, or cache.sqlite3 in current directory'
+    from django.conf import settings
+
+    return getattr(settings, 'DJSITE_CACHE_PATH', None) or 'cache.sqlite3'
+
+
+class SQLiteCache(BaseCache):
+    '''Cache in SQLite file, shared by all worker processes.
+
+    Connections are per thread and process, in WAL mode, so readers do
+    not wait for writers. Expired entries are culled every
+    `CULL_EVERY` writes when there are more than `MAX_ENTRIES`.
+    '''
+
+    CULL_EVERY = 100
+
+    def __init__(self, location, params):
+        super(SQLiteCache, self).__init__(params)
+        self.path = os.path.abspath(location or default_path())
+        self.local = threading.local()
+        self.stats = Counter()
+        self.writes = 0
+
+    @property
+    def connection(self):
+        'Connection of current thread and process'
+        pid, connection = getattr(self.local, 'connection', (None, None))
+        if pid != os.getpid():
+            connection = sqlite3.connect(
+                self.path, timeout=5.0, isolation_level=None
+            )
+            for statement in pragmas():
+                connection.execute(statement)
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache '
+                '(key TEXT PRIMARY KEY, value BLOB, expires REAL)'
+            )
+            self.local.connection = os.getpid(), connection
+        return connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version)
+        self.validate_key(key)
+        return key
+
+    def _dumps(self, value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def get(self, key, default=None, version=None):
+        row = self.connection.execute(
+            'SELECT value FROM cache WHERE key=? '
+            'AND (expires IS NULL OR expires>?)',
+            (self._key(key, version), time.time()),
+        ).fetchone()
+        if row is None:
+            self.stats['misses'] += 1
+            return default
+        self.stats['hits'] += 1
+        return pickle.loads(row[0])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.connection.execute(
+            'INSERT OR REPLACE INTO cache VALUES (?, ?, ?)',
+            (
+                self._key(key, version),
+                self._dumps(value),
+                self.get_backend_timeout(timeout),
+            ),
+        )
+        self._wrote()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.connection.execute(
+            'INSERT INTO cache VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE '
+            'SET value=excluded.value, expires=excluded.expires '
+            'WHERE cache.expires IS NOT NULL AND cache.expires<=?',
+            (
+                self._key(key, version),
+                self._dumps(value),
+                self.get_backend_timeout(timeout),
+                time.time(),
+            ),
+        )
+        self._wrote()
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        cursor = self.connection.execute(
+            'UPDATE cache SET expires=? WHERE key=? '
+            'AND (expires IS NULL OR expires>?)',
+            (
+                self.get_backend_timeout(timeout),
+                self._key(key, version),
+                time.time(),
+            ),
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        cursor = self.connection.execute(
+            'DELETE FROM cache WHERE key=?', (self._key(key, version),)
+        )
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def _wrote(self):
+        self.writes += 1
+        if self.writes % self.CULL_EVERY == 0:
+            self.cull()
+
+    def cull(self):
+        'Remove expired entries, then every CULL_FREQUENCY-th if too many'
+        connection = self.connection
+        connection.execute(
+            'DELETE FROM cache WHERE expires<=?', (time.time(),)
+        )
+        count = connection.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count > self._max_entries and not self._cull_frequency:
+            connection.execute('DELETE FROM cache')
+        elif count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+
+class TieredCache(BaseCache):
+    '''Small in-process LRU in front of shared cache.
+
+    LOCATION is alias of shared cache. Values are kept locally for
+    `LOCAL_TTL` seconds at most, so changes made by other processes are
+    seen that late. Up to `LOCAL_SIZE` least recently used entries are
+    kept, pickled, so cached objects are never shared between callers.
+    '''
+
+    def __init__(self, location, params):
+        super(TieredCache, self).__init__(params)
+        options = params.get('OPTIONS', {})
+        self.alias = location or 'shared'
+        self.local_ttl = float(options.get('LOCAL_TTL', 5))
+        self.local_size = int(options.get('LOCAL_SIZE', 1000))
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _remember(self, key, value, timeout=None):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        ttl = self.local_ttl
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        with self.lock:
+            self.local[key] = data, time.time() + ttl
+            self.local.move_to_end(key)
+            while len(self.local) > self.local_size:
+                self.local.popitem(last=False)
+
+    def _forget(self, key):
+        with self.lock:
+            self.local.pop(key, None)
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_key(key, version)
+        with self.lock:
+            item = self.local.get(local_key)
+            if item is not None:
+                if item[1] > time.time():
+                    self.local.move_to_end(local_key)
+                else:
+                    del self.local[local_key]
+                    item = None
+        if item is not None:
+            self.stats['local_hits'] += 1
+            return pickle.loads(item[0])
+        value = self.shared.get(key, MISSING, version)
+        if value is MISSING:
+            self.stats['misses'] += 1
+            return default
+        self.stats['shared_hits'] += 1
+        self._remember(local_key, value)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        self.shared.set(key, value, timeout, version)
+        if timeout == 0:
+            self._forget(self.make_key(key, version))
+        else:
+            self._remember(self.make_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        added = self.shared.add(key, value, timeout, version)
+        if added and timeout != 0:
+            self._remember(self.make_key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._forget(self.make_key(key, version))
+        return self.shared.delete(key, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def clear(self):
+        with self.lock:
+            self.local.clear()
+        self.shared.clear()
+
+
+def cache_view(timeout=300, alias='default', key_prefix=None):
+    'Decorator caching whole responses of a view'
+    from django.views.decorators.cache import cache_page
+
+    return cache_page(timeout, cache=alias, key_prefix=key_prefix)
+
+
+def fragment(name, render, timeout=DEFAULT_TIMEOUT, vary_on=(), alias=None):
+    '''Cached result of `render()`.
+
+    Keys are the same as of {% cache timeout name vary_on... %} template
+    tag, so fragments may be filled from code and templates alike.
+    '''
+    from django.conf import settings
+    from django.core.cache.utils import make_template_fragment_key
+
+    if alias is None:
+        alias = (
+            'template_fragments'
+            if 'template_fragments' in settings.CACHES
+            else 'default'
+        )
+    key = make_template_fragment_key(name, vary_on)
+    return caches[alias].get_or_set(key, render, timeout)
+
+
+def stats():
+    'Hit/miss counters of this process, by cache alias'
+    from django.conf import settings
+
+    return dict(
+        (alias, dict(caches[alias].stats))
+        for alias in settings.CACHES
+        if hasattr(caches[alias], 'stats')
+    )
@@ -0,0 +1,200 @@
+'''deployment checks of settings hurting performance
+
+Registered with "performance" tag for deployment only, run with::
+
+    djsite check --deploy --tag performance
+'''
+from django.conf import settings
+from django.core import checks
+from django.utils.module_loading import import_string
+
+TAG = 'performance'
+CACHED_LOADER = 'django.template.loaders.cached.Loader'
+GZIP = 'django.middleware.gzip.GZipMiddleware'
+CONDITIONAL_GET = 'django.middleware.http.ConditionalGetMiddleware'
+DUMMY_CACHE = 'django.core.cache.backends.dummy.DummyCache'
+TIMING = 'zart.djsite.middleware.TimingMiddleware'
+
+
+def _loaders(loaders):
+    'Names of template loaders, cached ones included'
+    for loader in loaders:
+        if isinstance(loader, (tuple, list)):
+            yield loader[0]
+        else:
+            yield loader
+
+
+def staticfiles_backend():
+    'Class of staticfiles storage, from settings only'
+    storages = getattr(settings, 'STORAGES', None)
+    if storages and 'staticfiles' in storages:
+        path = storages['staticfiles']['BACKEND']
+    else:
+        path = getattr(
+            settings,
+            'STATICFILES_STORAGE',
+            'django.contrib.staticfiles.storage.StaticFilesStorage',
+        )
+    return import_string(path)
+
+
+@checks.register(TAG, deploy=True)
+def check_debug(app_configs, **kwargs):
+    if settings.DEBUG:
+        return [
+            checks.Warning(
+                'DEBUG keeps every SQL query in memory and disables caching '
+                'of templates.',
+                hint='Set DJSITE_PROFILE=production.',
+                id='djsite.W001',
+            )
+        ]
+    return []
+
+
+@checks.register(TAG, deploy=True)
+def check_templates(app_configs, **kwargs):
+    errors = []
+    for engine in settings.TEMPLATES:
+        if not engine['BACKEND'].endswith('.DjangoTemplates'):
+            continue
+        options = engine.get('OPTIONS', {})
+        loaders = options.get('loaders')
+        if loaders and CACHED_LOADER not in _loaders(loaders):
+            errors.append(
+                checks.Warning(
+                    'Templates are read and compiled on every render.',
+                    hint='Wrap loaders with %s.' % CACHED_LOADER,
+                    obj=engine.get('NAME', engine['BACKEND']),
+                    id='djsite.W002',
+                )
+            )
+        if options.get('debug'):
+            errors.append(
+                checks.Warning(
+                    'Template debug option records source of every node.',
+                    obj=engine.get('NAME', engine['BACKEND']),
+                    id='djsite.W003',
+                )
+            )
+    return errors
+
+
+@checks.register(TAG, checks.Tags.database, deploy=True)
+def check_databases(app_configs, **kwargs):
+    errors = []
+    for alias, database in settings.DATABASES.items():
+        if not database.get('CONN_MAX_AGE'):
+            errors.append(
+                checks.Warning(
+                    'Database connection is opened for every request.',
+                    hint='Set CONN_MAX_AGE for persistent connections.',
+                    obj=alias,
+                    id='djsite.W004',
+                )
+            )
+        if database.get('ENGINE', '').endswith('sqlite3') and not getattr(
+            settings, 'DJSITE_SQLITE_TUNED', False
+        ):
+            errors.append(
+                checks.Warning(
+                    'SQLite runs with rollback journal, writers block '
+                    'readers of other workers.',
+                    hint='Set DJSITE_SQLITE_TUNED for WAL journal.',
+                    obj=alias,
+                    id='djsite.W005',
+                )
+            )
+    return errors
+
+
+@checks.register(TAG, checks.Tags.staticfiles, deploy=True)
+def check_staticfiles(app_configs, **kwargs):
+    from django.contrib.staticfiles.storage import ManifestFilesMixin
+
+    if not issubclass(staticfiles_backend(), ManifestFilesMixin):
+        return [
+            checks.Warning(
+                'Static file names are not hashed, clients revalidate them '
+                'instead of caching them for long.',
+                hint='Use zart.djsite.storage.'
+                'GzipManifestStaticFilesStorage.',
+                id='djsite.W006',
+            )
+        ]
+    return []
+
+
+@checks.register(TAG, deploy=True)
+def check_middleware(app_configs, **kwargs):
+    errors = []
+    middleware = list(settings.MIDDLEWARE)
+    if GZIP not in middleware:
+        errors.append(
+            checks.Warning(
+                'Responses are sent uncompressed.',
+                hint='Add %s, or enable dynamic compression of front-end.'
+                % GZIP,
+                id='djsite.W007',
+            )
+        )
+    if CONDITIONAL_GET not in middleware:
+        errors.append(
+            checks.Warning(
+                'Unchanged responses are sent again in full.',
+                hint='Add %s.' % CONDITIONAL_GET,
+                id='djsite.W008',
+            )
+        )
+    elif GZIP in middleware and middleware.index(
+        CONDITIONAL_GET
+    ) < middleware.index(GZIP):
+        errors.append(
+            checks.Warning(
+                'ETag is computed on compressed content, so it differs '
+                'between gzip and identity responses.',
+                hint='Put %s after %s.' % (CONDITIONAL_GET, GZIP),
+                id='djsite.W009',
+            )
+        )
+    if TIMING in middleware:
+        sample = float(getattr(settings, 'DJSITE_TIMING_SAMPLE', 1.0))
+        if sample >= 1.0:
+            errors.append(
+                checks.Warning(
+                    'Every request is timed and its queries recorded.',
+                    hint='Lower DJSITE_TIMING_SAMPLE.',
+                    id='djsite.W010',
+                )
+            )
+    return errors
+
+
+@checks.register(TAG, checks.Tags.caches, deploy=True)
+def check_caches(app_configs, **kwargs):
+    errors = []
+    for alias, cache in settings.CACHES.items():
+        if cache['BACKEND'] == DUMMY_CACHE:
+            errors.append(
+                checks.Warning(
+                    'Cache does not store anything.',
+                    obj=alias,
+                    id='djsite.W011',
+                )
+            )
+    return errors
+
+
+@checks.register(TAG, deploy=True)
+def check_warmup(app_configs, **kwargs):
+    if not getattr(settings, 'DJSITE_WARMUP', False):
+        return [
+            checks.Info(
+                'First request of every worker builds URL resolver and '
+                'compiles templates.',
+                hint='Set DJSITE_WARMUP.',
+                id='djsite.I001',
+            )
+        ]
+    return []
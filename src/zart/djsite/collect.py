@@ -0,0 +1,231 @@
+'''incremental, parallel collection of static files
+
+Collected files are recorded in a manifest, with source size and
+modification time and SHA-256 of content. Sources with unchanged stat
+are not read at all, changed ones are hashed and copied only when their
+content differs, in a thread pool. On the same filesystem files are
+hardlinked instead of copied. Files collected before whose sources are
+gone, and outputs of post-processing not produced again, are removed.
+'''
+import os
+import json
+import time
+import shutil
+import hashlib
+
+CHUNK = 1 << 20
+MANIFEST_VERSION = 1
+
+
+def digest(path):
+    'SHA-256 of file content, hex'
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def manifest_path(root):
+    'Default manifest, next to `root` so that it is not served'
+    root = os.path.normpath(os.path.abspath(root))
+    return os.path.join(
+        os.path.dirname(root), '.%s.collect.json' % os.path.basename(root)
+    )
+
+
+def found_files(ignore_patterns=None):
+    '''{name: (storage, path)} of static files found by finders.
+
+    First file of every name wins, as with collectstatic.
+    '''
+    from django.contrib.staticfiles.finders import get_finders
+
+    found = {}
+    for finder in get_finders():
+        for path, storage in finder.list(ignore_patterns or []):
+            prefix = getattr(storage, 'prefix', None)
+            name = os.path.join(prefix, path) if prefix else path
+            name = name.replace(os.sep, '/')
+            if name not in found:
+                found[name] = (storage, path)
+    return found
+
+
+class Collector(object):
+    '''Synchronize `root` with static files found.
+
+    `stats` counts files found, unchanged, copied, linked, removed and
+    post-processed, and bytes copied; `timings` has seconds per phase.
+    '''
+
+    def __init__(self, root, manifest=None, jobs=None, link=True, log=None):
+        self.root = os.path.abspath(root)
+        self.manifest = manifest or manifest_path(self.root)
+        self.jobs = jobs or min(32, (os.cpu_count() or 1) * 4)
+        self.link = link
+        self.log = log or (lambda message: None)
+        self.stats = dict.fromkeys(
+            (
+                'found',
+                'unchanged',
+                'copied',
+                'linked',
+                'removed',
+                'post_processed',
+                'bytes',
+            ),
+            0,
+        )
+        self.timings = {}
+
+    def load(self):
+        if not os.path.exists(self.manifest):
+            return {}, []
+        with open(self.manifest) as f:
+            data = json.load(f)
+        if data.get('version') != MANIFEST_VERSION:
+            return {}, []
+        return data['files'], data['generated']
+
+    def save(self, files, generated):
+        tmp = self.manifest + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(
+                {
+                    'version': MANIFEST_VERSION,
+                    'files': files,
+                    'generated': sorted(generated),
+                },
+                f,
+                indent=0,
+                sort_keys=True,
+            )
+        os.replace(tmp, self.manifest)
+
+    def target(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def place(self, source, target):
+        'Hardlink or copy source to target, return True if linked'
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = target + '.collect.tmp'
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        linked = False
+        if self.link:
+            try:
+                os.link(source, tmp)
+                linked = True
+            except OSError:  # other filesystem or not supported
+                self.link = False
+        if not linked:
+            shutil.copy2(source, tmp)
+        os.replace(tmp, target)
+        return linked
+
+    def sync(self, name, source, old):
+        'Bring target of one file up to date, return (entry, action)'
+        st = os.stat(source)
+        target = self.target(name)
+        try:
+            size = os.stat(target).st_size
+        except OSError:
+            size = None
+        entry = {
+            'source': source,
+            'size': st.st_size,
+            'mtime': st.st_mtime_ns,
+        }
+        if old and size == st.st_size:
+            if old['size'] == st.st_size and old['mtime'] == st.st_mtime_ns:
+                entry['hash'] = old['hash']
+                return entry, 'unchanged'
+            entry['hash'] = digest(source)
+            if entry['hash'] == old['hash']:
+                return entry, 'unchanged'
+        else:
+            entry['hash'] = digest(source)
+        return entry, 'linked' if self.place(source, target) else 'copied'
+
+    def remove(self, names):
+        for name in names:
+            target = self.target(name)
+            try:
+                os.remove(target)
+            except FileNotFoundError:
+                continue
+            self.stats['removed'] += 1
+            directory = os.path.dirname(target)
+            while directory != self.root:
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    break
+                directory = os.path.dirname(directory)
+
+    def post_process(self, storage, found):
+        'Post-process with staticfiles storage, return names generated'
+        generated = set()
+        process = getattr(storage, 'post_process', None)
+        if process is None:
+            return generated
+        for original, processed, done in process(found, dry_run=False):
+            if isinstance(done, Exception):
+                raise done
+            if done and processed and processed != original:
+                generated.add(processed.replace(os.sep, '/'))
+                self.stats['post_processed'] += 1
+        manifest_name = getattr(storage, 'manifest_name', None)
+        if manifest_name:
+            generated.add(manifest_name)
+        return generated
+
+    def phase(self, name, start):
+        now = time.perf_counter()
+        self.timings[name] = now - start
+        return now
+
+    def run(self, found, storage=None):
+        '''Collect `found` files, return stats.
+
+        `found` is {name: (storage, path)}; `storage` post-processes
+        them when anything changed.
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+
+        start = time.perf_counter()
+        files, generated = self.load()
+        start = self.phase('load', start)
+        entries = {}
+        with ThreadPoolExecutor(self.jobs) as pool:
+            futures = [
+                (
+                    name,
+                    pool.submit(
+                        self.sync, name, source.path(path), files.get(name)
+                    ),
+                )
+                for name, (source, path) in sorted(found.items())
+            ]
+            for name, future in futures:
+                entry, action = future.result()
+                entries[name] = entry
+                self.stats[action] += 1
+                if action != 'unchanged':
+                    self.stats['bytes'] += entry['size']
+                    self.log('%s %s' % (action.capitalize(), name))
+        self.stats['found'] = len(found)
+        start = self.phase('copy', start)
+        stale = set(files) - set(entries)
+        self.remove(sorted(stale))
+        changed = bool(stale) or self.stats['unchanged'] < len(entries)
+        start = self.phase('remove', start)
+        if storage is not None and (changed or not files):
+            new = self.post_process(storage, found)
+            self.remove(sorted(set(generated) - new - set(entries)))
+            generated = new
+            start = self.phase('post_process', start)
+        self.save(entries, generated)
+        self.phase('save', start)
+        return self.stats
@@ -0,0 +1,184 @@
+'''liveness and readiness endpoints answered before django handler
+
+Probes of load balancers never reach request handling, so no
+middleware, URL resolving or session is involved, and ALLOWED_HOSTS
+does not apply. Readiness checks database connections and caches, and
+its result is reused for a short time.
+
+Settings:
+DJSITE_HEALTH_LIVE: liveness path (default: /healthz)
+DJSITE_HEALTH_READY: readiness path (default: /readyz)
+DJSITE_HEALTH_TTL: seconds readiness result is reused (default: 5.0)
+DJSITE_HEALTH_DATABASES: database aliases checked (default: all)
+DJSITE_HEALTH_CACHES: cache aliases checked (default: all)
+'''
+import json
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+PROBE_KEY = 'djsite.health'
+HEADERS = [
+    ('Content-Type', 'application/json'),
+    ('Cache-Control', 'no-store'),
+]
+
+
+def _setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+class Readiness(object):
+    '''Database and cache reachability, checked at most once per `ttl`.
+
+    While one thread checks, others get the previous result instead of
+    waiting.
+    '''
+
+    def __init__(self, ttl=None, databases=None, caches=None):
+        from django.conf import settings
+
+        self.ttl = float(
+            _setting('DJSITE_HEALTH_TTL', 5.0) if ttl is None else ttl
+        )
+        if databases is None:
+            databases = _setting('DJSITE_HEALTH_DATABASES', None)
+        if caches is None:
+            caches = _setting('DJSITE_HEALTH_CACHES', None)
+        self.databases = list(
+            settings.DATABASES if databases is None else databases
+        )
+        self.caches = list(settings.CACHES if caches is None else caches)
+        self.lock = threading.Lock()
+        self.failed = None
+        self.expires = 0.0
+
+    def fresh(self):
+        'Failed checks of result still valid, None if stale'
+        if time.monotonic() < self.expires:
+            return self.failed
+        return None
+
+    def __call__(self):
+        'Names of failed checks'
+        failed = self.fresh()
+        if failed is not None:
+            return failed
+        if not self.lock.acquire(blocking=self.failed is None):
+            return self.failed
+        try:
+            failed = self.fresh()
+            if failed is None:
+                failed = self.check()
+                self.failed = failed
+                self.expires = time.monotonic() + self.ttl
+            return failed
+        finally:
+            self.lock.release()
+
+    def check(self):
+        from django.core.cache import caches
+        from django.db import close_old_connections, connections
+
+        failed = []
+        for alias in self.databases:
+            try:
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SELECT 1')
+            except Exception as e:
+                logger.warning('Database %s is not ready: %s', alias, e)
+                failed.append('database:' + alias)
+        # no request_finished signal, close connections as it would
+        close_old_connections()
+        for alias in self.caches:
+            try:
+                caches[alias].get(PROBE_KEY)
+            except Exception as e:
+                logger.warning('Cache %s is not ready: %s', alias, e)
+                failed.append('cache:' + alias)
+        return failed
+
+
+class Health(object):
+    'Paths and responses of health endpoints'
+
+    def __init__(self, readiness=None):
+        self.live = _setting('DJSITE_HEALTH_LIVE', '/healthz')
+        self.ready = _setting('DJSITE_HEALTH_READY', '/readyz')
+        self.readiness = readiness or Readiness()
+
+    def response(self, failed):
+        'Status code and body'
+        if failed:
+            body = {'status': 'unavailable', 'failed': failed}
+            return 503, json.dumps(body).encode('ascii')
+        return 200, b'{"status": "ok"}'
+
+
+class HealthWSGI(Health):
+    'WSGI application wrapper answering health probes'
+
+    def __init__(self, application, readiness=None):
+        super(HealthWSGI, self).__init__(readiness)
+        self.application = application
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO')
+        if path == self.live:
+            failed = []
+        elif path == self.ready:
+            failed = self.readiness()
+        else:
+            return self.application(environ, start_response)
+        code, body = self.response(failed)
+        start_response(
+            '200 OK' if code == 200 else '503 Service Unavailable',
+            HEADERS + [('Content-Length', str(len(body)))],
+        )
+        return [b''] if environ['REQUEST_METHOD'] == 'HEAD' else [body]
+
+
+class HealthASGI(Health):
+    '''ASGI application wrapper answering health probes.
+
+    Stale readiness is checked in a worker thread, fresh one is answered
+    on event loop.
+    '''
+
+    def __init__(self, application, readiness=None):
+        super(HealthASGI, self).__init__(readiness)
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path') if scope['type'] == 'http' else None
+        if path == self.live:
+            failed = []
+        elif path == self.ready:
+            failed = self.readiness.fresh()
+            if failed is None:
+                from asgiref.sync import sync_to_async
+
+                failed = await sync_to_async(
+                    self.readiness, thread_sensitive=False
+                )()
+        else:
+            return await self.application(scope, receive, send)
+        code, body = self.response(failed)
+        headers = [
+            (name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in HEADERS
+        ]
+        headers.append((b'content-length', str(len(body)).encode('ascii')))
+        await send(
+            {'type': 'http.response.start', 'status': code, 'headers': headers}
+        )
+        await send(
+            {
+                'type': 'http.response.body',
+                'body': b'' if scope['method'] == 'HEAD' else body,
+            }
+        )
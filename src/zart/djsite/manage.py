@@ -16,7 +16,7 @@ def main():
     _fix_argv()
     setup_settings()
     try:
-        from django.core.management import execute_from_command_line
+        from zart.djsite.registry import execute_from_command_line
     except ImportError:
         warnings.warn(
             "Couldn't import Django. Are you sure it's installed and "
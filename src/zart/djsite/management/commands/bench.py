@@ -0,0 +1,162 @@
+'bench command'
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy as _
+from zart.djsite import bench
+
+
+class Command(BaseCommand):
+    'Benchmark WSGI or ASGI application in-process.'
+    help = __doc__
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'scenarios',
+            nargs='*',
+            metavar='SCENARIO',
+            help=_('Scenarios to run: changelist, login, static, 404.'),
+        )
+        parser.add_argument(
+            '-n',
+            '--requests',
+            type=int,
+            default=1000,
+            help=_('Requests per scenario (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '-t',
+            '--threads',
+            type=int,
+            default=4,
+            help=_(
+                'Threads (ASGI: tasks) per process (default: %(default)s).'
+            ),
+        )
+        parser.add_argument(
+            '-p',
+            '--processes',
+            type=int,
+            default=1,
+            help=_('Worker processes (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '--asgi',
+            dest='interface',
+            action='store_const',
+            const='asgi',
+            default='wsgi',
+            help=_('Drive ASGI application instead of WSGI one.'),
+        )
+        parser.add_argument(
+            '--save',
+            metavar='PATH',
+            help=_('Write results as JSON.'),
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='PATH',
+            help=_('Compare with JSON results of baseline run.'),
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.1,
+            help=_(
+                'Fraction by which results may be worse than baseline '
+                '(default: %(default)s).'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        'Perform command'
+        verbose = options['verbosity']
+        write = self.stdout.write
+        names = options['scenarios']
+        unknown = set(names) - set(bench.scenarios())
+        if unknown:
+            raise CommandError(
+                _('Unknown scenarios: %s') % ', '.join(sorted(unknown))
+            )
+        baseline = None
+        if options['compare']:
+            if not os.path.exists(options['compare']):
+                raise CommandError(
+                    _('Baseline "%s" does not exist.') % options['compare']
+                )
+            baseline = bench.load(options['compare'])
+
+        results = bench.run(
+            names,
+            requests=options['requests'],
+            threads=options['threads'],
+            processes=options['processes'],
+            interface=options['interface'],
+            log=write if verbose > 1 else None,
+        )
+
+        if verbose > 0:
+            write(
+                '{:<12} {:>6} {:>9} {:>8} {:>8} {:>8} {:>9} {:>8}'.format(
+                    'scenario',
+                    'errors',
+                    'req/s',
+                    'p50 ms',
+                    'p95 ms',
+                    'p99 ms',
+                    'alloc KB',
+                    'retained',
+                ),
+                self.style.MIGRATE_HEADING,
+            )
+            for name, r in sorted(results['scenarios'].items()):
+                write(
+                    '{:<12} {:>6} {:>9.1f} {:>8.2f} {:>8.2f} {:>8.2f} '
+                    '{:>9.1f} {:>8.1f}'.format(
+                        name,
+                        r['errors'],
+                        r['rps'],
+                        r['p50'],
+                        r['p95'],
+                        r['p99'],
+                        r['alloc_kb'],
+                        r['retained_blocks'],
+                    ),
+                    self.style.ERROR if r['errors'] else None,
+                )
+        if options['save']:
+            bench.save(results, options['save'])
+            if verbose > 1:
+                write(_('Saved "%s".') % options['save'], self.style.SUCCESS)
+
+        if baseline is None:
+            return
+        for key in ('interface', 'processes', 'threads', 'caches'):
+            old = baseline.get('meta', {}).get(key)
+            new = results['meta'][key]
+            if old != new and verbose > 0:
+                write(
+                    _('Baseline %s is %s, not %s; results may differ.')
+                    % (key, old, new),
+                    self.style.WARNING,
+                )
+        regressions = 0
+        for name, metric, old, new, regressed in bench.compare(
+            results, baseline, options['tolerance']
+        ):
+            regressions += regressed
+            if verbose > 0:
+                write(
+                    '{:<12} {:<4} {:>9.2f} -> {:>9.2f} {:>+7.1f}%'.format(
+                        name,
+                        metric,
+                        old,
+                        new,
+                        (new - old) * 100.0 / old if old else 0.0,
+                    ),
+                    self.style.ERROR if regressed else self.style.SUCCESS,
+                )
+        if regressions:
+            raise CommandError(
+                _('%d metrics regressed beyond tolerance.') % regressions
+            )
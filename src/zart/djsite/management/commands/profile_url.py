@@ -0,0 +1,173 @@
+'profile_url command'
+import io
+import pstats
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy as _
+from zart.djsite import profiling
+from zart.djsite.bench import percentile
+
+SQL_LENGTH = 100  # characters of query shown
+
+
+class Command(BaseCommand):
+    'Profile request to URL in-process: time, SQL, calls, allocations.'
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help=_('URL path with optional query string.')
+        )
+        parser.add_argument(
+            '--method',
+            default='GET',
+            type=str.upper,
+            help=_('HTTP method (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '--user',
+            metavar='USERNAME',
+            help=_('Send request logged in as user.'),
+        )
+        parser.add_argument(
+            '-n',
+            '--repeat',
+            type=int,
+            default=10,
+            help=_('Requests in every pass (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '-o',
+            '--output',
+            default='profile',
+            metavar='PREFIX',
+            help=_(
+                'Write PREFIX.pstats and PREFIX.callgrind '
+                '(default: %(default)s).'
+            ),
+        )
+        parser.add_argument(
+            '--sort',
+            default='cumulative',
+            choices=sorted(pstats.Stats.sort_arg_dict_default),
+            help=_('Order of functions shown (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=20,
+            help=_(
+                'Functions, queries and sites of retained memory shown '
+                '(default: %(default)s).'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        'Perform command'
+        verbose = options['verbosity']
+        write = self.stdout.write
+        repeat = max(1, options['repeat'])
+        top = options['top']
+        path = options['path']
+        if not path.startswith('/'):
+            raise CommandError(_('Path must start with "/".'))
+        cookie = None
+        if options['user']:
+            from django.contrib.auth import get_user_model
+
+            try:
+                cookie = profiling.login_cookie(options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(
+                    _('User "%s" does not exist.') % options['user']
+                )
+        drive = profiling.driver()
+        call = (options['method'], path, cookie)
+        status = drive(*call)  # warm up, excluded
+        if verbose > 0:
+            write(
+                '%s %s: %d' % (options['method'], path, status),
+                self.style.ERROR if status >= 500 else self.style.SUCCESS,
+            )
+
+        latencies, timing = profiling.timed(drive, call, repeat)
+        latencies.sort()
+        total = sum(latencies)
+        if verbose > 0:
+            write(
+                _(
+                    'Requests: %d, ms: min %.2f, p50 %.2f, max %.2f; '
+                    'SQL: %.1f queries, %.2fms (%.0f%%) per request'
+                )
+                % (
+                    repeat,
+                    latencies[0] * 1000,
+                    percentile(latencies, 50) * 1000,
+                    latencies[-1] * 1000,
+                    timing.queries / float(repeat),
+                    timing.db * 1000 / repeat,
+                    timing.db * 100.0 / total if total else 0.0,
+                )
+            )
+            queries = sorted(
+                timing.sql_time.items(), key=lambda item: item[1], reverse=True
+            )
+            if queries:
+                write(
+                    '{:>7} {:>9} {:>6}  {}'.format(
+                        'count', 'ms', '%', 'query'
+                    ),
+                    self.style.MIGRATE_HEADING,
+                )
+            for sql, elapsed in queries[:top]:
+                write(
+                    '{:>7.1f} {:>9.2f} {:>6.1f}  {}'.format(
+                        timing.sql[sql] / float(repeat),
+                        elapsed * 1000 / repeat,
+                        elapsed * 100.0 / total if total else 0.0,
+                        ' '.join(sql.split())[:SQL_LENGTH],
+                    )
+                )
+
+        profile = profiling.profiled(drive, call, repeat)
+        stats = pstats.Stats(profile)
+        output = options['output']
+        stats.dump_stats(output + '.pstats')
+        profiling.write_callgrind(stats, output + '.callgrind')
+        if verbose > 0:
+            buf = io.StringIO()
+            stats.stream = buf
+            stats.strip_dirs()
+            stats.sort_stats(options['sort'])
+            stats.print_stats(top)
+            write(buf.getvalue().strip('\n'))
+            write(
+                _('Wrote %(output)s.pstats and %(output)s.callgrind')
+                % {'output': output},
+                self.style.SUCCESS,
+            )
+
+        peak, retained = profiling.allocated(drive, call, repeat)
+        if verbose > 0:
+            write(
+                _('Allocations: peak %.1f KB per request, %.1f KB retained')
+                % (
+                    peak / 1024.0,
+                    sum(diff.size_diff for diff in retained) / 1024.0,
+                )
+            )
+            grown = [diff for diff in retained if diff.size_diff > 0]
+            if grown:
+                write(
+                    _('Retained memory by site, growth over all requests:'),
+                    self.style.MIGRATE_HEADING,
+                )
+            for diff in grown[:top]:
+                frame = diff.traceback[0]
+                write(
+                    '{:>9.1f} KB {:>7} blocks  {}:{}'.format(
+                        diff.size_diff / 1024.0,
+                        diff.count_diff,
+                        frame.filename,
+                        frame.lineno,
+                    )
+                )
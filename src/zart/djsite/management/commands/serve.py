@@ -0,0 +1,107 @@
+'serve command'
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy as _
+
+
+def _int(name, default):
+    return int(os.getenv(name) or default)
+
+
+class Command(BaseCommand):
+    'Serve WSGI application with pre-forked worker processes.'
+    help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-b',
+            '--bind',
+            default=os.getenv('DJSITE_BIND', '127.0.0.1:8000'),
+            help=_(
+                'Address, "host:port" or "unix:/path" (default: %(default)s).'
+            ),
+        )
+        parser.add_argument(
+            '-w',
+            '--workers',
+            type=int,
+            default=_int('DJSITE_WORKERS', os.cpu_count() or 1),
+            help=_('Worker processes (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '-t',
+            '--threads',
+            type=int,
+            default=_int('DJSITE_THREADS', 1),
+            help=_('Threads per worker (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '--max-requests',
+            type=int,
+            default=_int('DJSITE_MAX_REQUESTS', 0),
+            help=_('Restart worker after N requests, 0 never.'),
+        )
+        parser.add_argument(
+            '--max-requests-jitter',
+            type=int,
+            default=_int('DJSITE_MAX_REQUESTS_JITTER', 0),
+            help=_('Add random 0-N to max requests of every worker.'),
+        )
+        parser.add_argument(
+            '--keep-alive',
+            type=float,
+            default=5.0,
+            metavar='SECONDS',
+            help=_('Idle keep-alive connection timeout (default: 5).'),
+        )
+        parser.add_argument(
+            '--graceful-timeout',
+            type=float,
+            default=30.0,
+            metavar='SECONDS',
+            help=_('Time for workers to finish requests (default: 30).'),
+        )
+        parser.add_argument(
+            '--no-reuseport',
+            dest='reuseport',
+            action='store_false',
+            help=_('Do not set SO_REUSEPORT on listening socket.'),
+        )
+
+    def handle(self, *args, **options):
+        'Perform command'
+        if not hasattr(os, 'fork'):
+            raise CommandError(
+                _('Platform without fork() is not supported, use iisexpress.')
+            )
+        from django.core.servers.basehttp import get_internal_wsgi_application
+        from django.db import connections
+        from zart.djsite.server import Arbiter
+
+        verbose = options['verbosity']
+        write = self.stdout.write
+
+        def log(message):
+            if verbose > 0:
+                write(message)
+                self.stdout.flush()
+
+        # workers open connections of their own
+        connections.close_all()
+        arbiter = Arbiter(
+            get_internal_wsgi_application,
+            options['bind'],
+            workers=options['workers'],
+            threads=options['threads'],
+            max_requests=options['max_requests'],
+            max_requests_jitter=options['max_requests_jitter'],
+            keep_alive=options['keep_alive'],
+            graceful_timeout=options['graceful_timeout'],
+            reuseport=options['reuseport'],
+            log=log,
+        )
+        try:
+            arbiter.run()
+        except OSError as e:
+            raise CommandError(e)
+        log(_('Done'))
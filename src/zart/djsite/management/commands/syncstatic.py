@@ -0,0 +1,115 @@
+'syncstatic command'
+import os
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy as _
+from zart.djsite import collect
+
+
+class Command(BaseCommand):
+    'Collect changed static files into STATIC_ROOT, in parallel.'
+    help = __doc__
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=int(
+                os.getenv('DJSITE_COLLECT_JOBS')
+                or getattr(settings, 'DJSITE_COLLECT_JOBS', 0)
+            ),
+            help=_('Copy N files at once (default: 4 per CPU).'),
+        )
+        parser.add_argument(
+            '--no-link',
+            dest='link',
+            action='store_false',
+            help=_('Always copy, never hardlink files.'),
+        )
+        parser.add_argument(
+            '--no-post-process',
+            dest='post_process',
+            action='store_false',
+            help=_('Do not post-process files with staticfiles storage.'),
+        )
+        parser.add_argument(
+            '-i',
+            '--ignore',
+            action='append',
+            default=[],
+            dest='ignore_patterns',
+            metavar='PATTERN',
+            help=_('Ignore files matching glob-style pattern.'),
+        )
+        parser.add_argument(
+            '--no-default-ignore',
+            action='store_false',
+            dest='use_default_ignore_patterns',
+            help=_('Do not ignore "CVS", ".*" and "*~".'),
+        )
+        parser.add_argument(
+            '--manifest',
+            metavar='PATH',
+            help=_(
+                'Manifest of collected files (default: next to '
+                'STATIC_ROOT).'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        'Perform command'
+        from django.apps import apps
+        from django.contrib.staticfiles.storage import staticfiles_storage
+
+        verbose = options['verbosity']
+        write = self.stdout.write
+        root = getattr(staticfiles_storage, 'location', None)
+        if not root:
+            raise CommandError(
+                _(
+                    'Staticfiles storage has no local location, set '
+                    'STATIC_ROOT or use collectstatic.'
+                )
+            )
+        ignore_patterns = options['ignore_patterns']
+        if options['use_default_ignore_patterns']:
+            ignore_patterns += apps.get_app_config(
+                'staticfiles'
+            ).ignore_patterns
+        collector = collect.Collector(
+            root,
+            manifest=options['manifest'],
+            jobs=options['jobs'],
+            link=options['link'],
+            log=write if verbose > 1 else None,
+        )
+        start = time.perf_counter()
+        found = collect.found_files(ignore_patterns)
+        collector.phase('find', start)
+        stats = collector.run(
+            found, staticfiles_storage if options['post_process'] else None
+        )
+        if verbose > 0:
+            write(
+                _(
+                    '%(found)d found, %(unchanged)d unchanged, '
+                    '%(copied)d copied, %(linked)d linked, %(removed)d '
+                    'removed, %(post_processed)d post-processed'
+                )
+                % stats
+            )
+            write(
+                _('%.1f MB in %.2fs (%s)')
+                % (
+                    stats['bytes'] / 1e6,
+                    sum(collector.timings.values()),
+                    ', '.join(
+                        '%s %.2fs' % item
+                        for item in collector.timings.items()
+                    ),
+                ),
+                self.style.SUCCESS,
+            )
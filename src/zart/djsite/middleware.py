@@ -0,0 +1,192 @@
+'''request timing and database query instrumentation
+
+Put TimingMiddleware first in MIDDLEWARE for total time and database
+queries, or wrap the whole list for time spent in every middleware::
+
+    MIDDLEWARE = timed([...])
+
+which adds Mark after every middleware. Only sampled requests are
+measured, other ones pass through untouched.
+'''
+import time
+import random
+import logging
+from contextlib import ExitStack
+
+logger = logging.getLogger(__name__)
+
+TIMING = __name__ + '.TimingMiddleware'
+MARK = __name__ + '.Mark'
+SQL_LENGTH = 200  # characters of duplicate query logged
+
+
+def timed(middleware):
+    'Middleware list instrumented for per-middleware timing'
+    out = [TIMING]
+    for path in middleware:
+        if path not in (TIMING, MARK):
+            out += [path, MARK]
+    return out
+
+
+def _setting(name, default):
+    from django.conf import settings
+
+    return getattr(settings, name, default)
+
+
+class Timing(object):
+    'Measurements of one request'
+
+    __slots__ = (
+        'start',
+        'inbound',
+        'outbound',
+        'queries',
+        'db',
+        'sql',
+        'sql_time',
+    )
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.inbound = []
+        self.outbound = {}
+        self.queries = 0
+        self.db = 0.0
+        self.sql = {}
+        self.sql_time = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        'Database execute wrapper'
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.db += elapsed
+            self.queries += 1
+            self.sql[sql] = self.sql.get(sql, 0) + 1
+            self.sql_time[sql] = self.sql_time.get(sql, 0.0) + elapsed
+
+    def layers(self, names, end):
+        'Own time of every middleware entered and of view, in seconds'
+        inbound = [self.start] + self.inbound
+        outbound = [end] + [
+            self.outbound.get(i) for i in range(len(self.inbound))
+        ]
+        out = []
+        for i, name in enumerate(names):
+            if i + 1 < len(inbound):  # called next layer
+                out.append(
+                    (
+                        name,
+                        inbound[i + 1]
+                        - inbound[i]
+                        + outbound[i]
+                        - outbound[i + 1],
+                    )
+                )
+            elif i < len(inbound):  # returned response itself
+                out.append((name, outbound[i] - inbound[i]))
+        if len(inbound) == len(names) + 1:
+            out.append(('view', outbound[-1] - inbound[-1]))
+        return out
+
+    def duplicates(self, threshold):
+        'Queries run at least `threshold` times, most frequent first'
+        return sorted(
+            ((n, sql) for sql, n in self.sql.items() if n >= threshold),
+            reverse=True,
+        )
+
+
+class Mark(object):
+    'Record time when request enters and response leaves next layer'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = getattr(request, '_timing', None)
+        if timing is None:
+            return self.get_response(request)
+        i = len(timing.inbound)
+        timing.inbound.append(time.perf_counter())
+        response = self.get_response(request)
+        timing.outbound[i] = time.perf_counter()
+        return response
+
+
+class TimingMiddleware(object):
+    '''Measure sampled requests.
+
+    Settings:
+    DJSITE_TIMING_SAMPLE: fraction of requests measured (default: 1.0)
+    DJSITE_TIMING_SLOW: seconds, slower requests are logged (default: 1.0)
+    DJSITE_TIMING_DUPLICATES: repeats of query logged as duplicate
+    (default: 5)
+    DJSITE_TIMING_HEADER: send Server-Timing header (default: DEBUG)
+    '''
+
+    def __init__(self, get_response):
+        from django.conf import settings
+
+        self.get_response = get_response
+        self.sample = float(_setting('DJSITE_TIMING_SAMPLE', 1.0))
+        self.slow = float(_setting('DJSITE_TIMING_SLOW', 1.0))
+        self.threshold = int(_setting('DJSITE_TIMING_DUPLICATES', 5))
+        self.header = _setting('DJSITE_TIMING_HEADER', settings.DEBUG)
+        middleware = list(settings.MIDDLEWARE)
+        self.names = []
+        if MARK in middleware and TIMING in middleware:
+            self.names = [
+                path.rpartition('.')[2]
+                for path in middleware[middleware.index(TIMING) + 1 :]
+                if path != MARK
+            ]
+
+    def __call__(self, request):
+        if self.sample < 1.0 and random.random() >= self.sample:
+            return self.get_response(request)
+        from django.db import connections
+
+        request._timing = timing = Timing()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing))
+            response = self.get_response(request)
+        end = time.perf_counter()
+        total = end - timing.start
+        layers = timing.layers(self.names, end) if self.names else []
+        if self.header:
+            metrics = ['total;dur=%.1f' % (total * 1000)]
+            metrics.append(
+                'db;dur=%.1f;desc="%d queries"'
+                % (timing.db * 1000, timing.queries)
+            )
+            metrics.extend(
+                '%s;dur=%.1f' % (name, elapsed * 1000)
+                for name, elapsed in layers
+            )
+            response['Server-Timing'] = ', '.join(metrics)
+        if total >= self.slow:
+            self.log(request, response, timing, total, layers)
+        return response
+
+    def log(self, request, response, timing, total, layers):
+        'Log slow request'
+        parts = ['%d queries %.1fms' % (timing.queries, timing.db * 1000)]
+        parts.extend(
+            '%s %.1fms' % (name, elapsed * 1000) for name, elapsed in layers
+        )
+        for n, sql in timing.duplicates(self.threshold):
+            parts.append('%dx "%s"' % (n, sql[:SQL_LENGTH]))
+        logger.warning(
+            'Slow request %s %s %d in %.1fms: %s',
+            request.method,
+            request.get_full_path(),
+            response.status_code,
+            total * 1000,
+            ', '.join(parts),
+        )
@@ -0,0 +1,121 @@
+'''in-process profiling of single request
+
+Request is repeated in three passes, so that instruments do not distort
+each other: timed with SQL queries recorded, under cProfile, and under
+tracemalloc.
+'''
+import time
+import cProfile
+import tracemalloc
+from contextlib import ExitStack
+from .bench import WSGIDriver
+from .middleware import Timing
+
+ALLOC_FRAMES = 1  # traceback depth of allocation sites
+
+
+def login_cookie(username):
+    'Cookie header of new session logged in as user'
+    from django.contrib.auth import get_user_model
+    from django.test import Client
+
+    User = get_user_model()
+    user = User._default_manager.get_by_natural_key(username)
+    client = Client()
+    client.force_login(user)
+    return '; '.join(
+        '%s=%s' % (key, morsel.value) for key, morsel in client.cookies.items()
+    )
+
+
+def driver():
+    'Driver of zart.djsite WSGI application'
+    from zart.djsite.wsgi import application
+
+    return WSGIDriver(application)
+
+
+def timed(drive, call, repeat):
+    '''Wall time of every request and Timing of all requests.
+
+    Timing has database time and count, time and count by SQL.
+    '''
+    from django.db import connections
+
+    timing = Timing()
+    latencies = []
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timing))
+        for i in range(repeat):
+            start = time.perf_counter()
+            drive(*call)
+            latencies.append(time.perf_counter() - start)
+    return latencies, timing
+
+
+def profiled(drive, call, repeat):
+    'cProfile.Profile of requests'
+    profile = cProfile.Profile()
+    for i in range(repeat):
+        profile.runcall(drive, *call)
+    return profile
+
+
+def allocated(drive, call, repeat, frames=ALLOC_FRAMES):
+    '''Peak bytes of request and memory retained, by site.
+
+    Retained memory is tracemalloc StatisticDiff list, of allocations
+    made by requests and not freed after them, largest first.
+    '''
+    tracemalloc.start(frames)
+    try:
+        before = tracemalloc.take_snapshot()
+        peak = 0
+        for i in range(repeat):
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            drive(*call)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    after = after.filter_traces(ignore)
+    before = before.filter_traces(ignore)
+    key = 'lineno' if frames == 1 else 'traceback'
+    return peak, after.compare_to(before, key)
+
+
+def _label(func):
+    filename, line, name = func
+    if filename == '~':  # built-in
+        return '~', name
+    return filename, '%s:%d' % (name, line)
+
+
+def write_callgrind(stats, filename):
+    'Write pstats.Stats in callgrind format, costs in microseconds'
+    callees = {}
+    for func, (cc, nc, tt, ct, callers) in stats.stats.items():
+        for caller, value in callers.items():
+            callees.setdefault(caller, []).append((func, value))
+    with open(filename, 'w') as f:
+        f.write('# callgrind format\nversion: 1\ncreator: djsite\n')
+        f.write('events: Microseconds\n\n')
+        for func, (cc, nc, tt, ct, callers) in sorted(stats.stats.items()):
+            fl, fn = _label(func)
+            f.write('fl=%s\nfn=%s\n%d %d\n' % (fl, fn, func[1], tt * 1e6))
+            for callee, value in sorted(callees.get(func, ())):
+                # cProfile records (cc, nc, tt, ct) or call count only
+                calls, cost = (
+                    (value[1], value[3])
+                    if isinstance(value, tuple)
+                    else (value, 0)
+                )
+                cfl, cfn = _label(callee)
+                f.write(
+                    'cfl=%s\ncfn=%s\ncalls=%d %d\n%d %d\n'
+                    % (cfl, cfn, calls, callee[1], func[1], cost * 1e6)
+                )
+            f.write('\n')
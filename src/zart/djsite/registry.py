@@ -0,0 +1,151 @@
+'''cached registry of management commands
+
+Finding commands needs django set up, importing every app of
+INSTALLED_APPS, and lists their management/commands directories. Names
+found are cached in a JSON file, valid while Django version,
+INSTALLED_APPS and modification times of those directories do not
+change, so that "djsite <command> --help" and "djsite help <command>"
+are answered without setting django up, untranslated.
+
+Environment:
+DJSITE_COMMAND_CACHE: cache file, empty to disable (default:
+commands.json in __pycache__ of this package)
+
+Saving is best effort: where the package directory is read-only, as
+site-packages often is, nothing is cached and commands are found by
+setting django up, as without this module.
+'''
+import os
+import json
+import django
+from django.core.management import (
+    ManagementUtility as BaseManagementUtility,
+    get_commands,
+    load_command_class,
+)
+
+CACHE_VERSION = 1
+
+
+def cache_path():
+    'Cache file, or None if disabled'
+    path = os.getenv('DJSITE_COMMAND_CACHE')
+    if path is None:
+        path = os.path.join(
+            os.path.dirname(__file__), '__pycache__', 'commands.json'
+        )
+    return path or None
+
+
+def _key():
+    from django.conf import settings
+
+    return [CACHE_VERSION, django.get_version(), list(settings.INSTALLED_APPS)]
+
+
+def _stat(directories):
+    mtimes = {}
+    for path in directories:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except OSError:
+            mtimes[path] = None
+    return mtimes
+
+
+def load():
+    '{command: app name} of valid cache, or None'
+    path = cache_path()
+    if path is None:
+        return None
+    try:
+        with open(path) as f:
+            cache = json.load(f)
+        if cache['key'] != _key() or cache['mtimes'] != _stat(
+            cache['mtimes']
+        ):
+            return None
+        return cache['commands']
+    except Exception:  # missing, corrupt, or settings not configured
+        return None
+
+
+def save(commands):
+    'Cache {command: app name} found by get_commands(), once set up'
+    from django.apps import apps
+    from django.core import management
+
+    path = cache_path()
+    if path is None or not apps.ready:
+        return
+    directories = [os.path.join(management.__path__[0], 'commands')]
+    directories.extend(
+        os.path.join(config.path, 'management', 'commands')
+        for config in apps.get_app_configs()
+    )
+    cache = {
+        'key': _key(),
+        'mtimes': _stat(directories),
+        'commands': commands,
+    }
+    tmp = '%s.%d.tmp' % (path, os.getpid())
+    # best effort, cache is skipped if it cannot be written
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp, 'w') as f:
+            json.dump(cache, f)
+        os.replace(tmp, path)
+    except (OSError, TypeError, ValueError):  # e.g. read-only install
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+class ManagementUtility(BaseManagementUtility):
+    '''ManagementUtility looking commands up in cache.
+
+    Help of single command is printed without setting django up; if
+    that fails, e.g. command needs app registry, it is run as usual.
+    '''
+
+    def help_subcommand(self):
+        'Command of "<command> --help" or "help <command>", or None'
+        args = self.argv[1:]
+        if len(args) != 2:
+            return None
+        if args[0] == 'help' and not args[1].startswith('-'):
+            return args[1]
+        if args[1] in ('-h', '--help') and not args[0].startswith('-'):
+            return args[0]
+        return None
+
+    def execute(self):
+        subcommand = self.help_subcommand()
+        if subcommand is not None:
+            app_name = (load() or {}).get(subcommand)
+            if app_name is not None:
+                from django.conf import settings
+
+                try:
+                    command = load_command_class(app_name, subcommand)
+                    # loading translations needs app registry, help is
+                    # printed untranslated (and so is fallback below)
+                    settings.USE_I18N = False
+                    command.print_help(self.prog_name, subcommand)
+                    return
+                except Exception:
+                    pass
+        super(ManagementUtility, self).execute()
+
+    def fetch_command(self, subcommand):
+        app_name = (load() or {}).get(subcommand)
+        if app_name is not None:
+            return load_command_class(app_name, subcommand)
+        save(get_commands())
+        return super(ManagementUtility, self).fetch_command(subcommand)
+
+
+def execute_from_command_line(argv=None):
+    'Run ManagementUtility'
+    ManagementUtility(argv).execute()
@@ -0,0 +1,555 @@
+'''pre-forking HTTP/1.1 WSGI server for POSIX hosts
+
+Master process binds the address and forks workers, which load the
+application and serve connections from the shared listening socket.
+Master keeps the socket, so connections queue up while workers restart.
+With SO_REUSEPORT, a new master may bind the same address before the old
+one exits. Each worker serves requests with a thread pool and accepts
+connections only while one of its threads is free, so others are left
+to idle workers; kept-alive connections wait for next request in a
+selector, not in a thread.
+
+Signals to master: HUP starts new workers and stops old ones gracefully
+(new workers import modules master has not imported again, restart
+master to reload settings); TERM stops gracefully, INT at once.
+'''
+import os
+import sys
+import time
+import errno
+import random
+import signal
+import socket
+import selectors
+import threading
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import unquote_to_bytes
+
+BACKLOG = 1024
+MAX_LINE = 65536
+REUSEPORT = hasattr(socket, 'SO_REUSEPORT') and sys.platform.startswith(
+    'linux'
+)
+
+
+def bind(address, reuseport=False):
+    'Listening socket for "host:port" or "unix:/path"'
+    if address.startswith('unix:'):
+        path = address[5:]
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+    else:
+        host, _, port = address.rpartition(':')
+        host = host.strip('[]') or '127.0.0.1'
+        family = socket.AF_INET6 if ':' in host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if reuseport and REUSEPORT:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, int(port)))
+    sock.listen(BACKLOG)
+    return sock
+
+
+class Input(object):
+    'Request body, limited to Content-Length'
+
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.left = length
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.left:
+            size = self.left
+        data = self.rfile.read(size) if size else b''
+        self.left -= len(data)
+        return data
+
+    def readline(self, size=-1):
+        if size is None or size < 0 or size > self.left:
+            size = self.left
+        data = self.rfile.readline(size) if size else b''
+        self.left -= len(data)
+        return data
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def drain(self):
+        'Skip unread body, so next request on connection can be read'
+        while self.left:
+            if not self.read(min(self.left, 1 << 16)):
+                return False
+        return True
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''HTTP/1.1 request handler calling WSGI application.
+
+    Unlike BaseHTTPRequestHandler, it does not serve connection on
+    creation: serve() handles requests until connection is idle.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'djsite'
+
+    def __init__(self, request, client_address, server):
+        self.request = request
+        self.client_address = client_address
+        self.server = server
+        self.setup()
+
+    def log_message(self, format, *args):
+        pass
+
+    def serve(self):
+        'Handle buffered requests, return whether connection is kept'
+        while True:
+            self.close_connection = True
+            self.handle_one_request()
+            if self.close_connection:
+                return False
+            if not self.buffered():
+                return True
+
+    def buffered(self):
+        'Next request, or part of it, is already read or received'
+        sock = self.connection
+        timeout = sock.gettimeout()
+        sock.settimeout(0)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            sock.settimeout(timeout)
+
+    def close(self):
+        try:
+            self.finish()
+        except OSError:
+            pass
+        try:
+            self.connection.close()
+        except OSError:
+            pass
+
+    def handle_one_request(self):
+        try:
+            self.raw_requestline = self.rfile.readline(MAX_LINE + 1)
+        except (socket.timeout, OSError):
+            self.close_connection = True
+            return
+        if len(self.raw_requestline) > MAX_LINE:
+            self.send_error(414)
+            return
+        if not self.raw_requestline:
+            self.close_connection = True
+            return
+        if not self.parse_request():
+            return
+        self.server.count()
+        if self.server.stopping:
+            self.close_connection = True  # announced by response headers
+        self.run_wsgi()
+        self.wfile.flush()
+        if self.server.stopping:
+            self.close_connection = True
+
+    def content_length(self):
+        'Request body length, None if Content-Length is not valid'
+        values = set()
+        for header in self.headers.get_all('Content-Length') or ():
+            values.update(value.strip() for value in header.split(','))
+        if not values:
+            return 0
+        value = values.pop()
+        # repeated header must not conflict, or body would be ambiguous
+        if values or not (value.isascii() and value.isdigit()):
+            return None
+        return int(value)
+
+    def environ(self, length):
+        env = dict(self.server.base_environ)
+        path, _, query = self.path.partition('?')
+        env['REQUEST_METHOD'] = self.command
+        env['PATH_INFO'] = unquote_to_bytes(path).decode('latin-1')
+        env['QUERY_STRING'] = query
+        env['SERVER_PROTOCOL'] = self.request_version
+        address = self.client_address
+        env['REMOTE_ADDR'] = address[0] if address else ''
+        for name, value in self.headers.items():
+            if '_' in name:
+                continue  # would be mistaken for header with "-"
+            key = name.upper().replace('-', '_')
+            if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                key = 'HTTP_' + key
+            if key in env and key.startswith('HTTP_'):
+                value = env[key] + ',' + value
+            env[key] = value
+        env['wsgi.input'] = Input(self.rfile, length)
+        env['wsgi.errors'] = sys.stderr
+        return env
+
+    def run_wsgi(self):
+        length = self.content_length()
+        if length is None:
+            self.send_error(400, 'Bad Content-Length')
+            self.close_connection = True
+            return
+        env = self.environ(length)
+        if 'chunked' in env.get('HTTP_TRANSFER_ENCODING', '').lower():
+            self.send_error(411)  # chunked request body is not supported
+            self.close_connection = True
+            return
+        state = {}
+        head = self.command == 'HEAD'
+
+        def start_response(status, headers, exc_info=None):
+            if exc_info:
+                try:
+                    if state.get('sent'):
+                        raise exc_info[1].with_traceback(exc_info[2])
+                finally:
+                    exc_info = None
+            state['status'], state['headers'] = status, headers
+            return write
+
+        def send_headers():
+            code, _, reason = state['status'].partition(' ')
+            headers = state['headers']
+            names = set(name.lower() for name, value in headers)
+            chunked = False
+            if 'content-length' not in names and not head:
+                if self.request_version == 'HTTP/1.1':
+                    chunked = True
+                    headers = headers + [('Transfer-Encoding', 'chunked')]
+                else:
+                    self.close_connection = True
+            self.send_response(int(code), reason)
+            for name, value in headers:
+                self.send_header(name, value)
+            if self.close_connection:
+                self.send_header('Connection', 'close')
+            self.end_headers()
+            state['sent'], state['chunked'] = True, chunked
+
+        def write(data):
+            if not state.get('sent'):
+                send_headers()
+            if head or not data:
+                return
+            if state['chunked']:
+                self.wfile.write(b'%x\r\n' % len(data) + data + b'\r\n')
+            else:
+                self.wfile.write(data)
+
+        try:
+            result = self.server.application(env, start_response)
+            try:
+                for data in result:
+                    write(data)
+                if not state.get('sent'):
+                    send_headers()
+                if state['chunked']:
+                    self.wfile.write(b'0\r\n\r\n')
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except (socket.timeout, ConnectionError):
+            self.close_connection = True
+            return
+        except Exception:
+            traceback.print_exc()
+            self.close_connection = True
+            if not state.get('sent'):
+                self.send_error(500)
+            return
+        if not env['wsgi.input'].drain():
+            self.close_connection = True
+
+
+class Worker(object):
+    'Serve connections until stopped or `max_requests` served'
+
+    def __init__(self, listener, application, threads=1, max_requests=0):
+        self.listener = listener
+        self.application = application
+        self.threads = threads
+        self.max_requests = max_requests
+        self.requests = 0
+        self.stopping = False
+        self.lock = threading.Lock()
+        address = listener.getsockname()
+        if isinstance(address, tuple):
+            host, port = address[:2]
+        else:  # unix socket path
+            host, port = '', ''
+        self.base_environ = {
+            'SERVER_NAME': str(host or 'localhost'),
+            'SERVER_PORT': str(port),
+            'SCRIPT_NAME': '',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.multithread': threads > 1,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+            if self.max_requests and self.requests >= self.max_requests:
+                self.stopping = True
+
+    def handle(self, handler):
+        'Serve connection in pool thread, then free the thread'
+        keep = False
+        try:
+            keep = handler.serve() and not self.stopping
+        except Exception:
+            pass
+        finally:
+            self.slots.release()
+        if keep:
+            self.idle.append(handler)
+            try:
+                self.wakeup.send(b'\0')
+            except OSError:
+                pass
+        else:
+            handler.close()
+
+    def serve(self, keep_alive=5.0):
+        '''Accept connections and read idle ones while a thread is free.
+
+        A thread slot is taken before waiting, and handed over with the
+        connection which becomes readable.
+        '''
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        self.listener.setblocking(False)
+        self.slots = threading.Semaphore(self.threads)
+        self.idle = deque()  # handlers of kept connections, from threads
+        waiting = {}  # socket: (handler, deadline)
+        wakeup, self.wakeup = socket.socketpair()
+        wakeup.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(self.listener, selectors.EVENT_READ)
+        selector.register(wakeup, selectors.EVENT_READ)
+        pool = ThreadPoolExecutor(self.threads)
+        slot = False
+        try:
+            while not self.stopping:
+                if not slot:
+                    slot = self.slots.acquire(timeout=1.0)
+                    if not slot:
+                        continue
+                now = time.monotonic()
+                while self.idle:
+                    handler = self.idle.popleft()
+                    waiting[handler.connection] = handler, now + keep_alive
+                    selector.register(
+                        handler.connection, selectors.EVENT_READ
+                    )
+                for key, mask in selector.select(timeout=1.0):
+                    sock = key.fileobj
+                    if not slot:
+                        break  # readable again on next select
+                    if sock is wakeup:
+                        try:
+                            wakeup.recv(4096)
+                        except OSError:
+                            pass
+                        continue
+                    if sock is self.listener:
+                        try:
+                            conn, address = self.listener.accept()
+                        except OSError as e:
+                            # taken by another worker
+                            if e.errno in (
+                                errno.EAGAIN,
+                                errno.EWOULDBLOCK,
+                                errno.EINTR,
+                                errno.ECONNABORTED,
+                            ):
+                                continue
+                            raise
+                        conn.settimeout(keep_alive)
+                        if conn.family != getattr(socket, 'AF_UNIX', None):
+                            # headers and body are separate writes, do
+                            # not delay the latter until ACK
+                            conn.setsockopt(
+                                socket.IPPROTO_TCP, socket.TCP_NODELAY, 1
+                            )
+                        handler = Handler(conn, address, self)
+                    else:
+                        selector.unregister(sock)
+                        handler = waiting.pop(sock)[0]
+                    pool.submit(self.handle, handler)
+                    slot = False
+                now = time.monotonic()
+                for sock, (handler, deadline) in list(waiting.items()):
+                    if deadline <= now:
+                        selector.unregister(sock)
+                        del waiting[sock]
+                        handler.close()
+        finally:
+            self.listener.close()
+            pool.shutdown(wait=True)
+            for handler, deadline in waiting.values():
+                handler.close()
+            for handler in self.idle:
+                handler.close()
+            selector.close()
+            wakeup.close()
+            self.wakeup.close()
+
+    def stop(self):
+        self.stopping = True
+
+
+class Arbiter(object):
+    'Fork and supervise workers'
+
+    def __init__(
+        self,
+        load,
+        address,
+        workers=None,
+        threads=1,
+        max_requests=0,
+        max_requests_jitter=0,
+        keep_alive=5.0,
+        graceful_timeout=30.0,
+        reuseport=REUSEPORT,
+        log=None,
+    ):
+        self.load = load
+        self.address = address
+        self.workers = workers or os.cpu_count() or 1
+        self.threads = threads
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.keep_alive = keep_alive
+        self.graceful_timeout = graceful_timeout
+        self.reuseport = reuseport
+        self.log = log or (lambda message: None)
+        self.children = {}  # pid: generation
+        self.generation = 0
+        self.signals = []
+        self.listener = None
+
+    def run(self):
+        'Serve until TERM or INT, return exit code'
+        self.listener = bind(self.address, self.reuseport)
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, self.signal)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        self.log(
+            'Listening on %s, %d workers, %d threads each%s'
+            % (
+                self.address,
+                self.workers,
+                self.threads,
+                ', SO_REUSEPORT' if self.reuseport else '',
+            )
+        )
+        self.spawn()
+        try:
+            while True:
+                while self.signals:
+                    signum = self.signals.pop(0)
+                    if signum == signal.SIGHUP:
+                        self.log('Reloading workers')
+                        self.generation += 1
+                        old = list(self.children)
+                        self.spawn()
+                        self.kill(old, signal.SIGTERM)
+                    else:
+                        graceful = signum == signal.SIGTERM
+                        self.stop(graceful)
+                        return 0
+                self.reap()
+                self.spawn()
+                time.sleep(0.2)
+        finally:
+            if self.listener is not None:
+                self.listener.close()
+
+    def signal(self, signum, frame):
+        self.signals.append(signum)
+
+    def spawn(self):
+        'Fork workers missing from current generation'
+        current = [
+            pid for pid, gen in self.children.items() if gen == self.generation
+        ]
+        for i in range(self.workers - len(current)):
+            pid = os.fork()
+            if pid:
+                self.children[pid] = self.generation
+                continue
+            code = 0
+            try:
+                self.work()
+            except Exception:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+
+    def work(self):
+        'Worker process body'
+        for signum in (signal.SIGHUP, signal.SIGTERM, signal.SIGCHLD):
+            signal.signal(signum, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        max_requests = self.max_requests
+        if max_requests and self.max_requests_jitter:
+            max_requests += random.randint(0, self.max_requests_jitter)
+        worker = Worker(
+            self.listener, self.load(), self.threads, max_requests
+        )
+        worker.serve(self.keep_alive)
+
+    def reap(self):
+        'Collect exited workers'
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            generation = self.children.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if code and generation == self.generation:
+                self.log('Worker %d exited with code %d' % (pid, code))
+                time.sleep(1.0)  # do not spin on failing imports
+
+    def kill(self, pids, signum):
+        for pid in pids:
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    def stop(self, graceful=True):
+        'Stop workers, waiting for them `graceful_timeout` seconds'
+        self.kill(list(self.children), signal.SIGTERM)
+        deadline = time.time() + (self.graceful_timeout if graceful else 0)
+        while self.children and time.time() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.kill(list(self.children), signal.SIGKILL)
+        while self.children:
+            pid, status = os.waitpid(-1, 0)
+            self.children.pop(pid, None)
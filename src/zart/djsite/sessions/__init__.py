@@ -0,0 +1,145 @@
+'session stores which write less'
+import sys
+import time
+from django.conf import settings
+from django.utils import timezone
+
+BATCH_SIZE = 500  # expired sessions deleted per transaction
+
+
+class SkipUnchangedMixin(object):
+    '''Session store mixin, which does not save unchanged data.
+
+    Django saves session whenever it was marked modified, eg. when a
+    value was assigned again. Here saving is skipped when serialized data
+    equals the loaded one, unless SESSION_SAVE_EVERY_REQUEST is set and
+    stored expiry is unknown or more than half gone.
+    '''
+
+    _loaded = None
+    _expire_date = None
+
+    def _fingerprint(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = super(SkipUnchangedMixin, self).load()
+        self._loaded = self._fingerprint(data)
+        return data
+
+    def _get_session_from_db(self):
+        session = super(SkipUnchangedMixin, self)._get_session_from_db()
+        self._expire_date = session.expire_date if session else None
+        return session
+
+    def _fresh(self):
+        'Stored expiry does not need refreshing'
+        if not settings.SESSION_SAVE_EVERY_REQUEST:
+            return True
+        if self._expire_date is None:
+            return False
+        left = (self._expire_date - timezone.now()).total_seconds()
+        return left > self.get_expiry_age() / 2
+
+    def save(self, must_create=False):
+        if (
+            not must_create
+            and self._loaded is not None
+            and self.session_key
+            and self._fingerprint(self._session) == self._loaded
+            and self._fresh()
+        ):
+            return
+        super(SkipUnchangedMixin, self).save(must_create)
+        data = getattr(self, '_session_cache', None)
+        self._loaded = None if data is None else self._fingerprint(data)
+        self._expire_date = None
+
+
+def clear_expired(cls, batch_size=BATCH_SIZE):
+    '''Delete expired sessions in batches.
+
+    Every batch is a transaction of its own, so writers waiting for
+    SQLite lock are let through between them.
+    '''
+    model = cls.get_model_class()
+    now = timezone.now()
+    total = 0
+    while True:
+        keys = list(
+            model.objects.filter(expire_date__lt=now).values_list(
+                'pk', flat=True
+            )[:batch_size]
+        )
+        if not keys:
+            return total
+        model.objects.filter(pk__in=keys).delete()
+        total += len(keys)
+
+
+ENGINES = (
+    ('db', 'django.contrib.sessions.backends.db'),
+    ('skip-db', 'zart.djsite.sessions.db'),
+    ('cached_db', 'zart.djsite.sessions.cached_db'),
+    ('cache', 'zart.djsite.sessions.cache'),
+    ('signed_cookies', 'django.contrib.sessions.backends.signed_cookies'),
+)
+
+
+def bench(requests=200, url='/admin/'):
+    '''Logged-in admin page hits per second and session queries per hit.
+
+    Runs against a test database, created and destroyed here.
+    '''
+    import django
+    from django.contrib.auth import get_user_model
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import (
+        CaptureQueriesContext,
+        override_settings,
+        setup_test_environment,
+    )
+    from zart.djsite.setup import setup_settings
+
+    setup_settings()
+    django.setup()
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    results = {}
+    try:
+        user = get_user_model().objects.create_superuser(
+            'bench', 'bench@example.com', 'bench'
+        )
+        for name, engine in ENGINES:
+            with override_settings(
+                SESSION_ENGINE=engine, ALLOWED_HOSTS=['*']
+            ):
+                client = Client()
+                client.force_login(user)
+                client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.time()
+                    for i in range(requests):
+                        client.get(url)
+                    elapsed = time.time() - start
+                session_queries = sum(
+                    'django_session' in query['sql'] for query in queries
+                )
+                results[name] = (
+                    requests / elapsed,
+                    session_queries / float(requests),
+                )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    for name, (rate, queries) in sorted(bench(n).items()):
+        print(
+            '{:<14} {:>8.1f} requests/s {:>5.2f} session queries'.format(
+                name, rate, queries
+            )
+        )
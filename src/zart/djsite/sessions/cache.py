@@ -0,0 +1,7 @@
+'cache session store, skipping unchanged writes'
+from django.contrib.sessions.backends import cache
+from . import SkipUnchangedMixin
+
+
+class SessionStore(SkipUnchangedMixin, cache.SessionStore):
+    pass
@@ -0,0 +1,7 @@
+'cached database session store, skipping unchanged writes'
+from django.contrib.sessions.backends import cached_db
+from . import SkipUnchangedMixin, clear_expired
+
+
+class SessionStore(SkipUnchangedMixin, cached_db.SessionStore):
+    clear_expired = classmethod(clear_expired)
@@ -0,0 +1,7 @@
+'database session store, skipping unchanged writes'
+from django.contrib.sessions.backends import db
+from . import SkipUnchangedMixin, clear_expired
+
+
+class SessionStore(SkipUnchangedMixin, db.SessionStore):
+    clear_expired = classmethod(clear_expired)
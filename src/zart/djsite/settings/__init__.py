@@ -0,0 +1,29 @@
+'''django settings for zart.djsite project
+
+Settings are layered: `base` is shared, profile module selected by
+DJSITE_PROFILE environment variable (development or production) is laid
+over it, then settings derived from environment are applied.
+'''
+import os
+from importlib import import_module
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('development', 'production')
+
+DJSITE_PROFILE = os.getenv('DJSITE_PROFILE') or 'development'
+if DJSITE_PROFILE not in PROFILES:
+    raise ImproperlyConfigured(
+        'DJSITE_PROFILE must be one of %s, not "%s"'
+        % (', '.join(PROFILES), DJSITE_PROFILE)
+    )
+profile = import_module('.' + DJSITE_PROFILE, __name__)
+globals().update(
+    (name, value) for name, value in vars(profile).items() if name.isupper()
+)
+
+# per-middleware timing, query counts and slow request log
+if os.getenv('DJSITE_TIMING', '').lower() in ('1', 'on', 'yes', 'true'):
+    from zart.djsite.middleware import timed
+
+    MIDDLEWARE = timed(profile.MIDDLEWARE)
+    DJSITE_TIMING_SAMPLE = float(os.getenv('DJSITE_TIMING_SAMPLE', '1.0'))
@@ -0,0 +1,199 @@
+'settings shared by all profiles'
+import os
+import django
+
+# Security
+
+SECRET_KEY = os.getenv('DJANGO_SECRET_KEY', 'django-insecure')
+DEBUG = False
+ALLOWED_HOSTS = ['localhost', '127.0.0.1', '[::1]']
+INTERNAL_IPS = ['127.0.0.1', '::1']
+
+
+# Application definition
+
+INSTALLED_APPS = [
+    'zart.djsite.apps.AdminConfig',  # django.contrib.admin, scalable
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'zart.windows',
+    'zart.djsite',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'zart.djsite.urls'
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': [],
+        'APP_DIRS': True,
+        'OPTIONS': {
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+WSGI_APPLICATION = 'zart.djsite.wsgi.application'
+
+
+# Database
+
+DATABASES = {
+    'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'}
+}
+
+# WAL journal, pragmas from zart.djsite.sqlite and persistent connections,
+# for several FastCGI workers sharing the database
+DJSITE_SQLITE_TUNED = os.getenv('DJSITE_SQLITE_TUNED', '').lower() in (
+    '1',
+    'on',
+    'yes',
+    'true',
+)
+# DJSITE_SQLITE_PRAGMAS = {'cache_size': -16384}
+if DJSITE_SQLITE_TUNED:
+    DATABASES['default']['CONN_MAX_AGE'] = 600
+
+
+# Cache
+
+# shared by all worker processes, with small in-process LRU in front;
+# DJSITE_CACHE selects shared backend: sqlite, file or locmem
+DJSITE_CACHE = os.getenv('DJSITE_CACHE', 'sqlite')
+# SQLite cache file, next to the database unless set; the file cache
+# uses directory of the same name without extension
+DJSITE_CACHE_PATH = os.path.abspath(
+    os.getenv('DJSITE_CACHE_PATH')
+    or os.path.join(
+        os.path.dirname(os.path.abspath(DATABASES['default']['NAME'])),
+        'cache.sqlite3',
+    )
+)
+CACHES = {
+    'default': {
+        'BACKEND': 'zart.djsite.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {'LOCAL_TTL': 5, 'LOCAL_SIZE': 1000},
+    },
+    'shared': {
+        'sqlite': {
+            'BACKEND': 'zart.djsite.cache.SQLiteCache',
+            'LOCATION': DJSITE_CACHE_PATH,
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'file': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.path.splitext(DJSITE_CACHE_PATH)[0],
+            'OPTIONS': {'MAX_ENTRIES': 10000},
+        },
+        'locmem': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }[DJSITE_CACHE],
+}
+
+
+# Sessions
+
+# DJSITE_SESSIONS selects session store: db, cached_db, cache or
+# signed_cookies; stores of zart.djsite.sessions skip unchanged writes
+DJSITE_SESSIONS = os.getenv('DJSITE_SESSIONS', 'db')
+SESSION_ENGINE = {
+    'db': 'zart.djsite.sessions.db',
+    'cached_db': 'zart.djsite.sessions.cached_db',
+    'cache': 'zart.djsite.sessions.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}[DJSITE_SESSIONS]
+# not 'default': its in-process tier would keep sessions deleted by
+# logout in one worker valid in others for LOCAL_TTL seconds
+SESSION_CACHE_ALIAS = 'shared'
+
+
+# Password validation
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+        'UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+        'MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+        'CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.'
+        'NumericPasswordValidator',
+    },
+]
+
+# Internationalization
+
+LANGUAGE_CODE = 'en-us'
+TIME_ZONE = 'UTC'
+USE_I18N = True
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+
+STATIC_URL = '/static/'
+
+# write .gz sidecars on collectstatic, see zart.djsite.storage
+if django.VERSION >= (4, 2):
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'zart.djsite.storage.GzipStaticFilesStorage',
+        },
+    }
+else:
+    STATICFILES_STORAGE = 'zart.djsite.storage.GzipStaticFilesStorage'
+
+
+# Logging
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'loggers': {'zart': {'handlers': ['console'], 'level': 'INFO'}},
+}
+
+
+# Performance
+
+# build URL resolver, templates and DB connections before first request
+DJSITE_WARMUP = False
+
+# /healthz and /readyz answered before middleware, see zart.djsite.health;
+# seconds readiness of database and caches is reused
+DJSITE_HEALTH_TTL = 5.0
+
+
+# ORM
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -0,0 +1,4 @@
+'settings for development, with runserver or IIS Express'
+from .base import *  # noqa: F401,F403
+
+DEBUG = True
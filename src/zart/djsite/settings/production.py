@@ -0,0 +1,64 @@
+'''settings for production, behind IIS or djsite serve
+
+Set DJANGO_SECRET_KEY and DJSITE_ALLOWED_HOSTS (comma separated), run
+collectstatic into DJSITE_STATIC_ROOT and check with::
+
+    djsite check --deploy --tag performance
+'''
+import os
+import copy
+import django
+from .base import *  # noqa: F401,F403
+from .base import DATABASES, MIDDLEWARE, TEMPLATES
+
+DEBUG = False
+ALLOWED_HOSTS = [
+    host.strip()
+    for host in os.getenv('DJSITE_ALLOWED_HOSTS', 'localhost').split(',')
+    if host.strip()
+]
+
+# compress and answer conditional requests, before middleware reading or
+# changing response body
+MIDDLEWARE = list(MIDDLEWARE)
+MIDDLEWARE[1:1] = [
+    'django.middleware.gzip.GZipMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
+]
+
+# compiled templates kept in memory, never checked for changes
+TEMPLATES = copy.deepcopy(TEMPLATES)
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    (
+        'django.template.loaders.cached.Loader',
+        [
+            'django.template.loaders.filesystem.Loader',
+            'django.template.loaders.app_directories.Loader',
+        ],
+    )
+]
+
+# persistent connections with SQLite tuned for several workers
+DJSITE_SQLITE_TUNED = os.getenv('DJSITE_SQLITE_TUNED', 'on').lower() in (
+    '1',
+    'on',
+    'yes',
+    'true',
+)
+DATABASES = copy.deepcopy(DATABASES)
+DATABASES['default']['CONN_MAX_AGE'] = 600
+if django.VERSION >= (4, 1):
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# hashed names, cached by clients for a year, see appcmd command
+STATIC_ROOT = os.path.abspath(os.getenv('DJSITE_STATIC_ROOT', 'static'))
+_storage = 'zart.djsite.storage.GzipManifestStaticFilesStorage'
+if django.VERSION >= (4, 2):
+    from .base import STORAGES
+
+    STORAGES = dict(STORAGES, staticfiles={'BACKEND': _storage})
+else:
+    STATICFILES_STORAGE = _storage
+
+DJSITE_WARMUP = True
@@ -0,0 +1,116 @@
+'tuned SQLite connections'
+import os
+import sys
+import time
+import sqlite3
+
+# applied to every new connection, in order; journal_mode=WAL lets
+# readers proceed while one process writes, but does not work on
+# network shares
+PRAGMAS = (
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),  # no fsync per commit in WAL mode
+    ('busy_timeout', 5000),  # milliseconds to wait for a lock
+    ('cache_size', -65536),  # kibibytes of page cache
+    ('mmap_size', 268435456),  # bytes of memory mapped I/O
+    ('temp_store', 'MEMORY'),
+)
+CONN_MAX_AGE = 600  # seconds to keep connections open between requests
+
+
+def pragmas(overrides=None):
+    'PRAGMA statements, optionally with some values replaced'
+    values = dict(overrides or {})
+    return [
+        'PRAGMA {}={}'.format(name, values.pop(name, value))
+        for name, value in PRAGMAS
+    ] + ['PRAGMA {}={}'.format(name, value) for name, value in values.items()]
+
+
+def tune(sender, connection, **kwargs):
+    'connection_created signal receiver'
+    if connection.vendor != 'sqlite':
+        return
+    from django.conf import settings
+
+    overrides = getattr(settings, 'DJSITE_SQLITE_PRAGMAS', None)
+    with connection.cursor() as cursor:
+        for statement in pragmas(overrides):
+            cursor.execute(statement)
+
+
+def _work(args):
+    'Benchmark worker: session-like read and write per request'
+    path, tuned, seconds, worker = args
+    statements = pragmas() if tuned else []
+    connection = None
+    requests = errors = 0
+    deadline = time.time() + seconds
+    while time.time() < deadline:
+        if connection is None:
+            connection = sqlite3.connect(path, timeout=5.0)
+            for statement in statements:
+                connection.execute(statement)
+        key = 'w{}k{}'.format(worker, requests % 100)
+        try:
+            connection.execute(
+                'SELECT data FROM session WHERE key=?', (key,)
+            ).fetchall()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO session VALUES (?, ?, ?)',
+                    (key, 'x' * 512, time.time()),
+                )
+            requests += 1
+        except sqlite3.OperationalError:  # database is locked
+            errors += 1
+        if not tuned:  # CONN_MAX_AGE = 0
+            connection.close()
+            connection = None
+    if connection is not None:
+        connection.close()
+    return requests, errors
+
+
+def bench(processes=4, seconds=3.0):
+    'Compare default and tuned SQLite throughput of concurrent processes'
+    # this module is imported by every process, through apps.ready
+    import tempfile
+    from multiprocessing import Pool
+
+    results = {}
+    pool = Pool(processes)
+    try:
+        for name, tuned in (('default', False), ('tuned', True)):
+            directory = tempfile.mkdtemp()
+            path = os.path.join(directory, 'bench.sqlite3')
+            connection = sqlite3.connect(path)
+            connection.execute(
+                'CREATE TABLE session '
+                '(key TEXT PRIMARY KEY, data TEXT, expire REAL)'
+            )
+            connection.close()
+            counts = pool.map(
+                _work,
+                [(path, tuned, seconds, i) for i in range(processes)],
+            )
+            requests = sum(c[0] for c in counts)
+            errors = sum(c[1] for c in counts)
+            results[name] = (requests / seconds, errors)
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+            os.rmdir(directory)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    for name, (rate, errors) in sorted(bench(n).items()):
+        print(
+            '{:<8} {:>8.0f} requests/s {:>6} locked'.format(
+                name, rate, errors
+            )
+        )
@@ -0,0 +1,109 @@
+'''startup time of djsite console entry point
+
+Imports are timed with "python -X importtime" in fresh interpreters,
+less those of bare interpreter startup. Exits with status 1 when any
+startup is over its budget:
+
+    python -m zart.djsite.startup [REPEAT]
+'''
+import re
+import sys
+import time
+import subprocess
+
+# name, interpreter arguments, budget in milliseconds of imports
+STARTUPS = (
+    ('entry point', ['-c', 'import zart.djsite.manage'], 20.0),
+    ('command help', ['-m', 'zart.djsite', 'iisexpress', '--help'], 250.0),
+)
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def importtime(args):
+    '''Wall seconds and {module: self microseconds} of interpreter run.
+
+    Raises CalledProcessError when it fails.
+    '''
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime'] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    wall = time.perf_counter() - start
+    modules, errors = {}, []
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(1))
+        elif not line.startswith('import time:'):
+            errors.append(line)
+    if process.returncode:
+        raise subprocess.CalledProcessError(
+            process.returncode, args, stderr='\n'.join(errors)
+        )
+    return wall, modules
+
+
+def best(args, repeat):
+    'importtime() of fastest of `repeat` runs, after one warming up'
+    importtime(args)  # compiles bytecode
+    return min(
+        (importtime(args) for i in range(repeat)),
+        key=lambda run: sum(run[1].values()),
+    )
+
+
+def bench(repeat=5, top=5):
+    '''Import milliseconds, wall milliseconds and slowest modules of every
+    startup, less bare interpreter, with its budget.
+
+    Failed startups have None times and error output in place of modules.
+    '''
+    wall, modules = best(['-c', 'pass'], repeat)
+    base = set(modules)
+    results = {}
+    for name, args, budget in STARTUPS:
+        try:
+            run_wall, run_modules = best(args, repeat)
+        except subprocess.CalledProcessError as e:
+            results[name] = (None, None, e.stderr.strip(), budget)
+            continue
+        added = sorted(
+            (
+                (us, module)
+                for module, us in run_modules.items()
+                if module not in base
+            ),
+            reverse=True,
+        )
+        results[name] = (
+            sum(us for us, module in added) / 1000.0,
+            (run_wall - wall) * 1000,
+            [(module, us / 1000.0) for us, module in added[:top]],
+            budget,
+        )
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    over = False
+    for name, (imports, wall, modules, budget) in sorted(
+        bench(n).items()
+    ):
+        if imports is None:
+            print('{:<12} failed\n{}'.format(name, modules))
+            over = True
+            continue
+        print(
+            '{:<12} {:>7.1f} ms imports {:>7.1f} ms wall {:>7.1f} ms '
+            'budget{}'.format(
+                name, imports, wall, budget, '' if imports <= budget else '!'
+            )
+        )
+        for module, ms in modules:
+            print('    {:>7.1f} ms {}'.format(ms, module))
+        over = over or imports > budget
+    sys.exit(1 if over else 0)
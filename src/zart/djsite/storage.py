@@ -0,0 +1,81 @@
+'static files storages writing precompressed sidecars'
+import os
+import gzip
+import shutil
+from django.contrib.staticfiles.storage import (
+    ManifestStaticFilesStorage,
+    StaticFilesStorage,
+)
+
+# types worth compressing; images, fonts and archives are compressed already
+GZIP_EXTENSIONS = (
+    '.css',
+    '.js',
+    '.mjs',
+    '.map',
+    '.json',
+    '.svg',
+    '.html',
+    '.txt',
+    '.xml',
+    '.ico',
+    '.eot',
+    '.ttf',
+)
+GZIP_MIN_SIZE = 256  # bytes, smaller files do not pay off
+
+
+class GzipMixin(object):
+    '''Write "name.gz" next to every compressible collected file.
+
+    Sidecars are rewritten only when older than their file, and kept only
+    when smaller, so front-ends serving precompressed files never
+    compress per request.
+    '''
+
+    def post_process(self, paths, dry_run=False, **options):
+        parent = getattr(super(GzipMixin, self), 'post_process', None)
+        if parent is not None:
+            for item in parent(paths, dry_run, **options):
+                yield item
+        if dry_run:
+            return
+        for root, dirs, files in os.walk(self.location):
+            for filename in files:
+                if not filename.lower().endswith(GZIP_EXTENSIONS):
+                    continue
+                path = os.path.join(root, filename)
+                if self.gzip(path):
+                    name = os.path.relpath(path, self.location)
+                    name = name.replace(os.sep, '/')
+                    yield name, name + '.gz', True
+
+    def gzip(self, path):
+        'Write sidecar if stale, return True if written'
+        target = path + '.gz'
+        stat = os.stat(path)
+        if stat.st_size < GZIP_MIN_SIZE:
+            return False
+        if (
+            os.path.exists(target)
+            and os.stat(target).st_mtime >= stat.st_mtime
+        ):
+            return False
+        tmp = target + '.tmp'
+        with open(path, 'rb') as src:
+            # mtime=0 keeps output identical for identical input
+            with gzip.GzipFile(tmp, 'wb', 9, mtime=0) as dst:
+                shutil.copyfileobj(src, dst)
+        if os.path.getsize(tmp) >= stat.st_size:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, target)
+        return True
+
+
+class GzipStaticFilesStorage(GzipMixin, StaticFilesStorage):
+    pass
+
+
+class GzipManifestStaticFilesStorage(GzipMixin, ManifestStaticFilesStorage):
+    pass
@@ -0,0 +1,179 @@
+'warm start of django application'
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_SUFFIXES = ('.html', '.txt', '.xml', '.json', '.js', '.css')
+
+
+def enabled():
+    'Warmup is opt-in, by DJSITE_WARMUP environment variable or setting'
+    from django.conf import settings
+
+    value = os.getenv('DJSITE_WARMUP') or getattr(
+        settings, 'DJSITE_WARMUP', False
+    )
+    return bool(value) and str(value).lower() not in [
+        '0',
+        'off',
+        'no',
+        'false',
+    ]
+
+
+def _walk(patterns):
+    count = 0
+    for pattern in patterns:
+        children = getattr(pattern, 'url_patterns', None)
+        if children is not None:
+            count += _walk(children)  # imports included urlconf
+        else:
+            pattern.callback  # imports view
+            count += 1
+    return count
+
+
+def urls():
+    'Import views and populate URL resolver'
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    count = _walk(resolver.url_patterns)
+    resolver.reverse_dict  # populate reverse lookups
+    return count
+
+
+def _loader_dirs(loaders):
+    for loader in loaders:
+        children = getattr(loader, 'loaders', None)
+        if children is not None:
+            yield from _loader_dirs(children)  # cached loader
+        else:
+            get_dirs = getattr(loader, 'get_dirs', None)
+            if get_dirs is not None:
+                yield from get_dirs()
+
+
+def template_dirs(engine):
+    '''Directories of templates of engine.
+
+    Django engines are asked through their loaders, as with APP_DIRS off
+    and loaders set explicitly, engine.template_dirs misses some.
+    '''
+    django_engine = getattr(engine, 'engine', None)
+    loaders = getattr(django_engine, 'template_loaders', None)
+    dirs = engine.template_dirs if loaders is None else _loader_dirs(loaders)
+    seen = []
+    for directory in dirs:
+        directory = str(directory)
+        if directory not in seen:
+            seen.append(directory)
+    return seen
+
+
+def templates():
+    'Compile templates of every engine'
+    from django.template import engines
+
+    count = 0
+    for engine in engines.all():
+        for directory in template_dirs(engine):
+            for root, dirs, files in os.walk(directory):
+                for name in files:
+                    if not name.endswith(TEMPLATE_SUFFIXES):
+                        continue
+                    path = os.path.relpath(os.path.join(root, name), directory)
+                    try:
+                        engine.get_template(path.replace(os.sep, '/'))
+                    except Exception as e:
+                        logger.debug('Template %s skipped: %s', path, e)
+                    else:
+                        count += 1
+    return count
+
+
+def database():
+    '''Open database connections.
+
+    Connections are per thread, so this helps when requests are served
+    by the warming thread and CONN_MAX_AGE keeps connections open.
+    '''
+    from django.db import connections
+
+    count = 0
+    for connection in connections.all():
+        connection.ensure_connection()
+        count += 1
+    return count
+
+
+PHASES = (('urls', urls), ('templates', templates), ('database', database))
+
+
+def run(timings, phases=PHASES):
+    'Run warmup phases, then log timings'
+    for name, phase in phases:
+        start = time.time()
+        try:
+            count = phase()
+        except Exception:
+            logger.exception('Warmup phase %s failed', name)
+            count = None
+        timings.append((name, time.time() - start, count))
+    report(timings)
+
+
+def report(timings):
+    'Log per-phase timing breakdown'
+    parts = []
+    for name, elapsed, count in timings:
+        part = '{} {:.1f}ms'.format(name, elapsed * 1000)
+        if count is not None:
+            part += ' ({})'.format(count)
+        parts.append(part)
+    total = sum(elapsed for name, elapsed, count in timings)
+    logger.info(
+        'Warmup in %.1fms: %s', total * 1000, ', '.join(parts) or 'no phases'
+    )
+
+
+class Lifespan(object):
+    'ASGI application wrapper, which warms up on lifespan startup'
+
+    def __init__(self, application, timings):
+        self.application = application
+        self.timings = timings
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'lifespan':
+            return await self.application(scope, receive, send)
+        from asgiref.sync import sync_to_async
+
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # thread sensitive, so sync views share the connections
+                await sync_to_async(run, thread_sensitive=True)(self.timings)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+def get_application(factory, lifespan=False):
+    '''Create application by `factory`, warming it up if enabled.
+
+    With `lifespan`, warmup runs on ASGI lifespan startup, otherwise
+    before application is returned.
+    '''
+    start = time.time()
+    application = factory()
+    timings = [('setup', time.time() - start, None)]
+    if not enabled():
+        return application
+    if lifespan:
+        return Lifespan(application, timings)
+    run(timings)
+    return application
@@ -1,6 +1,8 @@
 'django wsgi callable'
 from django.core.wsgi import get_wsgi_application
+from .health import HealthWSGI
 from .setup import setup_settings
+from .warmup import get_application
 
 setup_settings()
-application = get_wsgi_application()
+application = HealthWSGI(get_application(get_wsgi_application))
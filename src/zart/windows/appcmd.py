@@ -0,0 +1,432 @@
+'appcmd.exe wrapper'
+import sys
+import codecs
+import ctypes
+from subprocess import Popen, PIPE, list2cmdline
+from xml.etree.ElementTree import ParseError, iterparse
+
+try:
+    codecs.lookup('oem')  # added in py3.6+
+    oemencoding = 'oem'
+except Exception:
+    try:
+        oemencoding = 'cp%d' % ctypes.windll.kernel32.GetOEMCP()
+    except AttributeError:  # not windows
+        oemencoding = 'utf-8'
+
+
+def quote(x):
+    'Quote name'
+    return '&quot;%s&quot;' % x if ' ' in x else x
+
+
+def pdict(prefix='', **options):
+    return '{}[{}]'.format(
+        prefix, ','.join("{}='{}'".format(k, v) for k, v in options.items())
+    )
+
+
+def plist(*args):
+    return '.'.join(
+        pdict(**arg) if isinstance(arg, dict) else arg for arg in args
+    )
+
+
+def _site_path(name):
+    'Normalize "site/app/vdir" name'
+    return '/'.join(x for x in name.split('/') if x)
+
+
+class AppCmdError(Exception):
+    'appcmd.exe query failed'
+
+
+class Record(object):
+    '''Object listed by appcmd /xml, from attributes of XML element.
+
+    `fields` are (attribute, XML attribute, type) of typed attributes,
+    other XML attributes are kept in `attrs` dict.
+    '''
+
+    __slots__ = ('attrs',)
+    fields = ()
+
+    def __init__(self, element):
+        attrs = dict(element.attrib)
+        for name, key, type in self.fields:
+            value = attrs.pop(key, None)
+            setattr(self, name, value if value is None else type(value))
+        self.attrs = attrs
+
+    def __repr__(self):
+        return '<%s %s>' % (
+            self.__class__.__name__,
+            ' '.join(
+                '%s=%r' % (name, getattr(self, name))
+                for name, key, type in self.fields
+            ),
+        )
+
+
+def _bool(value):
+    return value.lower() == 'true'
+
+
+class Site(Record):
+    __slots__ = ('name', 'id', 'bindings', 'state')
+    fields = (
+        ('name', 'SITE.NAME', str),
+        ('id', 'SITE.ID', int),
+        ('bindings', 'bindings', str),
+        ('state', 'state', str),
+    )
+
+
+class App(Record):
+    __slots__ = ('name', 'site', 'pool', 'path')
+    fields = (
+        ('name', 'APP.NAME', str),
+        ('site', 'SITE.NAME', str),
+        ('pool', 'APPPOOL.NAME', str),
+        ('path', 'path', str),
+    )
+
+
+class Vdir(Record):
+    __slots__ = ('name', 'app', 'path', 'physical_path')
+    fields = (
+        ('name', 'VDIR.NAME', str),
+        ('app', 'APP.NAME', str),
+        ('path', 'path', str),
+        ('physical_path', 'physicalPath', str),
+    )
+
+
+class Config(Record):
+    'Configuration section at path, `element` has its content'
+
+    __slots__ = ('section', 'path', 'override_mode', 'locked', 'element')
+    fields = (
+        ('section', 'CONFIG.SECTION', str),
+        ('path', 'path', str),
+        ('override_mode', 'overrideMode', str),
+        ('locked', 'locked', _bool),
+    )
+
+    def __init__(self, element):
+        super(Config, self).__init__(element)
+        self.element = element[0] if len(element) else None
+
+
+class _Head(object):
+    'Reader keeping first bytes read, for error messages'
+
+    def __init__(self, stream, size=4096):
+        self.stream = stream
+        self.size = size
+        self.head = b''
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        if len(self.head) < self.size:
+            self.head += data[: self.size - len(self.head)]
+        return data
+
+
+class AppCmd(object):
+    '''appcmd.exe command runner.
+
+    `appcmd` is executable path or command line list, such as script
+    printing captured output.
+    '''
+
+    appcmd = 'appcmd.exe'
+    config = None
+
+    def __init__(self, appcmd=None, config=None):
+        if appcmd:
+            self.appcmd = appcmd
+        if config:
+            self.config = config
+
+    def __repr__(self):
+        return '<%s %r>' % (self.__class__.__name__, self.cmdline())
+
+    def cmdline(self, *args, **options):
+        'Build appcmd.exe command line'
+        cmd = (
+            list(self.appcmd)
+            if isinstance(self.appcmd, (list, tuple))
+            else [self.appcmd]
+        )
+        if self.config:
+            cmd.append('/apphostconfig:' + self.config)
+        cmd.extend(args)
+        cmd.extend(
+            '/{}:{}'.format(k, v)
+            for k, v in options.items()
+            if not k.startswith('_')
+        )
+        return cmd
+
+    def __call__(self, *args, **options):
+        xfail = options.pop('_xfail', None)
+        cmd = self.cmdline(*args, **options)
+        proc = Popen(cmd, stdout=PIPE)
+        out, err = proc.communicate()
+        fail = proc.returncode != 0 or out.startswith(b'ERROR ')
+        return fail, xfail, list2cmdline(cmd), out.decode(oemencoding)
+
+    def save(self):
+        'Flush pending changes. appcmd.exe commits on every call'
+
+    def query(self, record, *args, **options):
+        '''Run "list" command with /xml, yield `record` of every object.
+
+        Output is parsed while appcmd.exe writes it and every element is
+        discarded once its record is built, so memory does not grow with
+        number of objects. Closing generator early kills appcmd.exe.
+        Queries run appcmd.exe, even with in-process subclasses.
+        '''
+        cmd = self.cmdline('list', *(args + ('/xml',)), **options)
+        proc = Popen(cmd, stdout=PIPE)
+        stdout = _Head(proc.stdout)
+        try:
+            root, depth = None, 0
+            try:
+                for event, elem in iterparse(stdout, ('start', 'end')):
+                    if event == 'start':
+                        if root is None:
+                            root = elem
+                        depth += 1
+                        continue
+                    depth -= 1
+                    if depth == 1:
+                        item = record(elem)
+                        root.clear()
+                        yield item
+            except ParseError:
+                proc.stdout.read()
+                proc.wait()
+                raise AppCmdError(
+                    '%s: %s'
+                    % (
+                        list2cmdline(cmd),
+                        stdout.head.decode(oemencoding, 'replace').strip(),
+                    )
+                )
+            if proc.wait() != 0:
+                raise AppCmdError(
+                    '%s: exit code %d' % (list2cmdline(cmd), proc.returncode)
+                )
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            proc.stdout.close()
+
+    def list_sites(self, name=None, **filters):
+        'Sites, all or `name`; filters are attributes, as state="Started"'
+        args = (name,) if name else ()
+        return self.query(Site, 'site', *args, **filters)
+
+    def list_apps(self, name=None, site=None, **filters):
+        'Applications, all, `name` or those of `site`'
+        args = (name,) if name else ()
+        if site:
+            filters['site.name'] = site
+        return self.query(App, 'app', *args, **filters)
+
+    def list_vdirs(self, name=None, app=None, **filters):
+        'Virtual directories, all, `name` or those of `app`'
+        args = (name,) if name else ()
+        if app:
+            filters['app.name'] = app
+        return self.query(Vdir, 'vdir', *args, **filters)
+
+    def list_config(self, section, path=None, defaults=False):
+        '''Configuration `section` effective at `path`.
+
+        `path` is site, application or vdir name; with `defaults`, unset
+        attributes are listed with default values.
+        '''
+        args = (path,) if path else ()
+        options = {'section': section}
+        if defaults:
+            options['config'] = '*'
+        return self.query(Config, 'config', *args, **options)
+
+    def resources(self, *args, **options):
+        '''Return (reads, writes) sets of configuration resources of call.
+
+        Changes committed to the same file conflict, so do web.config
+        changes with locking of their section and with their vdir.
+        '''
+        apphost = 'apphost:%s' % (self.config or '')
+        verb, obj = args[:2]
+        paths, params = [], {}
+        for arg in args[2:]:
+            if not arg.startswith('/'):
+                paths.append(arg)
+            elif arg[1:2] not in '+-' and ':' in arg:
+                key, _, value = arg[1:].partition(':')
+                params[key] = value
+        section = 'section:%s' % options.get('section', '').lower()
+        if obj == 'vdir':
+            name = params.get('vdir.name')
+            if not name:
+                name = params.get('app.name', '') + options.get('path', '')
+            return set(), {apphost, 'vdir:' + _site_path(name)}
+        if verb in ('lock', 'unlock'):
+            return set(), {apphost, section}
+        if verb == 'set':
+            path = _site_path(paths[0]) if paths else ''
+            if path and options.get('commit') != 'apphost':
+                return {section, 'vdir:' + path}, {'web.config:' + path}
+            return set(), {apphost}
+        return {apphost}, set()
+
+    def lock(self, section):
+        return self('lock', 'config', section=section)
+
+    def unlock(self, section):
+        return self('unlock', 'config', section=section)
+
+    def cfg(self, *args, **options):
+        return self('set', 'config', *args, **options)
+
+    def fastcgi(
+        self,
+        handler='FastCGI-python',
+        fullPath='',
+        arguments='',
+        env=None,
+        params=None,
+    ):
+        if not fullPath:
+            fullPath = sys.executable
+        if not params:
+            params = {}
+
+        key = dict(fullPath=fullPath, arguments=arguments)
+
+        out = []
+        out.append(
+            self.cfg(
+                pdict('/-', **key),
+                section='fastcgi',
+                commit='apphost',
+                _xfail=True,
+            )
+        )
+        out.append(
+            self.cfg(
+                pdict('/+', **dict(key, **params)),
+                *[
+                    plist(
+                        pdict('/+', **key),
+                        'environmentVariables',
+                        pdict(name=name, value=value),
+                    )
+                    for name, value in env.items()
+                ],
+                section='fastcgi',
+                commit='apphost'
+            )
+        )
+        return out
+
+    def handler_del(self, appname, name, **options):
+        return self.cfg(
+            appname, pdict('/-', name=name), section='handlers', **options
+        )
+
+    def handler_add(self, appname, name, params=None, **options):
+        if not params:
+            params = {}
+            # path='*',
+            # verb='*',
+            # modules='FastCgiModule',
+            # scriptProcessor='|'.join([fullPath, arguments]),
+            # resourceType='Unspecified',
+            # requireAccess='Script',
+
+        return self.cfg(
+            appname,
+            pdict('/+', name=name, **params),
+            section='handlers',
+            **options
+        )
+
+    def handler(self, appname, name, params=None, **options):
+        out = []
+        out.append(self.handler_del(appname, name, _xfail=True, **options))
+        out.append(self.handler_add(appname, name, params, **options))
+        return out
+
+    def vdir(self, appname, path, physicalPath):
+        out = []
+        out.append(
+            self('delete', 'vdir', '/vdir.name:' + appname + path, _xfail=True)
+        )
+        out.append(
+            self(
+                'add',
+                'vdir',
+                '/app.name:' + appname,
+                path='/' + path,
+                physicalPath=physicalPath,
+            )
+        )
+        return out
+
+    def client_cache(self, appname, max_age, etag=True, **options):
+        'Send Cache-Control max-age (d.hh:mm:ss) with static files'
+        options.update(
+            {
+                'clientCache.cacheControlMode': 'UseMaxAge',
+                'clientCache.cacheControlMaxAge': max_age,
+                'clientCache.setEtag': 'true' if etag else 'false',
+            }
+        )
+        return self.cfg(appname, section='staticContent', **options)
+
+    def compression(self, appname, **options):
+        'Compress static files once, on first request'
+        out = []
+        out.append(
+            self.cfg(
+                section='httpCompression',
+                commit='apphost',
+                staticCompressionIgnoreHitFrequency='true',
+            )
+        )
+        out.append(
+            self.cfg(
+                appname,
+                section='urlCompression',
+                doStaticCompression='true',
+                **options
+            )
+        )
+        return out
+
+    def auth(self, appname, winauth, **options):
+        out = []
+        out.append(
+            self.cfg(
+                appname,
+                section='anonymousAuthentication',
+                enabled='false' if winauth else 'true',
+                **options
+            )
+        )
+        out.append(
+            self.cfg(
+                appname,
+                section='windowsAuthentication',
+                enabled='true' if winauth else 'false',
+                **options
+            )
+        )
+        return out
@@ -0,0 +1,659 @@
+'in-process applicationHost.config editor'
+import os
+import re
+import copy
+import tempfile
+import xml.etree.ElementTree as ET
+from subprocess import list2cmdline
+from .appcmd import AppCmd
+
+APPHOST = 'MACHINE/WEBROOT/APPHOST'
+INDENT = '    '
+
+# element name used by collection for added items (default: add)
+ITEMS = {
+    'fastCgi': 'application',
+    'environmentVariables': 'environmentVariable',
+}
+
+# key attributes of collection items (default: all given attributes)
+KEYS = {
+    'application': ('fullPath', 'arguments'),
+    'environmentVariable': ('name',),
+    'add': ('name',),
+}
+
+_selector = re.compile(r"(\w+)='([^']*)'")
+
+
+class AppHostError(Exception):
+    'Configuration change failed'
+
+
+def split_path(path):
+    'Split appcmd collection path by dots outside of brackets'
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, c in enumerate(path):
+        if c == "'":
+            quoted = not quoted
+        elif quoted:
+            continue
+        elif c == '[':
+            depth += 1
+        elif c == ']':
+            depth -= 1
+        elif c == '.' and not depth:
+            parts.append(path[start:i])
+            start = i + 1
+    parts.append(path[start:])
+    return parts
+
+
+def parse_selector(part):
+    'Parse "[key=\'value\',...]" into dict or return None for plain names'
+    if not (part.startswith('[') and part.endswith(']')):
+        return None
+    return dict(_selector.findall(part))
+
+
+def _matches(elem, keys):
+    return all(elem.get(k) == v for k, v in keys.items())
+
+
+def _keys(tag, attrs):
+    'Key subset of collection item attributes'
+    names = KEYS.get(tag)
+    if not names:
+        return dict(attrs)
+    return dict((k, attrs[k]) for k in names if k in attrs)
+
+
+def _append(parent, elem, level):
+    'Append child element, keeping sibling indentation'
+    if len(parent):
+        last = parent[-1]
+        elem.tail = last.tail
+        last.tail = parent.text
+    else:
+        parent.text = '\n' + INDENT * (level + 1)
+        elem.tail = '\n' + INDENT * level
+    parent.append(elem)
+    return elem
+
+
+def parse(path):
+    'Parse configuration file, keeping comments'
+    parser = ET.XMLParser(target=ET.TreeBuilder(insert_comments=True))
+    with open(path, 'rb') as f:
+        parser.feed(f.read())
+    return parser.close()
+
+
+def _child(parent, tag, level, create=True):
+    'Find or create child element'
+    elem = parent.find(tag)
+    if elem is None and create:
+        elem = _append(parent, ET.Element(tag), level)
+    return elem
+
+
+class AppHostConfig(object):
+    'applicationHost.config document loaded once and saved atomically'
+
+    def __init__(self, path):
+        self.path = path
+        self.root = None
+        self.dirty = False
+        self._sections = None
+        self._webconfigs = {}
+
+    def __repr__(self):
+        return '<AppHostConfig %r>' % self.path
+
+    def load(self):
+        'Parse configuration file'
+        self.root = parse(self.path)
+        self.dirty = False
+        self._sections = None
+        self._webconfigs = {}
+        return self
+
+    def save(self, force=False):
+        'Write configuration file atomically, if changed'
+        if self.root is None or not (self.dirty or force):
+            return False
+        dirname = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=dirname, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                ET.ElementTree(self.root).write(
+                    f, encoding='utf-8', xml_declaration=True
+                )
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        self.dirty = False
+        return True
+
+    def snapshot(self):
+        return copy.deepcopy(self.root)
+
+    def restore(self, root):
+        self.root = root
+        self._sections = None
+
+    def depth(self, elem):
+        'Nesting level of element, 0 for document root'
+        parents = dict(
+            (child, parent) for parent in self.root.iter() for child in parent
+        )
+        level = 0
+        while elem is not self.root:
+            elem = parents[elem]
+            level += 1
+        return level
+
+    # sections
+
+    @property
+    def sections(self):
+        'Map section names and full paths to declarations'
+        if self._sections is None:
+            self._sections = {}
+
+            def scan(group, prefix):
+                for elem in group:
+                    name = elem.get('name')
+                    if elem.tag == 'sectionGroup':
+                        scan(elem, prefix + name + '/')
+                    elif elem.tag == 'section':
+                        entry = prefix + name, elem
+                        self._sections.setdefault(name, entry)
+                        self._sections[prefix + name] = entry
+
+            scan(_child(self.root, 'configSections', 0), '')
+        return self._sections
+
+    def section_path(self, name):
+        'Resolve short section name into full path'
+        for key in (name, name.replace('.', '/')):
+            if key in self.sections:
+                return self.sections[key][0]
+        # section names are case-insensitive for appcmd
+        for key, (path, decl) in self.sections.items():
+            if key.lower() == name.lower():
+                return path
+        raise AppHostError('Unknown config section "%s"' % name)
+
+    def override_mode(self, name, mode):
+        'Set overrideModeDefault of section declaration'
+        path = self.section_path(name)
+        self.sections[path][1].set('overrideModeDefault', mode)
+        self.dirty = True
+        return path
+
+    def location(self, path, create=True):
+        'Find or create <location> element for site path'
+        if not path:
+            return self.root
+        for elem in self.root.findall('location'):
+            if elem.get('path') == path:
+                return elem
+        if not create:
+            return None
+        elem = ET.Element('location', path=path)
+        return _append(self.root, elem, 0)
+
+    def section(self, name, path=None, create=True):
+        'Return (element, level) of section at location path'
+        parent = self.location(path, create)
+        level = 1 if path else 0
+        for tag in self.section_path(name).split('/'):
+            if parent is None:
+                break
+            parent = _child(parent, tag, level, create)
+            level += 1
+        return parent, level
+
+    def webconfig(self, path):
+        'Parsed web.config of site path, if there is one'
+        if path not in self._webconfigs:
+            root = None
+            try:
+                app, rest = self.application(path)
+            except AppHostError:
+                app, rest = None, None
+            for vdir in () if app is None else app.findall('virtualDirectory'):
+                if vdir.get('path') == rest:
+                    filename = os.path.join(
+                        os.path.expandvars(vdir.get('physicalPath', '')),
+                        'web.config',
+                    )
+                    if os.path.isfile(filename):
+                        root = parse(filename)
+            self._webconfigs[path] = root
+        return self._webconfigs[path]
+
+    def levels(self, name, path):
+        'Section elements applying to site path, from global to specific'
+        elem, level = self.section(name, create=False)
+        if elem is not None:
+            yield elem
+        bits = path.split('/') if path else []
+        for i in range(1, len(bits) + 1):
+            sub = '/'.join(bits[:i])
+            elem, level = self.section(name, sub, create=False)
+            if elem is not None:
+                yield elem
+            web = self.webconfig(sub)
+            if web is not None:
+                elem = web.find(self.section_path(name))
+                if elem is not None:
+                    yield elem
+
+    def attribute(self, name, path, key):
+        'Effective section attribute at site path, "child.attr" for child'
+        tags, _, key = key.rpartition('.')
+        value = None
+        for elem in self.levels(name, path):
+            for tag in tags.split('.') if tags else ():
+                elem = elem.find(tag)
+                if elem is None:
+                    break
+            else:
+                value = elem.get(key, value)
+        return value
+
+    def collection(self, name, path, tag):
+        'Effective collection items at site path'
+        items = []
+        for elem in self.levels(name, path):
+            for item in elem:
+                if item.tag == 'clear':
+                    items = []
+                elif item.tag == 'remove':
+                    items = [
+                        i for i in items if not _matches(i, item.attrib)
+                    ]
+                elif item.tag == tag:
+                    items.append(item)
+        return items
+
+    def inherited(self, name, path, tag):
+        'Collection items inherited by site path from its parents'
+        return self.collection(name, path and path.rpartition('/')[0], tag)
+
+    # collections
+
+    def add(self, parent, level, tag, attrs):
+        'Add collection item'
+        keys = _keys(tag, attrs)
+        for elem in parent.findall(tag):
+            if _matches(elem, keys):
+                raise AppHostError(
+                    'Cannot add duplicate collection entry of type "%s" '
+                    'with unique key attribute "%s" set to "%s"'
+                    % (tag, ', '.join(keys), ', '.join(keys.values()))
+                )
+        elem = _append(parent, ET.Element(tag, attrs), level)
+        self.dirty = True
+        return elem
+
+    def remove(self, parent, level, tag, keys, inherited=()):
+        'Remove collection item, masking inherited one with <remove>'
+        for elem in parent.findall(tag):
+            if _matches(elem, keys):
+                parent.remove(elem)
+                self.dirty = True
+                return
+        for elem in inherited:
+            if _matches(elem, keys):
+                self.add(parent, level, 'remove', keys)
+                return
+        raise AppHostError('Cannot find requested collection element.')
+
+    def configure(self, name, path, ops, attrs):
+        'Apply appcmd "set config" operations to section'
+        section, level = self.section(name, path)
+        for op in ops:
+            if op[:2] not in ('/+', '/-'):
+                raise AppHostError('Unsupported operation "%s"' % op)
+            parts = split_path(op[2:])
+            parent, plevel = section, level
+            for part in parts[:-1]:
+                sel = parse_selector(part)
+                if sel is None:
+                    parent = _child(parent, part, plevel)
+                else:
+                    tag = ITEMS.get(parent.tag, 'add')
+                    found = [
+                        e for e in parent.findall(tag) if _matches(e, sel)
+                    ]
+                    if not found:
+                        raise AppHostError(
+                            'Cannot find requested collection element.'
+                        )
+                    parent = found[0]
+                plevel += 1
+            sel = parse_selector(parts[-1])
+            if sel is None:
+                raise AppHostError('Malformed collection path "%s"' % op)
+            tag = ITEMS.get(parent.tag, 'add')
+            if op.startswith('/+'):
+                self.add(parent, plevel, tag, sel)
+            else:
+                inherited = ()
+                if parent is section:
+                    inherited = self.inherited(name, path, tag)
+                self.remove(parent, plevel, tag, _keys(tag, sel), inherited)
+        for key, value in attrs.items():
+            elem, plevel = section, level
+            tags, _, key = key.rpartition('.')
+            for tag in tags.split('.') if tags else ():
+                elem = _child(elem, tag, plevel)
+                plevel += 1
+            if elem.get(key) != value:
+                elem.set(key, value)
+                self.dirty = True
+
+    # sites
+
+    def site(self, name):
+        sites, level = self.section('sites', create=False)
+        for site in sites if sites is not None else ():
+            if site.tag == 'site' and site.get('name') == name:
+                return site
+        raise AppHostError('Cannot find SITE object "%s"' % name)
+
+    def application(self, name):
+        'Split "site/app/vdir" into site application and rest of path'
+        sitename, _, path = name.partition('/')
+        site = self.site(sitename)
+        path = '/' + path
+        best = None
+        for app in site.findall('application'):
+            prefix = app.get('path', '/').rstrip('/') + '/'
+            if (path + '/').startswith(prefix):
+                if best is None or len(prefix) > len(best[1]):
+                    best = app, prefix
+        if best is None:
+            raise AppHostError('Cannot find APP object "%s"' % name)
+        app, prefix = best
+        return app, '/' + path[len(prefix) :].strip('/')
+
+    def vdir_add(self, appname, path, physicalPath):
+        app, rest = self.application(appname)
+        if rest != '/':
+            raise AppHostError('Cannot find APP object "%s"' % appname)
+        self.add(
+            app,
+            self.depth(app),
+            'virtualDirectory',
+            dict(path=path, physicalPath=physicalPath),
+        )
+        self._webconfigs.clear()
+
+    def vdir_delete(self, name):
+        app, path = self.application(name)
+        for elem in app.findall('virtualDirectory'):
+            if elem.get('path') == path:
+                app.remove(elem)
+                self.dirty = True
+                self._webconfigs.clear()
+                return
+        raise AppHostError(
+            'Cannot find VDIR object with identifier "%s"' % name
+        )
+
+
+def _str(value):
+    'Format attribute value the way appcmd stores it'
+    return str(value).lower() if isinstance(value, bool) else str(value)
+
+
+def _diff(prefix, current, desired):
+    'Describe changed attributes'
+    out = []
+    for key in sorted(set(current) | set(desired)):
+        old, new = current.get(key), desired.get(key)
+        if new is not None:
+            new = _str(new)
+        if old != new:
+            out.append(
+                '{} {}: {} -> {}'.format(
+                    prefix,
+                    key,
+                    '(default)' if old is None else old,
+                    '(default)' if new is None else new,
+                )
+            )
+    return out
+
+
+class AppHostState(object):
+    '''Compare current configuration with desired one.
+
+    Every method returns list of human-readable changes, empty if the
+    setting is already in place. Changes to be made are passed to
+    :meth:`apply`, so that later checks see their effect.
+    '''
+
+    def __init__(self, document):
+        self.shadow = AppHostCmd(config=document.path)
+        self.shadow.document.restore(document.snapshot())
+        self.document = self.shadow.document
+
+    def apply(self, method, *args, **kwargs):
+        'Apply AppCmd method call to in-memory copy of configuration'
+        return getattr(self.shadow, method)(*args, **kwargs)
+
+    def unlocked(self, section):
+        path = self.document.section_path(section)
+        mode = self.document.sections[path][1].get('overrideModeDefault')
+        if mode == 'Allow':
+            return []
+        return [
+            '~ section "%s": overrideModeDefault %s -> Allow' % (path, mode)
+        ]
+
+    def fastcgi(self, fullPath, arguments, env=None, params=None):
+        key = dict(fullPath=fullPath, arguments=arguments)
+        name = '{}|{}'.format(fullPath, arguments)
+        for app in self.document.collection('fastCgi', None, 'application'):
+            if _matches(app, key):
+                break
+        else:
+            return ['+ fastCgi application "%s"' % name]
+        current = dict(app.attrib)
+        desired = dict(key, **(params or {}))
+        out = _diff('~ fastCgi application "%s"' % name, current, desired)
+        current = dict(
+            (var.get('name'), var.get('value'))
+            for var in app.iterfind('environmentVariables/environmentVariable')
+        )
+        out += _diff(
+            '~ fastCgi application "%s" env' % name, current, env or {}
+        )
+        return out
+
+    def handler(self, appname, name, params=None):
+        path = appname.strip('/')
+        for item in self.document.collection('handlers', path, 'add'):
+            if item.get('name') == name:
+                break
+        else:
+            return ['+ handler "%s" at "%s"' % (name, path)]
+        return _diff(
+            '~ handler "%s" at "%s"' % (name, path),
+            dict(item.attrib),
+            dict(params or {}, name=name),
+        )
+
+    def no_handler(self, appname, name):
+        path = appname.strip('/')
+        for item in self.document.collection('handlers', path, 'add'):
+            if item.get('name') == name:
+                return ['- handler "%s" at "%s"' % (name, path)]
+        return []
+
+    def vdir(self, appname, path, physicalPath):
+        name = appname.rstrip('/') + '/' + path
+        try:
+            app, rest = self.document.application(name)
+        except AppHostError:
+            return ['+ vdir "%s" -> "%s"' % (name, physicalPath)]
+        for elem in app.findall('virtualDirectory'):
+            if elem.get('path') == rest:
+                return _diff(
+                    '~ vdir "%s"' % name,
+                    dict(physicalPath=elem.get('physicalPath')),
+                    dict(physicalPath=physicalPath),
+                )
+        return ['+ vdir "%s" -> "%s"' % (name, physicalPath)]
+
+    def client_cache(self, appname, max_age, etag=True):
+        path = appname.strip('/')
+        desired = {
+            'clientCache.cacheControlMode': 'UseMaxAge',
+            'clientCache.cacheControlMaxAge': max_age,
+            'clientCache.setEtag': etag,
+        }
+        current = dict(
+            (key, self.document.attribute('staticContent', path, key))
+            for key in desired
+        )
+        return _diff('~ staticContent at "%s"' % path, current, desired)
+
+    def compression(self, appname):
+        path = appname.strip('/')
+        key = 'staticCompressionIgnoreHitFrequency'
+        out = _diff(
+            '~ httpCompression',
+            {key: self.document.attribute('httpCompression', None, key)},
+            {key: True},
+        )
+        key = 'doStaticCompression'
+        out += _diff(
+            '~ urlCompression at "%s"' % path,
+            {key: self.document.attribute('urlCompression', path, key)},
+            {key: True},
+        )
+        return out
+
+    def auth(self, appname, winauth):
+        path = appname.strip('/')
+        out = []
+        for section, enabled in (
+            ('anonymousAuthentication', not winauth),
+            ('windowsAuthentication', winauth),
+        ):
+            current = self.document.attribute(section, path, 'enabled')
+            out += _diff(
+                '~ %s at "%s"' % (section, path),
+                dict(enabled=current and current.lower()),
+                dict(enabled=enabled),
+            )
+        return out
+
+
+class AppHostCmd(AppCmd):
+    '''AppCmd performing changes in-process.
+
+    The configuration file is parsed once, every call edits the XML tree
+    and :meth:`save` writes the result once. All changes are committed to
+    applicationHost.config using <location> tags, as with /commit:apphost.
+    '''
+
+    def __init__(self, appcmd=None, config=None):
+        super(AppHostCmd, self).__init__(appcmd, config)
+        self.document = AppHostConfig(self.config)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.save()
+
+    def __call__(self, *args, **options):
+        xfail = options.pop('_xfail', None)
+        cmdline = list2cmdline(self.cmdline(*args, **options))
+        if self.document.root is None:
+            self.document.load()
+        verb, obj = args[:2]
+        positional, params = [], {}
+        for arg in args[2:]:
+            if arg.startswith('/') and ':' in arg and arg[1] not in '+-':
+                key, _, value = arg[1:].partition(':')
+                params[key] = value
+            else:
+                positional.append(arg)
+        params.update(
+            (k, str(v)) for k, v in options.items() if not k.startswith('_')
+        )
+        backup, dirty = self.document.snapshot(), self.document.dirty
+        try:
+            handler = getattr(self, '_{}_{}'.format(verb, obj), None)
+            if handler is None:
+                raise AppHostError(
+                    'Unsupported command "{} {}"'.format(verb, obj)
+                )
+            out = handler(positional, params)
+        except AppHostError as e:
+            self.document.restore(backup)
+            self.document.dirty = dirty
+            return True, xfail, cmdline, 'ERROR ( message:%s )\n' % e
+        return False, xfail, cmdline, out + '\n'
+
+    def save(self):
+        'Write configuration file once'
+        return self.document.save()
+
+    def resources(self, *args, **options):
+        'Every call edits the same in-memory document'
+        return set(), {'apphost:%s' % self.config}
+
+    def _lock_config(self, args, params):
+        path = self.document.override_mode(params['section'], 'Deny')
+        return 'Locked section "%s" at configuration path "%s".' % (
+            path,
+            APPHOST,
+        )
+
+    def _unlock_config(self, args, params):
+        path = self.document.override_mode(params['section'], 'Allow')
+        return 'Unlocked section "%s" at configuration path "%s".' % (
+            path,
+            APPHOST,
+        )
+
+    def _set_config(self, args, params):
+        location = None
+        if args and not args[0].startswith('/'):
+            location = args.pop(0).strip('/') or None
+        name = params.pop('section')
+        params.pop('commit', None)
+        path = self.document.section_path(name)
+        self.document.configure(name, location, args, params)
+        target = APPHOST + ('/' + location if location else '')
+        return (
+            'Applied configuration changes to section "%s" for "%s" at '
+            'configuration commit path "%s"' % (path, target, APPHOST)
+        )
+
+    def _add_vdir(self, args, params):
+        appname = params['app.name']
+        self.document.vdir_add(
+            appname, params['path'], params['physicalPath']
+        )
+        return 'VDIR object "%s" added' % (
+            appname.rstrip('/') + params['path']
+        )
+
+    def _delete_vdir(self, args, params):
+        name = params['vdir.name']
+        self.document.vdir_delete(name)
+        return 'VDIR object "%s" deleted' % name
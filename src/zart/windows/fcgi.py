@@ -0,0 +1,494 @@
+'FastCGI responder for WSGI applications, wfastcgi replacement'
+import os
+import sys
+import struct
+import socket
+import argparse
+import threading
+import traceback
+from tempfile import SpooledTemporaryFile
+from concurrent.futures import ThreadPoolExecutor
+
+VERSION = 1
+HEADER = struct.Struct('!BBHHBx')
+BEGIN_BODY = struct.Struct('!HB5x')
+END_BODY = struct.Struct('!LB3x')
+MAX_CONTENT = 0xFFFF
+
+# record types
+BEGIN_REQUEST = 1
+ABORT_REQUEST = 2
+END_REQUEST = 3
+PARAMS = 4
+STDIN = 5
+STDOUT = 6
+STDERR = 7
+DATA = 8
+GET_VALUES = 9
+GET_VALUES_RESULT = 10
+UNKNOWN_TYPE = 11
+
+# begin request
+RESPONDER = 1
+KEEP_CONN = 1
+
+# end request
+REQUEST_COMPLETE = 0
+CANT_MPX_CONN = 1
+OVERLOADED = 2
+UNKNOWN_ROLE = 3
+
+THREADS = 8
+SPOOL_SIZE = 1 << 20  # request bodies larger than that go to disk
+
+
+def read_pairs(data):
+    'Decode FastCGI name-value pairs'
+    pos, end = 0, len(data)
+    while pos < end:
+        sizes = []
+        for i in range(2):
+            size = data[pos]
+            if size & 0x80:
+                size = struct.unpack_from('!L', data, pos)[0] & 0x7FFFFFFF
+                pos += 4
+            else:
+                pos += 1
+            sizes.append(size)
+        name = bytes(data[pos : pos + sizes[0]])
+        pos += sizes[0]
+        value = bytes(data[pos : pos + sizes[1]])
+        pos += sizes[1]
+        yield name, value
+
+
+def write_pairs(pairs):
+    'Encode FastCGI name-value pairs'
+    out = []
+    for name, value in pairs:
+        for item in (name, value):
+            size = len(item)
+            out.append(
+                struct.pack('!B', size)
+                if size < 0x80
+                else struct.pack('!L', size | 0x80000000)
+            )
+        out.extend((name, value))
+    return b''.join(out)
+
+
+def records(type, request_id, data):
+    'Encode data as one or more records'
+    out = []
+    view = memoryview(data)
+    while True:
+        chunk = view[:MAX_CONTENT]
+        view = view[MAX_CONTENT:]
+        padding = -len(chunk) & 7
+        out.append(HEADER.pack(VERSION, type, request_id, len(chunk), padding))
+        out.append(chunk)
+        if padding:
+            out.append(b'\0' * padding)
+        if not view:
+            break
+    return out
+
+
+class Stream(object):
+    'Buffered reader over socket-like object'
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def read(self, size):
+        'Read exactly `size` bytes, or return None at end of stream'
+        buffer = self.buffer
+        while len(buffer) < size:
+            try:
+                data = self.sock.recv(max(size, 1 << 16))
+            except (OSError, EOFError):
+                data = b''
+            if not data:
+                return None
+            buffer += data
+        data = bytes(buffer[:size])
+        del buffer[:size]
+        return data
+
+    def record(self):
+        'Read (type, request_id, content) or None at end of stream'
+        header = self.read(HEADER.size)
+        if header is None:
+            return None
+        version, type, request_id, length, padding = HEADER.unpack(header)
+        content = self.read(length + padding)
+        if content is None:
+            return None
+        return type, request_id, content[:length]
+
+
+class Pipe(object):
+    '''Duplex named pipe, which IIS passes as stdin.
+
+    Synchronous I/O on one file object is serialized by Windows, so a
+    write would wait for pending read to complete; its requests are
+    served one at a time, in reader thread.
+    '''
+
+    def __init__(self, fd=0):
+        import msvcrt
+        import _winapi
+
+        self._winapi = _winapi
+        self.handle = msvcrt.get_osfhandle(fd)
+        self.sequential = True
+
+    def recv(self, size):
+        try:
+            data, err = self._winapi.ReadFile(self.handle, size)
+        except BrokenPipeError:
+            return b''
+        return data
+
+    def sendall(self, data):
+        data = memoryview(data)
+        while data:
+            written, err = self._winapi.WriteFile(self.handle, data)
+            data = data[written:]
+
+    def close(self):
+        self._winapi.CloseHandle(self.handle)
+
+
+class Request(object):
+    'Request in progress'
+
+    def __init__(self, connection, request_id, keep):
+        self.connection = connection
+        self.id = request_id
+        self.keep = keep
+        self.params = bytearray()
+        self.stdin = SpooledTemporaryFile(SPOOL_SIZE)
+        self.aborted = False
+        self.started = False
+
+    def send(self, type, data):
+        self.connection.send(records(type, self.id, data))
+
+    def environ(self):
+        env = dict(
+            (k.decode('latin-1'), v.decode('latin-1'))
+            for k, v in read_pairs(self.params)
+        )
+        # IIS sends full URL as PATH_INFO, and application virtual path
+        # as APPL_MD_PATH, eg. /LM/W3SVC/1/ROOT/app
+        app_path = env.get('APPL_MD_PATH', '')
+        if app_path:
+            script = app_path.partition('/ROOT')[2].rstrip('/')
+            path = env.get('PATH_INFO', '')
+            if script and path.lower().startswith(script.lower()):
+                path = path[len(script) :]
+            env['SCRIPT_NAME'], env['PATH_INFO'] = script, path
+        self.stdin.seek(0)
+        env.update(
+            {
+                'wsgi.version': (1, 0),
+                'wsgi.input': self.stdin,
+                'wsgi.errors': Errors(self),
+                'wsgi.url_scheme': 'https'
+                if env.get('HTTPS', '').lower() in ('on', '1')
+                else 'http',
+                'wsgi.multithread': True,
+                'wsgi.multiprocess': True,
+                'wsgi.run_once': False,
+            }
+        )
+        return env
+
+    def run(self, app):
+        'Call application, streaming its response'
+        headers = []
+        sent = []
+
+        def write(data):
+            if self.aborted:
+                raise IOError('Request aborted')
+            if not sent:
+                status, response_headers = headers[0]
+                head = ['Status: ' + status]
+                head.extend('%s: %s' % header for header in response_headers)
+                head.append('\r\n')
+                data = '\r\n'.join(head).encode('latin-1') + data
+                sent.append(True)
+            if data:
+                self.send(STDOUT, data)
+
+        def start_response(status, response_headers, exc_info=None):
+            if exc_info:
+                try:
+                    if sent:
+                        raise exc_info[1].with_traceback(exc_info[2])
+                finally:
+                    exc_info = None
+            elif headers:
+                raise AssertionError('Headers already set')
+            headers[:] = [(status, response_headers)]
+            return write
+
+        try:
+            result = app(self.environ(), start_response)
+            try:
+                for data in result:
+                    if data:
+                        write(data)
+                if not sent:
+                    write(b'')
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except Exception:
+            self.send(STDERR, traceback.format_exc().encode('utf-8'))
+            if not sent and not self.aborted:
+                headers[:] = [('500 Internal Server Error', [])]
+                write(b'')
+        finally:
+            self.stdin.close()
+            self.connection.end(self)
+
+
+class Errors(object):
+    'wsgi.errors stream, sent to web server as FCGI_STDERR'
+
+    def __init__(self, request):
+        self.request = request
+
+    def write(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8', 'replace')
+        if data:
+            self.request.send(STDERR, data)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+
+class Connection(object):
+    '''Web server connection.
+
+    Records are read in this thread, complete requests run in a shared
+    thread pool, so several requests of one connection are served at
+    once (FCGI_MPXS_CONNS), unless connection is `sequential`.
+    '''
+
+    def __init__(self, server, sock):
+        self.server = server
+        self.sock = sock
+        self.sequential = getattr(sock, 'sequential', False)
+        self.stream = Stream(sock)
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.closing = False
+
+    def send(self, data):
+        with self.lock:
+            for chunk in data:
+                self.sock.sendall(chunk)
+
+    def end(self, request, app_status=0, status=REQUEST_COMPLETE):
+        'Finish request'
+        self.send(
+            records(STDOUT, request.id, b'')
+            + records(
+                END_REQUEST, request.id, END_BODY.pack(app_status, status)
+            )
+        )
+        with self.lock:
+            self.requests.pop(request.id, None)
+            if not request.keep:
+                self.closing = True
+                self._close()
+            elif self.closing and not self.requests:
+                # web server closed its end while requests were running
+                self._close()
+
+    def _close(self):
+        # close() alone neither wakes reader blocked in recv() nor sends
+        # FIN while that reader holds the socket
+        shutdown = getattr(self.sock, 'shutdown', None)
+        try:
+            if shutdown is not None:
+                shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def run(self):
+        app, pool = self.server.app, self.server.pool
+        while not self.closing:
+            record = self.stream.record()
+            if record is None:
+                break
+            type, request_id, content = record
+            request = self.requests.get(request_id)
+            if type == BEGIN_REQUEST:
+                role, flags = BEGIN_BODY.unpack(content)
+                if role != RESPONDER:
+                    self.send(
+                        records(
+                            END_REQUEST,
+                            request_id,
+                            END_BODY.pack(0, UNKNOWN_ROLE),
+                        )
+                    )
+                    continue
+                self.requests[request_id] = Request(
+                    self, request_id, flags & KEEP_CONN
+                )
+            elif type == GET_VALUES:
+                self.send(records(GET_VALUES_RESULT, 0, self.values(content)))
+            elif request is None:
+                if type not in (PARAMS, STDIN, DATA, ABORT_REQUEST):
+                    self.send(
+                        records(UNKNOWN_TYPE, 0, struct.pack('!B7x', type))
+                    )
+            elif type == PARAMS:
+                request.params += content
+            elif type == STDIN:
+                if content:
+                    request.stdin.write(content)
+                elif not request.started:
+                    request.started = True
+                    if self.sequential:
+                        request.run(app)
+                    else:
+                        pool.submit(request.run, app)
+            elif type == ABORT_REQUEST:
+                request.aborted = True
+                if not request.started:  # application was not called
+                    request.stdin.close()
+                    self.end(request)
+        with self.lock:
+            self.closing = True
+            if not self.requests:
+                self._close()
+
+    def values(self, content):
+        threads = str(self.server.threads).encode()
+        known = {
+            b'FCGI_MAX_CONNS': threads,
+            b'FCGI_MAX_REQS': b'1' if self.sequential else threads,
+            b'FCGI_MPXS_CONNS': b'0' if self.sequential else b'1',
+        }
+        return write_pairs(
+            (name, known[name])
+            for name, value in read_pairs(content)
+            if name in known
+        )
+
+
+class Server(object):
+    'FastCGI responder'
+
+    def __init__(self, app, threads=THREADS):
+        self.app = app
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(threads)
+
+    def serve_connection(self, sock):
+        Connection(self, sock).run()
+
+    def serve_forever(self, listener):
+        while True:
+            sock, addr = listener.accept()
+            thread = threading.Thread(
+                target=self.serve_connection, args=(sock,)
+            )
+            thread.daemon = True
+            thread.start()
+
+
+def listen(address):
+    'Listen on "host:port" or "unix:/path"'
+    if address.startswith('unix:'):
+        path = address[5:]
+        if os.path.exists(path):
+            os.unlink(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+    else:
+        host, _, port = address.rpartition(':')
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((host or '127.0.0.1', int(port)))
+    sock.listen(128)
+    return sock
+
+
+def inherited_listener():
+    'Listening socket passed as stdin (FCGI_LISTENSOCK_FILENO), if any'
+    try:
+        sock = socket.socket(fileno=os.dup(0))
+    except (OSError, AttributeError, ValueError):
+        return None
+    try:
+        if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ACCEPTCONN):
+            return sock
+    except OSError:
+        pass
+    sock.close()
+    return None
+
+
+def load_application(name=None):
+    'Import WSGI application, defaults to settings.WSGI_APPLICATION'
+    if name:
+        module, _, attr = name.rpartition('.')
+        return getattr(__import__(module, fromlist=[attr]), attr)
+    from zart.djsite.setup import setup_settings
+
+    setup_settings()
+    from django.core.servers.basehttp import get_internal_wsgi_application
+
+    return get_internal_wsgi_application()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--bind',
+        help='listen on "host:port" or "unix:/path" instead of stdin',
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        default=int(os.getenv('FCGI_THREADS') or THREADS),
+        help='worker threads (default: %(default)s)',
+    )
+    parser.add_argument(
+        '--app',
+        default=os.getenv('WSGI_HANDLER'),
+        help='WSGI application, "module.name" (default: WSGI_APPLICATION)',
+    )
+    args = parser.parse_args(argv)
+    server = Server(load_application(args.app), args.threads)
+    if args.bind:
+        server.serve_forever(listen(args.bind))
+    listener = inherited_listener()
+    if listener is not None:
+        server.serve_forever(listener)
+    elif sys.platform == 'win32':
+        server.serve_connection(Pipe())
+    else:
+        parser.error('stdin is not a listening socket, use --bind')
+
+
+if __name__ == '__main__':
+    main()
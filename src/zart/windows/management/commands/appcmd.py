@@ -2,48 +2,21 @@
 import sys
 import os
 import shutil
-import codecs
-import ctypes
-from subprocess import Popen, PIPE, list2cmdline
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.utils.translation import gettext_lazy as _
 from django.utils.module_loading import import_string
+from zart.windows.appcmd import AppCmd
+from zart.windows.apphost import AppHostCmd, AppHostConfig, AppHostState
+from zart.windows.plan import Plan
+from zart.windows.profiles import PROFILES, fastcgi_params
+from zart.windows.stream import recoded
 
 
-class RecodeStream(object):
-    'Recoding stream wrapper'
-
-    def __init__(self, buffer, data_encoding=None, file_encoding=None):
-        'Convert incoming data to stream from data to file encoding'
-        self.buffer = buffer
-        self.data_encoding = data_encoding
-        self.file_encoding = None
-        if buffer.encoding is None:
-            self.file_encoding = file_encoding or sys.getfilesystemencoding()
-
-    def write(self, buf):
-        'Perform recode'
-        if not isinstance(buf, u''.__class__):  # this MUST be u''.__class__
-            buf = buf.decode(self.data_encoding)
-        if self.file_encoding:
-            buf = buf.encode(self.file_encoding)
-        self.buffer.write(buf)
-
-    def __getattr__(self, name):
-        'Proxy attribute access to wrapped stream'
-        return getattr(self.buffer, name)
-
-
-sys.stdout = RecodeStream(sys.__stdout__, 'utf-8')
-sys.stderr = RecodeStream(sys.__stderr__, 'utf-8')
-
-
-try:
-    codecs.lookup('oem')  # added in py3.6+
-    oemencoding = 'oem'
-except Exception:
-    oemencoding = 'cp%d' % ctypes.windll.kernel32.GetOEMCP()
+# FastCGI responder: python module run by IIS
+RESPONDERS = {'wfastcgi': 'wfastcgi', 'builtin': 'zart.windows.fcgi'}
+# applicationhost.config editor: in-process or appcmd.exe
+ENGINES = ('native', 'appcmd')
 
 
 def module_path(name):
@@ -51,22 +24,28 @@ def module_path(name):
     return import_string(name + '.__file__')
 
 
-def quote(x):
-    'Quote name'
-    return '&quot;%s&quot;' % x if ' ' in x else x
+def settings_path(name):
+    '''File of settings module, to recycle workers when it changes.
 
+    For layered settings (zart.djsite.settings) it is module of active
+    profile, base settings are changed less often.
+    '''
+    from importlib import import_module
 
-def pdict(prefix='', **options):
-    return '{}[{}]'.format(
-        prefix, ','.join("{}='{}'".format(k, v) for k, v in options.items())
-    )
+    module = import_module(name)
+    profile = getattr(module, 'profile', None)
+    return getattr(profile, '__file__', None) or module.__file__
 
 
-def plist(*args):
-    return '.'.join(
-        pdict(**arg) if isinstance(arg, dict) else arg for arg in args
+def hashed_static():
+    'Collected static files have content hashes in their names'
+    from django.contrib.staticfiles.storage import (
+        ManifestFilesMixin,
+        staticfiles_storage,
     )
 
+    return isinstance(staticfiles_storage, ManifestFilesMixin)
+
 
 def _asbool(x):
     'Convert string value to boolean'
@@ -75,147 +54,6 @@ def _asbool(x):
     return str(x).lower() not in ['0', 'off', 'no', 'false']
 
 
-class AppCmd(object):
-    appcmd = 'appcmd.exe'
-    config = None
-
-    def __init__(self, appcmd=None, config=None):
-        if appcmd:
-            self.appcmd = appcmd
-        if config:
-            self.config = config
-
-    def __repr__(self):
-        cmd = [self.appcmd]
-        if self.config:
-            cmd.append('/apphostconfig:' + self.config)
-        return '<AppCmd %r>' % cmd
-
-    def __call__(self, *args, **options):
-        xfail = options.pop('_xfail', None)
-        cmd = [self.appcmd]
-        if self.config:
-            cmd.append('/apphostconfig:' + self.config)
-        cmd.extend(args)
-        cmd.extend(
-            '/{}:{}'.format(k, v)
-            for k, v in options.items()
-            if not k.startswith('_')
-        )
-        proc = Popen(cmd, stdout=PIPE)
-        out, err = proc.communicate()
-        fail = proc.returncode != 0 or out.startswith(b'ERROR ')
-        return fail, xfail, list2cmdline(cmd), out.decode(oemencoding)
-
-    def lock(self, section):
-        return self('lock', 'config', section=section)
-
-    def unlock(self, section):
-        return self('unlock', 'config', section=section)
-
-    def cfg(self, *args, **options):
-        return self('set', 'config', *args, **options)
-
-    def fastcgi(
-        self,
-        handler='FastCGI-python',
-        fullPath='',
-        arguments='',
-        env=None,
-        params=None,
-    ):
-        if not fullPath:
-            fullPath = sys.executable
-        if not params:
-            params = {}
-
-        key = dict(fullPath=fullPath, arguments=arguments)
-
-        out = []
-        out.append(
-            self.cfg(
-                pdict('/-', **key),
-                section='fastcgi',
-                commit='apphost',
-                _xfail=True,
-            )
-        )
-        out.append(
-            self.cfg(
-                pdict('/+', **dict(key, **params)),
-                *[
-                    plist(
-                        pdict('/+', **key),
-                        'environmentVariables',
-                        pdict(name=name, value=value),
-                    )
-                    for name, value in env.items()
-                ],
-                section='fastcgi',
-                commit='apphost'
-            )
-        )
-        return out
-
-    def handler_del(self, appname, name, **options):
-        return self.cfg(
-            appname, pdict('/-', name=name), section='handlers', **options
-        )
-
-    def handler_add(self, appname, name, params=None, **options):
-        if not params:
-            params = {}
-            # path='*',
-            # verb='*',
-            # modules='FastCgiModule',
-            # scriptProcessor='|'.join([fullPath, arguments]),
-            # resourceType='Unspecified',
-            # requireAccess='Script',
-
-        return self.cfg(
-            appname,
-            pdict('/+', name=name, **params),
-            section='handlers',
-            **options
-        )
-
-    def vdir(self, appname, path, physicalPath):
-        out = []
-        out.append(
-            self('delete', 'vdir', '/vdir.name:' + appname + path, _xfail=True)
-        )
-        out.append(
-            self(
-                'add',
-                'vdir',
-                '/app.name:' + appname,
-                path='/' + path,
-                physicalPath=physicalPath,
-            )
-        )
-        return out
-
-    def auth(self, appname, winauth, **options):
-        out = []
-        out.append(
-            self.cfg(
-                appname,
-                section='anonymousAuthentication',
-                enabled='false' if winauth else 'true',
-                **options
-            )
-        )
-        out.append(
-            self.cfg(
-                appname,
-                section='windowsAuthentication',
-                enabled='true' if winauth else 'false',
-                **options
-            )
-        )
-        return out
-
-
 class Command(BaseCommand):
     'Configure IIS (Express) with appcmd.'
     help = __doc__
@@ -258,14 +96,93 @@ class Command(BaseCommand):
             default=getattr(settings, 'IIS_FASTCGI', 'FastCGI-Python'),
             help=_('FastCGI handler name (default: "%(default)s)".'),
         )
+        parser.add_argument(
+            '--responder',
+            choices=sorted(RESPONDERS),
+            default=os.getenv('IIS_FASTCGI_RESPONDER')
+            or getattr(settings, 'IIS_FASTCGI_RESPONDER', 'wfastcgi'),
+            help=_('FastCGI responder module (default: "%(default)s").'),
+        )
+        parser.add_argument(
+            '--profile',
+            choices=sorted(PROFILES),
+            default=os.getenv('IIS_FASTCGI_PROFILE')
+            or getattr(settings, 'IIS_FASTCGI_PROFILE', 'dev'),
+            help=_('FastCGI pool tuning profile (default: "%(default)s").'),
+        )
+        parser.add_argument(
+            '--memory',
+            type=int,
+            metavar='MB',
+            default=os.getenv('IIS_FASTCGI_MEMORY')
+            or getattr(settings, 'IIS_FASTCGI_MEMORY', None),
+            help=_('Memory budget for all FastCGI workers, in megabytes.'),
+        )
+        parser.add_argument(
+            '--engine',
+            choices=ENGINES,
+            default=os.getenv('IIS_APPCMD_ENGINE')
+            or getattr(settings, 'IIS_APPCMD_ENGINE', 'native'),
+            help=_(
+                'Edit applicationhost.config in-process or run appcmd.exe '
+                'for every change (default: "%(default)s").'
+            ),
+        )
+        parser.add_argument(
+            '-j',
+            '--jobs',
+            type=int,
+            default=int(
+                os.getenv('IIS_APPCMD_JOBS')
+                or getattr(settings, 'IIS_APPCMD_JOBS', 4)
+            ),
+            help=_(
+                'Run up to N independent changes at once '
+                '(default: %(default)s).'
+            ),
+        )
+        parser.add_argument(
+            '--plan',
+            action='store_true',
+            help=_('Print changes to be made without applying them.'),
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help=_('Reapply all settings, even those already in place.'),
+        )
+
+    def execute(self, *args, **options):
+        'Recode output while command runs'
+        with recoded(self.stdout), recoded(self.stderr):
+            return super(Command, self).execute(*args, **options)
 
     def handle(self, *args, **options):
         'Perform command'
         verbose = options['verbosity']  # 0 quiet, 1 normal, 2 verbose, 3 trace
+        # argparse checks choices of given options only, not of defaults
+        # taken from environment or settings
+        for name, choices in (
+            ('responder', RESPONDERS),
+            ('profile', PROFILES),
+            ('engine', ENGINES),
+        ):
+            if options[name] not in choices:
+                raise CommandError(
+                    _('Invalid %s "%s", choose from: %s.')
+                    % (name, options[name], ', '.join(sorted(choices)))
+                )
         bits32 = options['bits32']
         site = options['site']
         iis_user_home = options['home']
         iis_handler = options['fastcgi']
+        responder = RESPONDERS[options['responder']]
+        engine = options['engine']
+        profile = options['profile']
+        memory = options['memory']
+        jobs = options['jobs']
+        dry_run = options['plan']
+        force = options['force']
         write = self.stdout.write
 
         program_files = (
@@ -282,7 +199,7 @@ class Command(BaseCommand):
             raise CommandError(
                 _('Platform "%s" is not supported.') % sys.platform
             )
-        if not os.path.exists(appcmd_exe):
+        if engine == 'appcmd' and not os.path.exists(appcmd_exe):
             raise CommandError(
                 _(
                     'Executable "%s" does not exist. '
@@ -292,10 +209,11 @@ class Command(BaseCommand):
             )
 
         try:
-            module_path('wfastcgi')
+            module_path(responder)
         except ImportError:
             raise CommandError(
-                _('Module wfascgi not found. Run "pip install wfastcgi".')
+                _('Module %s not found. Run "pip install %s".')
+                % (responder, responder)
             )
 
         if not os.path.isdir(configdir):
@@ -321,7 +239,7 @@ class Command(BaseCommand):
 
         def call(result):
             abort = False
-            if not isinstance(result, list):
+            if isinstance(result, tuple):
                 result = [result]
             for res in result:
                 fail, xfail, cmdline, output = res
@@ -341,7 +259,7 @@ class Command(BaseCommand):
 
         dsm = os.getenv('DJANGO_SETTINGS_MODULE')
         fullPath = sys.executable
-        arguments = '-u -m wfastcgi'
+        arguments = '-u -m ' + responder
         # arguments = '-u ' + quote(wfastcgi)
 
         env = {}
@@ -349,73 +267,140 @@ class Command(BaseCommand):
         env['WSGI_HANDLER'] = settings.WSGI_APPLICATION
         env['WSGI_LOG'] = os.path.abspath('wsgi.log')
 
-        params = dict(
-            # 10-3600, IIS 7.0: 30, IIS 7.5: 70
-            # activityTimeout=70,
-            activityTimeout=10,
-            # boolean
-            # flushNamedPipe='false',
-            # 10-604800, 300
-            # idleTimeout=300,
-            idleTimeout=10,
-            # 1-10000000, 200
-            # instanceMaxRequests=200,
-            instanceMaxRequests=10,
-            # 0-10000, 0
-            # maxInstances=0,
-            # path, IIS 7.5+
-            monitorChangesTo=module_path(dsm),
-            # NamedPipe/Tcp
-            # protocol='NamedPipe',
-            # 1-10000000, 1000
-            # queueLength=1000,
-            # 10-604800, 90
-            # requestTimeout=90,
-            # IIS 7.5+: 0
-            # signalBeforeTerminateSeconds=0,
-            # ReturnStdErrIn500/ReturnGeneric500/IgnoreAndReturn200/TerminateProcess
-            # stderrMode='ReturnStdErrIn500',
-        )
+        params = fastcgi_params(profile, memory=memory)
+        if verbose > 0:
+            write(
+                _('FastCGI profile "%s": %s')
+                % (
+                    profile,
+                    ', '.join(
+                        '{}={}'.format(k, v) for k, v in sorted(params.items())
+                    ),
+                )
+            )
+        params['monitorChangesTo'] = settings_path(dsm)
 
         appname = site + '/'
-        appcmd = AppCmd(appcmd_exe, os.path.abspath(config))
-        call(appcmd.unlock('anonymousAuthentication'))
-        call(appcmd.unlock('windowsAuthentication'))
-        call(appcmd.fastcgi(arguments=arguments, params=params, env=env))
-        call(
-            appcmd.handler_del(
-                appname, iis_handler, commit='apphost', _xfail=True
-            )
+        factory = AppHostCmd if engine == 'native' else AppCmd
+        executor = factory(appcmd_exe, os.path.abspath(config))
+        document = getattr(executor, 'document', None)
+        if document is None:
+            document = AppHostConfig(executor.config)
+        state = AppHostState(document.load())
+        plan = Plan()
+        appcmd = plan.bind(executor)
+        changes = []
+
+        def ensure(diff, method, *args, **kwargs):
+            'Record call if setting is not in place'
+            changes.extend(diff)
+            if diff or force:
+                getattr(appcmd, method)(*args, **kwargs)
+                state.apply(method, *args, **kwargs)
+
+        ensure(
+            state.unlocked('anonymousAuthentication'),
+            'unlock',
+            'anonymousAuthentication',
         )
-        call(
-            appcmd.handler_add(
+        ensure(
+            state.unlocked('windowsAuthentication'),
+            'unlock',
+            'windowsAuthentication',
+        )
+        ensure(
+            state.fastcgi(fullPath, arguments, env, params),
+            'fastcgi',
+            arguments=arguments,
+            params=params,
+            env=env,
+        )
+        handler = dict(
+            path='*',
+            verb='*',
+            modules='FastCgiModule',
+            scriptProcessor='|'.join([fullPath, arguments]),
+            resourceType='Unspecified',
+            requireAccess='Script',
+        )
+        ensure(
+            state.handler(appname, iis_handler, handler),
+            'handler',
+            appname,
+            iis_handler,
+            params=handler,
+            commit='apphost',
+        )
+        ensure(
+            state.auth(appname, True), 'auth', appname, True, commit='apphost'
+        )
+
+        # hashed static files never change, others may, but rarely
+        hashed = hashed_static()
+        static_age = getattr(
+            settings,
+            'IIS_STATIC_MAX_AGE',
+            '365.00:00:00' if hashed else '1.00:00:00',
+        )
+        media_age = getattr(settings, 'IIS_MEDIA_MAX_AGE', '01:00:00')
+        for url, root, max_age, etag in (
+            (
+                settings.STATIC_URL,
+                settings.STATIC_ROOT,
+                static_age,
+                not hashed,
+            ),
+            (settings.MEDIA_URL, settings.MEDIA_ROOT, media_age, True),
+        ):
+            if not (url and root):
+                continue
+            path = url.strip('/')
+            physicalPath = os.path.abspath(root)
+            ensure(
+                state.vdir(appname, path, physicalPath),
+                'vdir',
                 appname,
+                path,
+                physicalPath,
+            )
+            ensure(
+                state.no_handler(appname + path, iis_handler),
+                'handler_del',
+                appname + path,
                 iis_handler,
-                params=dict(
-                    path='*',
-                    verb='*',
-                    modules='FastCgiModule',
-                    scriptProcessor='|'.join([fullPath, arguments]),
-                    resourceType='Unspecified',
-                    requireAccess='Script',
-                ),
+                _xfail=True,
+            )
+            ensure(
+                state.auth(appname + path, False),
+                'auth',
+                appname + path,
+                False,
+            )
+            # commit to apphost, collectstatic --clear would drop web.config
+            ensure(
+                state.client_cache(appname + path, max_age, etag),
+                'client_cache',
+                appname + path,
+                max_age,
+                etag,
                 commit='apphost',
             )
-        )
-        call(appcmd.auth(site + '/', True, commit='apphost'))
-
-        if settings.STATIC_URL and settings.STATIC_ROOT:
-            appname = site + '/'
-            path = settings.STATIC_URL.strip('/')
-            physicalPath = os.path.abspath(settings.STATIC_ROOT)
-            call(appcmd.vdir(appname, path, physicalPath))
-            call(appcmd.handler_del(appname + path, iis_handler, _xfail=True))
-            call(appcmd.auth(appname + path, False))
-
-        if settings.MEDIA_URL and settings.MEDIA_ROOT:
-            appname = site + '/'
-            path = settings.MEDIA_URL.strip('/')
-            physicalPath = os.path.abspath(settings.MEDIA_ROOT)
-            call(appcmd.vdir(appname, path, physicalPath))
-            call(appcmd.handler_del(appname + path, iis_handler, _xfail=True))
-            call(appcmd.auth(appname + path, False))
+            ensure(
+                state.compression(appname + path),
+                'compression',
+                appname + path,
+                commit='apphost',
+            )
+
+        if dry_run or verbose > 0:
+            for change in changes:
+                write(change, self.style.MIGRATE_LABEL)
+            if not changes:
+                write(_('No changes.'), self.style.SUCCESS)
+        if dry_run:
+            return
+
+        call(plan.run(jobs))
+
+        if executor.save() and verbose > 1:
+            write(_('Saved "%s".') % config, self.style.SUCCESS)
@@ -1,42 +1,15 @@
 'iisexpress command'
 import sys
 import os
-from subprocess import Popen, PIPE, STDOUT, list2cmdline
+import time
+from subprocess import list2cmdline
 from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from django.utils.translation import gettext_lazy as _
-
-
-class RecodeStream(object):
-    'Recoding stream wrapper'
-
-    def __init__(self, buffer, data_encoding=None, file_encoding=None):
-        'Convert incoming data to stream from data to file encoding'
-        self.buffer = buffer
-        self.data_encoding = data_encoding
-        self.file_encoding = None
-        if buffer.encoding is None:
-            self.file_encoding = file_encoding or sys.getfilesystemencoding()
-
-    def write(self, buf):
-        'Perform recode'
-        # normalize incoming data into unicode, decoding bytes from utf-8
-        if not isinstance(buf, u''.__class__):
-            buf = buf.decode(self.data_encoding)
-        # optionally encode into FS encoding (eg. pipes on PY2)
-        if self.file_encoding:
-            buf = buf.encode(self.file_encoding)
-        self.buffer.write(buf)
-
-    def __getattr__(self, name):
-        'Proxy attribute access to wrapped stream'
-        return getattr(self.buffer, name)
-
-
-sys.stdout = RecodeStream(sys.__stdout__, 'utf-8')
-sys.stderr = RecodeStream(sys.__stderr__, 'utf-8')
-
-PY2 = sys.version_info[0] < 3
+from zart.windows.metrics import RequestStats
+from zart.windows.pump import Console, RequestFilter
+from zart.windows.stream import recoded
+from zart.windows.supervisor import Supervisor
 
 
 def _asbool(x):
@@ -74,6 +47,48 @@ class Command(BaseCommand):
             or getattr(settings, 'IIS_USER_HOME', '.'),
             help=_('IIS configuration directory (default: %(default)s).'),
         )
+        parser.add_argument(
+            '--stats-interval',
+            type=float,
+            default=0,
+            metavar='SECONDS',
+            help=_('Print request statistics every N seconds.'),
+        )
+        parser.add_argument(
+            '--stats-file',
+            metavar='PATH',
+            help=_('Write request statistics as JSON on exit.'),
+        )
+        parser.add_argument(
+            '--only',
+            metavar='STATUS',
+            help=_('Show only requests with given statuses, eg. "5xx,404".'),
+        )
+        parser.add_argument(
+            '--sample',
+            type=float,
+            metavar='FRACTION',
+            help=_('Show only given fraction of requests, eg. 0.01.'),
+        )
+        parser.add_argument(
+            '--supervise',
+            action='store_true',
+            default=_asbool(os.getenv('IIS_SUPERVISE'))
+            or getattr(settings, 'IIS_SUPERVISE', False),
+            help=_('Restart IIS Express with backoff if it crashes.'),
+        )
+        parser.add_argument(
+            '--warmup',
+            action='append',
+            metavar='URL',
+            default=list(getattr(settings, 'IIS_WARMUP_URLS', [])),
+            help=_('Request URL once IIS Express is running (repeatable).'),
+        )
+
+    def execute(self, *args, **options):
+        'Recode output while command runs'
+        with recoded(self.stdout), recoded(self.stderr):
+            return super(Command, self).execute(*args, **options)
 
     def handle(self, *args, **options):
         'Perform command'
@@ -81,6 +96,11 @@ class Command(BaseCommand):
         bits32 = options['bits32']
         site = options['site']
         iis_user_home = options['home']
+        stats_interval = options['stats_interval']
+        stats_file = options['stats_file']
+        accept = RequestFilter(options['only'], options['sample'])
+        supervise = options['supervise']
+        warmup = options['warmup']
         write, flush = self.stdout.write, self.stdout.flush
 
         # variables
@@ -122,43 +142,68 @@ class Command(BaseCommand):
         if verbose > 1:
             write(_('Running: %s') % (list2cmdline(cmd),))
 
-        # run IIS Express, disable buffering and read line by line
-        # NOTE: sadly, encoding='mbcs' is py3k
-        proc = Popen(cmd, stdout=PIPE, stderr=STDOUT, bufsize=0)
-        try:
-            # on python 2.0 use readline(). see bpo-3907
-            stdout = iter(proc.stdout.readline, b'') if PY2 else proc.stdout
-            for line in stdout:
-                line = line.decode('mbcs').rstrip()
+        stats = RequestStats()
+        console = Console(write, flush)
+        report = [time.time() + stats_interval]
+
+        def summary():
+            console.close()
+            for line in stats.summary():
+                write(line, self.style.MIGRATE_HEADING)
+
+        def process(now, lines):
+            for line in lines:
+                request = stats.feed(line, now)
+                if verbose < 1 or not accept(line, request):
+                    continue
 
                 # apply style
                 style = None
-                if 'HTTP status 5' in line:
-                    style = self.style.HTTP_SERVER_ERROR
-                elif 'HTTP status 404' in line:
-                    style = self.style.HTTP_NOT_FOUND
-                elif 'HTTP status 4' in line:
-                    style = self.style.HTTP_BAD_REQUEST
-                elif 'HTTP status 304' in line:
-                    style = self.style.HTTP_NOT_MODIFIED
-                elif 'HTTP status 3' in line:
-                    style = self.style.HTTP_REDIRECT
-                elif 'HTTP status 2' in line:
-                    style = self.style.HTTP_SUCCESS
-                elif 'HTTP status 1' in line:
-                    style = self.style.HTTP_INFO
+                if request is not None:
+                    style = self.status_style(request.status)
                 elif 'IIS Express' in line:
                     style = self.style.NOTICE
+                console.add(style(line) if style else line)
 
-                if verbose > 0:
-                    write(line, style)
-                    flush()
-            proc.stdout.close()
-            proc.wait()
+            console.tick(now)
+            if stats_interval and verbose > 0 and now >= report[0]:
+                report[0] = now + stats_interval
+                summary()
+
+        def event(message, ok):
+            if verbose > 0:
+                console.close()
+                write(message, self.style.SUCCESS if ok else self.style.ERROR)
+
+        # run IIS Express, read its output in a separate thread in chunks
+        # NOTE: sadly, encoding='mbcs' is py3k
+        supervisor = Supervisor(cmd, 'mbcs', warmup=warmup, restart=supervise)
+        try:
+            # requests in flight are lost with the old process
+            returncode = supervisor.run(process, event, stats.clear_pending)
+            console.close()
             if verbose > 1:
-                write(_('Return code: 0x{:08x}').format(proc.returncode))
+                write(_('Return code: 0x{:08x}').format(returncode))
             if verbose > 0:
+                if stats_interval:
+                    summary()
                 write(_('Done'), self.style.SUCCESS)
         finally:
-            if proc.returncode is None:
-                proc.kill()
+            if stats_file:
+                stats.dump(stats_file)
+
+    def status_style(self, status):
+        'Style for HTTP status code'
+        if status >= 500:
+            return self.style.HTTP_SERVER_ERROR
+        if status == 404:
+            return self.style.HTTP_NOT_FOUND
+        if status >= 400:
+            return self.style.HTTP_BAD_REQUEST
+        if status == 304:
+            return self.style.HTTP_NOT_MODIFIED
+        if status >= 300:
+            return self.style.HTTP_REDIRECT
+        if status >= 200:
+            return self.style.HTTP_SUCCESS
+        return self.style.HTTP_INFO
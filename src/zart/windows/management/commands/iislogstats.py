@@ -0,0 +1,212 @@
+'iislogstats command'
+import os
+import json
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.translation import gettext_lazy as _
+from zart.windows import w3c
+
+NAME_WIDTH = 50  # pattern column
+
+
+def route_pattern(route):
+    'Route of resolver match without anchors of regular expressions'
+    # routes of nested patterns are joined without their leading "^"
+    if route.startswith('^'):
+        route = route[1:]
+    if route.endswith(r'\Z'):
+        route = route[:-2]
+    elif route.endswith('$') and not route.endswith(r'\$'):
+        route = route[:-1]
+    return route
+
+
+def elide(text, width):
+    'Shorten text to width, leaving out its middle'
+    if len(text) <= width:
+        return text
+    head = (width - 3) // 2
+    return text[:head] + '...' + text[head + 3 - width :]
+
+
+def classifier(urlconf=None):
+    'Name URL paths by pattern of urlconf they resolve to'
+    from django.urls import Resolver404, resolve
+
+    # MEDIA_URL defaults to "/", media is served only with MEDIA_ROOT
+    prefixes = [
+        prefix
+        for prefix, root in (
+            (settings.STATIC_URL, True),
+            (settings.MEDIA_URL, settings.MEDIA_ROOT),
+        )
+        if root and prefix and prefix.startswith('/') and prefix != '/'
+    ]
+
+    def classify(path):
+        for prefix in prefixes:
+            if path.startswith(prefix):
+                return prefix + '*'
+        try:
+            match = resolve(path, urlconf)
+        except Resolver404:
+            return '(unresolved)'
+        route = getattr(match, 'route', None)
+        return '/' + (route_pattern(route) if route else match.view_name)
+
+    return classify
+
+
+class Command(BaseCommand):
+    'Summarize IIS W3C request logs by URL pattern.'
+    help = __doc__
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            metavar='PATH',
+            help=_(
+                'Log files or directories (default: Logs of site in IIS '
+                'configuration directory).'
+            ),
+        )
+        parser.add_argument(
+            '--site',
+            default=os.getenv('IIS_SITE_NAME')
+            or getattr(settings, 'IIS_SITE_NAME', 'Website1'),
+            help=_('IIS site name (default: "%(default)s").'),
+        )
+        parser.add_argument(
+            '--home',
+            default=os.getenv('IIS_USER_HOME')
+            or getattr(settings, 'IIS_USER_HOME', '.'),
+            help=_('IIS configuration directory (default: "%(default)s").'),
+        )
+        parser.add_argument(
+            '--since',
+            help=_(
+                'Skip entries before "YYYY-MM-DD[ HH:MM[:SS]]" UTC, or '
+                'before N s, m, h or d ago.'
+            ),
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help=_('Read only entries added since previous --resume run.'),
+        )
+        parser.add_argument(
+            '--state',
+            metavar='PATH',
+            help=_(
+                'File keeping offsets read for --resume (default: '
+                'iislogstats.json in IIS configuration directory).'
+            ),
+        )
+        parser.add_argument(
+            '--urlconf',
+            default=getattr(settings, 'ROOT_URLCONF', None),
+            help=_('URLconf grouping paths (default: "%(default)s").'),
+        )
+        parser.add_argument(
+            '--sort',
+            choices=('time', 'requests', 'errors'),
+            default='time',
+            help=_('Order of patterns (default: "%(default)s").'),
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help=_('Show N patterns, 0 all (default: %(default)s).'),
+        )
+        parser.add_argument(
+            '--json',
+            metavar='PATH',
+            help=_('Write statistics as JSON.'),
+        )
+
+    def handle(self, *args, **options):
+        'Perform command'
+        verbose = options['verbosity']
+        write = self.stdout.write
+        home = options['home']
+        paths = options['paths']
+        if not paths:
+            logs = os.path.join(home, 'Logs')
+            site = os.path.join(logs, options['site'])
+            paths = [site if os.path.isdir(site) else logs]
+        for path in paths:
+            if not os.path.exists(path):
+                raise CommandError(_('Path "%s" does not exist.') % path)
+        since = None
+        if options['since']:
+            try:
+                since = w3c.since(options['since'])
+            except ValueError as e:
+                raise CommandError(e)
+        state = options['state'] or os.path.join(home, 'iislogstats.json')
+        offsets = w3c.load_offsets(state) if options['resume'] else None
+
+        start = time.perf_counter()
+        classify = classifier(options['urlconf'])
+        stats = w3c.collect(paths, classify, since, offsets)
+        elapsed = time.perf_counter() - start
+        if offsets is not None:
+            w3c.save_offsets(offsets, state)
+
+        if verbose > 0:
+            write(
+                '{:<{}} {:>8} {:>6} {:>6} {:>7} {:>7} {:>7} {:>7} '
+                '{:>9}'.format(
+                    'pattern',
+                    NAME_WIDTH,
+                    'requests',
+                    '4xx %',
+                    '5xx %',
+                    'p50 ms',
+                    'p95 ms',
+                    'p99 ms',
+                    'max ms',
+                    'total s',
+                ),
+                self.style.MIGRATE_HEADING,
+            )
+            for name, group in stats.top(options['sort'], options['limit']):
+                latency = group.latency
+                write(
+                    '{:<{}} {:>8} {:>6.1f} {:>6.1f} {:>7g} {:>7g} {:>7g} '
+                    '{:>7g} {:>9.1f}'.format(
+                        elide(name, NAME_WIDTH),
+                        NAME_WIDTH,
+                        group.requests,
+                        group.client_errors * 100.0 / group.requests,
+                        group.error_rate * 100.0,
+                        latency.percentile(50),
+                        latency.percentile(95),
+                        latency.percentile(99),
+                        latency.max,
+                        latency.total / 1000.0,
+                    ),
+                    self.style.ERROR if group.server_errors else None,
+                )
+        if verbose > 1:
+            write(
+                _(
+                    '%d files, %.1f MB, %d entries, %d skipped in %.2fs '
+                    '(%.1f MB/s)'
+                )
+                % (
+                    stats.files,
+                    stats.bytes / 1e6,
+                    stats.entries,
+                    stats.skipped,
+                    elapsed,
+                    stats.bytes / 1e6 / max(elapsed, 1e-9),
+                )
+            )
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(stats.as_dict(), f, indent=2, sort_keys=True)
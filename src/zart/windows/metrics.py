@@ -0,0 +1,231 @@
+'request metrics from IIS Express console output'
+import re
+import json
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+
+# Request started: "GET" http://localhost:8080/
+# Request ended: "http://localhost:8080/" with HTTP status 200.0
+# Request ended: http://localhost:8080/ with HTTP status 200.0
+STARTED = re.compile(
+    r'Request started: "?(?P<method>[A-Z]+)"? "?(?P<url>[^"\s]+)'
+)
+ENDED = re.compile(
+    r'Request ended: (?:"?(?P<method>[A-Z]+)"? )?"?(?P<url>[^"\s]+)"?'
+    r' with HTTP status (?P<status>\d+)(?:\.(?P<substatus>\d+))?'
+    r'(?:.*?time taken:? (?P<time>\d+) ?ms)?'
+)
+
+# latency histogram bucket upper bounds, milliseconds
+BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+# started requests kept per URL, and seconds before one is given up
+MAX_PENDING = 100
+PENDING_TIMEOUT = 300.0
+
+
+def url_path(url):
+    'Path part of URL, without query string'
+    i = url.find('://')
+    if i >= 0:
+        i = url.find('/', i + 3)
+        url = url[i:] if i >= 0 else '/'
+    return url.split('?', 1)[0].split('#', 1)[0] or '/'
+
+
+class Request(object):
+    'Parsed request line'
+    __slots__ = ('method', 'url', 'path', 'status', 'substatus', 'time')
+
+    def __init__(self, method, url, status, substatus=0, time=None):
+        self.method = method or '-'
+        self.url = url
+        self.path = url_path(url)
+        self.status = status
+        self.substatus = substatus
+        self.time = time
+
+    def __repr__(self):
+        return '<Request %s %s %s %sms>' % (
+            self.method,
+            self.url,
+            self.status,
+            self.time,
+        )
+
+
+class Histogram(object):
+    'Fixed bucket latency histogram'
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p):
+        'Upper bound of bucket containing p-th percentile'
+        if not self.count:
+            return 0.0
+        rank = p / 100.0 * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return dict(
+            count=self.count,
+            mean=round(self.mean, 3),
+            max=self.max,
+            p50=self.percentile(50),
+            p95=self.percentile(95),
+            p99=self.percentile(99),
+            buckets=dict(
+                ('le_%s' % b, n)
+                for b, n in zip(self.buckets + ('inf',), self.counts)
+            ),
+        )
+
+
+class RequestStats(object):
+    '''Running request counters.
+
+    IIS Express does not report time taken on console, so it is measured
+    between "Request started" and "Request ended" lines of the same URL.
+    Lines carry no request id, so they are paired first in, first out:
+    when the same URL is requested concurrently and responses come in
+    another order, requests get each other's latencies.
+
+    Started requests which never end (client abort, crash) are given up
+    after `timeout` seconds, at most `max_pending` are kept per URL.
+    '''
+
+    def __init__(
+        self, clock=time.time, max_pending=MAX_PENDING, timeout=PENDING_TIMEOUT
+    ):
+        self.clock = clock
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.started = clock()
+        self.requests = 0
+        self.methods = Counter()
+        self.statuses = Counter()
+        self.urls = Counter()
+        self.latency = Histogram()
+        self.pending = {}
+        self.expires = self.started + timeout
+
+    def clear_pending(self):
+        'Forget started requests, e.g. when server restarts'
+        self.pending.clear()
+
+    def expire(self, now):
+        'Drop started requests older than timeout'
+        limit = now - self.timeout
+        for url, queue in list(self.pending.items()):
+            while queue and queue[0][1] < limit:
+                queue.popleft()
+            if not queue:
+                del self.pending[url]
+        self.expires = now + self.timeout
+
+    def feed(self, line, now=None):
+        'Account console line, return parsed request if it ended'
+        if 'Request ' not in line:
+            return None
+        now = self.clock() if now is None else now
+        if now >= self.expires:
+            self.expire(now)
+        match = STARTED.search(line)
+        if match:
+            url = match.group('url')
+            queue = self.pending.get(url)
+            if queue is None:
+                queue = self.pending[url] = deque(maxlen=self.max_pending)
+            queue.append((match.group('method'), now))
+            return None
+        match = ENDED.search(line)
+        if not match:
+            return None
+        url = match.group('url')
+        method, taken = match.group('method'), match.group('time')
+        queue = self.pending.get(url)
+        while queue and queue[0][1] < now - self.timeout:
+            queue.popleft()
+        if queue:
+            start_method, start = queue.popleft()
+            method = method or start_method
+            if taken is None:
+                taken = (now - start) * 1000.0
+        if queue is not None and not queue:
+            del self.pending[url]
+        request = Request(
+            method,
+            url,
+            int(match.group('status')),
+            int(match.group('substatus') or 0),
+            None if taken is None else float(taken),
+        )
+        self.add(request)
+        return request
+
+    def add(self, request):
+        self.requests += 1
+        self.methods[request.method] += 1
+        self.statuses[request.status] += 1
+        self.urls[request.path] += 1
+        if request.time is not None:
+            self.latency.add(request.time)
+
+    def summary(self, top=5):
+        'Human-readable summary lines'
+        elapsed = max(self.clock() - self.started, 1e-9)
+        lat = self.latency
+        statuses = sorted(self.statuses.items())
+        out = [
+            'Requests: {} ({:.1f}/s), latency ms: mean {:.1f}, p50 {:.1f}, '
+            'p95 {:.1f}, p99 {:.1f}, max {:.1f}'.format(
+                self.requests,
+                self.requests / elapsed,
+                lat.mean,
+                lat.percentile(50),
+                lat.percentile(95),
+                lat.percentile(99),
+                lat.max,
+            ),
+            'Status: ' + ', '.join('{}: {}'.format(*x) for x in statuses),
+        ]
+        out.extend(
+            '  {:>6}  {}'.format(n, url)
+            for url, n in self.urls.most_common(top)
+        )
+        return out
+
+    def as_dict(self):
+        return dict(
+            started=self.started,
+            elapsed=self.clock() - self.started,
+            requests=self.requests,
+            methods=dict(self.methods),
+            statuses=dict((str(k), v) for k, v in self.statuses.items()),
+            urls=dict(self.urls),
+            latency=self.latency.as_dict(),
+        )
+
+    def dump(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
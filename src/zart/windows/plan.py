@@ -0,0 +1,108 @@
+'dependency-aware executor for AppCmd calls'
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+class Step(object):
+    'Deferred AppCmd call'
+
+    def __init__(self, appcmd, args, options):
+        self.appcmd = appcmd
+        self.args = args
+        self.options = options
+        self.reads, self.writes = appcmd.resources(*args, **options)
+        self.deps = []
+
+    def __repr__(self):
+        return '<Step %r>' % (self.args,)
+
+    def __call__(self):
+        return self.appcmd(*self.args, **self.options)
+
+    def conflicts(self, other):
+        'Whether steps must run in submission order'
+        return bool(
+            self.writes & (other.reads | other.writes)
+            or self.reads & other.writes
+        )
+
+
+class Recorder(object):
+    'AppCmd stand-in which records calls into a plan instead of running'
+
+    def __init__(self, plan, appcmd):
+        self.plan = plan
+        self.appcmd = appcmd
+
+    def __repr__(self):
+        return '<Recorder %r>' % self.appcmd
+
+    def __call__(self, *args, **options):
+        return self.plan.add(self.appcmd, args, options)
+
+    def __getattr__(self, name):
+        'Bind AppCmd methods to recorder, so they call it back'
+        attr = getattr(type(self.appcmd), name, None)
+        if callable(attr):
+            return attr.__get__(self, type(self))
+        return getattr(self.appcmd, name)
+
+
+class Plan(object):
+    '''Ordered list of AppCmd calls.
+
+    Each call declares configuration resources it reads and writes, see
+    :meth:`AppCmd.resources`. A call depends on every earlier call it
+    conflicts with; independent calls run in a thread pool.
+    '''
+
+    def __init__(self):
+        self.steps = []
+
+    def __len__(self):
+        return len(self.steps)
+
+    def bind(self, appcmd):
+        'Return AppCmd proxy recording calls into this plan'
+        return Recorder(self, appcmd)
+
+    def add(self, appcmd, args, options):
+        step = Step(appcmd, args, options)
+        step.deps = [
+            i for i, prev in enumerate(self.steps) if prev.conflicts(step)
+        ]
+        self.steps.append(step)
+        return step
+
+    def run(self, workers=4):
+        '''Execute plan, yielding (fail, xfail, cmdline, output) in order.
+
+        No new steps are started after an unexpected failure, results of
+        the steps which did run are still reported.
+        '''
+        steps = self.steps
+        results = [None] * len(steps)
+        pending = list(range(len(steps)))
+        running = {}
+        failed = False
+        done = 0
+        with ThreadPoolExecutor(max(1, workers)) as pool:
+            while pending or running:
+                if not failed:
+                    for i in pending[:]:
+                        if all(results[d] for d in steps[i].deps):
+                            pending.remove(i)
+                            running[pool.submit(steps[i])] = i
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    i = running.pop(future)
+                    results[i] = result = future.result()
+                    if result[0] and not result[1]:
+                        failed = True
+                while done < len(steps) and results[done]:
+                    yield results[done]
+                    done += 1
+        for result in results[done:]:
+            if result:
+                yield result
@@ -0,0 +1,91 @@
+'FastCGI application pool tuning profiles'
+import os
+
+# <fastCgi><application> attributes: range, default
+#
+# activityTimeout: 10-3600, IIS 7.0: 30, IIS 7.5: 70
+# flushNamedPipe: boolean, false
+# idleTimeout: 10-604800, 300
+# instanceMaxRequests: 1-10000000, 200
+# maxInstances: 0-10000, 0 (IIS 7.5+: automatic)
+# monitorChangesTo: path, IIS 7.5+
+# protocol: NamedPipe/Tcp, NamedPipe
+# queueLength: 1-10000000, 1000
+# requestTimeout: 10-604800, 90
+# signalBeforeTerminateSeconds: IIS 7.5+, 0
+# stderrMode: ReturnStdErrIn500/ReturnGeneric500/IgnoreAndReturn200/
+#             TerminateProcess, ReturnStdErrIn500
+
+WORKER_MEMORY = 128  # megabytes, estimated resident size of one worker
+MAX_HEADROOM = 10  # multiple of WORKER_MEMORY a worker may grow to
+
+
+def dev(cpus, memory):
+    'Recycle workers often, so code changes are picked up quickly'
+    return dict(activityTimeout=10, idleTimeout=10, instanceMaxRequests=10)
+
+
+def _instances(per_cpu, cpus, memory):
+    instances = per_cpu * cpus
+    if memory:
+        instances = min(instances, memory // WORKER_MEMORY)
+    return max(1, instances)
+
+
+def _max_requests(base, instances, memory):
+    '''Requests before worker is recycled.
+
+    Recycling bounds memory growth of workers, so `base` is scaled by
+    the memory budget share of one worker, in multiples of WORKER_MEMORY
+    up to MAX_HEADROOM; without budget, workers may grow that much.
+    '''
+    headroom = MAX_HEADROOM
+    if memory:
+        headroom = min(headroom, memory // instances // WORKER_MEMORY)
+    return base * max(1, headroom)
+
+
+def production(cpus, memory):
+    'One worker serves one request at a time, so keep a couple per CPU'
+    instances = _instances(2, cpus, memory)
+    return dict(
+        activityTimeout=70,
+        idleTimeout=300,
+        instanceMaxRequests=_max_requests(1000, instances, memory),
+        maxInstances=instances,
+        queueLength=instances * 100,
+        requestTimeout=90,
+    )
+
+
+def high_concurrency(cpus, memory):
+    'More workers for I/O bound requests, recycled rarely'
+    instances = _instances(4, cpus, memory)
+    return dict(
+        activityTimeout=70,
+        idleTimeout=1800,
+        instanceMaxRequests=_max_requests(10000, instances, memory),
+        maxInstances=instances,
+        queueLength=instances * 250,
+        requestTimeout=90,
+    )
+
+
+PROFILES = {
+    'dev': dev,
+    'production': production,
+    'high-concurrency': high_concurrency,
+}
+
+
+def fastcgi_params(profile='dev', cpus=None, memory=None):
+    '''FastCGI application attributes for named profile.
+
+    `cpus` defaults to CPU count, `memory` is budget for all workers in
+    megabytes, unlimited if not set.
+    '''
+    try:
+        factory = PROFILES[profile]
+    except KeyError:
+        raise ValueError('Unknown FastCGI profile "%s"' % profile)
+    return factory(cpus or os.cpu_count() or 1, memory and int(memory))
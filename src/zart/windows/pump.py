@@ -0,0 +1,198 @@
+'non-blocking child process output pump'
+import os
+import sys
+import time
+import codecs
+import random
+import threading
+
+try:
+    import queue
+except ImportError:  # py2
+    import Queue as queue
+
+CHUNK_SIZE = 1 << 16  # bytes per read
+QUEUE_SIZE = 256  # chunks buffered before reader blocks
+FLUSH_INTERVAL = 0.1  # seconds between console writes
+
+
+class Pump(object):
+    '''Drain pipe in a reader thread.
+
+    Data is read in large chunks, decoded incrementally (multibyte
+    sequences may be split between chunks) and split into lines, which
+    are handed over in batches of (timestamp, lines).
+    '''
+
+    def __init__(self, stream, encoding='utf-8', chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(QUEUE_SIZE)
+        self.error = None
+        self.thread = threading.Thread(target=self._read, name='pump')
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _read(self):
+        fd = self.stream.fileno()
+        decoder = codecs.getincrementaldecoder(self.encoding)('replace')
+        tail = ''
+        try:
+            while True:
+                data = os.read(fd, self.chunk_size)
+                text = tail + decoder.decode(data, not data)
+                lines = text.split('\n')
+                tail = lines.pop()
+                if tail and not data:
+                    lines.append(tail)
+                if lines:
+                    self.queue.put(
+                        (time.time(), [line.rstrip() for line in lines])
+                    )
+                if not data:
+                    break
+        except Exception as e:
+            self.error = e
+        finally:
+            self.queue.put(None)
+
+    def batches(self, timeout=FLUSH_INTERVAL):
+        '''Yield (timestamp, lines) of every chunk until end of stream.
+
+        Empty batch is yielded every `timeout` seconds without data, so
+        that caller can perform periodic work.
+        '''
+        get = self.queue.get
+        while True:
+            try:
+                batch = get(timeout=timeout)
+            except queue.Empty:
+                yield time.time(), []
+                continue
+            if batch is None:
+                break
+            # every chunk keeps the time it was read, so that request
+            # latencies are not skewed; Console coalesces the writes
+            yield batch
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class Console(object):
+    'Batch console writes, flushing at most every `interval` seconds'
+
+    def __init__(self, write, flush, interval=FLUSH_INTERVAL):
+        self.write = write
+        self.flush = flush
+        self.interval = interval
+        self.lines = []
+        self.deadline = 0
+
+    def add(self, line):
+        self.lines.append(line)
+
+    def tick(self, now):
+        if self.lines and now >= self.deadline:
+            self.close()
+            self.deadline = now + self.interval
+
+    def close(self):
+        if self.lines:
+            self.write('\n'.join(self.lines))
+            self.lines = []
+        self.flush()
+
+
+class RequestFilter(object):
+    '''Select request lines to show.
+
+    `only` is comma-separated list of status codes or classes, like
+    "5xx,404"; `sample` is fraction of request lines to show. When either
+    is active, "Request started" lines are hidden, as their status is not
+    known yet. Other lines are always shown.
+    '''
+
+    def __init__(self, only=None, sample=None, random=random.random):
+        self.ranges = []
+        for code in (only or '').split(','):
+            code = code.strip().lower()
+            if not code:
+                continue
+            if code.endswith('xx'):
+                low = int(code[0]) * 100
+                self.ranges.append((low, low + 99))
+            else:
+                self.ranges.append((int(code), int(code)))
+        self.sample = 1.0 if sample is None else float(sample)
+        self.random = random
+        self.active = bool(self.ranges) or self.sample < 1.0
+
+    def __call__(self, line, request):
+        if not self.active:
+            return True
+        if request is None:
+            return 'Request started' not in line
+        if self.ranges and not any(
+            low <= request.status <= high for low, high in self.ranges
+        ):
+            return False
+        return self.sample >= 1.0 or self.random() < self.sample
+
+
+# fake IIS Express, writing argv[1] request lines
+_EMIT = '''
+import sys
+line = b'Request ended: "http://localhost/x.css" with HTTP status %s.0\\r\\n'
+block = b''.join(line % s for s in (b'200', b'304', b'404', b'500') * 256)
+for i in range(int(sys.argv[1]) // 1024):
+    sys.stdout.buffer.write(block)
+'''
+
+
+def bench(lines=1000000, sample=None, only=None):
+    'Compare line-by-line and pumped console output throughput'
+    from subprocess import Popen, PIPE
+    from zart.windows.metrics import RequestStats
+
+    cmd = [sys.executable, '-c', _EMIT, str(lines)]
+    devnull = open(os.devnull, 'w')
+    results = {}
+
+    start = time.time()
+    proc = Popen(cmd, stdout=PIPE, bufsize=0)
+    stats = RequestStats()
+    for line in proc.stdout:
+        line = line.decode('utf-8').rstrip()
+        stats.feed(line)
+        devnull.write(line + '\n')
+        devnull.flush()
+    proc.wait()
+    results['line'] = stats.requests / (time.time() - start)
+
+    start = time.time()
+    proc = Popen(cmd, stdout=PIPE, bufsize=0)
+    stats = RequestStats()
+    accept = RequestFilter(only, sample)
+    console = Console(devnull.write, devnull.flush)
+    for now, batch in Pump(proc.stdout).start().batches():
+        for line in batch:
+            request = stats.feed(line, now)
+            if accept(line, request):
+                console.add(line)
+        console.tick(now)
+    console.close()
+    proc.wait()
+    results['pump'] = stats.requests / (time.time() - start)
+    devnull.close()
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for name, rate in sorted(bench(n).items()):
+        print('{:<5} {:>12,.0f} lines/s'.format(name, rate))
@@ -0,0 +1,160 @@
+'recoding output streams'
+import os
+import io
+import sys
+import time
+import codecs
+from contextlib import contextmanager
+
+BUFSIZE = 1 << 16
+text_type = u''.__class__  # this MUST be u''.__class__
+
+
+def _codec(name):
+    return codecs.lookup(name).name
+
+
+class RecodeStream(object):
+    '''Buffered recoding stream wrapper.
+
+    Bytes are decoded from data encoding with incremental codecs, so
+    multibyte sequences split between writes survive. Bytes already in
+    file encoding are collected and passed to the underlying binary
+    buffer as is, until `bufsize` bytes, newline on a terminal, or
+    explicit flush. Text goes to text streams directly, they are buffered
+    already.
+    '''
+
+    def __init__(
+        self,
+        stream,
+        data_encoding='utf-8',
+        file_encoding=None,
+        bufsize=BUFSIZE,
+    ):
+        self.stream = stream
+        self.data_encoding = data_encoding
+        self.bufsize = bufsize
+        self.text = isinstance(stream, io.TextIOBase)
+        self.raw = getattr(stream, 'buffer', None)
+        if not self.text:
+            self.raw = stream  # byte stream, eg. pipe on py2
+        self.file_encoding = (
+            getattr(stream, 'encoding', None)
+            or file_encoding
+            or sys.getfilesystemencoding()
+        )
+        self.passthrough = self.raw is not None and _codec(
+            data_encoding
+        ) == _codec(self.file_encoding)
+        self.decode = codecs.getincrementaldecoder(data_encoding)(
+            'replace'
+        ).decode
+        self.encode = None
+        if not self.text:
+            self.encode = codecs.getincrementalencoder(self.file_encoding)(
+                'replace'
+            ).encode
+        self.tty = bool(getattr(stream, 'isatty', None) and stream.isatty())
+        self.pending = bytearray()
+        # text goes to text stream as is while no bytes are pending
+        self.text_write = stream.write if self.text else None
+
+    def write(self, buf):
+        'Perform recode'
+        if self.text_write is not None and buf.__class__ is text_type:
+            return self.text_write(buf)  # fast path, nothing pending
+        if isinstance(buf, text_type):
+            if self.text:
+                if self.pending:
+                    self.flush()
+                return self.stream.write(buf)
+        elif not self.passthrough:
+            return self.write(self.decode(buf))
+        data = buf if self.encode is None else self.encode(buf)
+        pending = self.pending
+        pending += data
+        self.text_write = None
+        if len(pending) >= self.bufsize or (self.tty and data[-1:] == b'\n'):
+            self.flush()
+        return len(buf)
+
+    def flush(self):
+        if self.text:
+            self.stream.flush()  # keep order with text layer writes
+        if self.pending:
+            self.raw.write(self.pending)
+            del self.pending[:]
+        if self.text:
+            self.text_write = self.stream.write
+        if self.raw is not None:
+            self.raw.flush()
+
+    def __getattr__(self, name):
+        'Proxy attribute access to wrapped stream'
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def recoded(wrapper, data_encoding='utf-8'):
+    'Recode output of Django OutputWrapper while in context'
+    out = wrapper._out
+    wrapper._out = stream = RecodeStream(out, data_encoding)
+    try:
+        yield stream
+    finally:
+        wrapper._out = out
+        stream.flush()
+
+
+class _Legacy(object):
+    'Recoding stream wrapper used before, for comparison'
+
+    def __init__(self, buffer, data_encoding=None, file_encoding=None):
+        self.buffer = buffer
+        self.data_encoding = data_encoding
+        self.file_encoding = None
+        if buffer.encoding is None:
+            self.file_encoding = file_encoding or sys.getfilesystemencoding()
+
+    def write(self, buf):
+        if not isinstance(buf, u''.__class__):
+            buf = buf.decode(self.data_encoding)
+        if self.file_encoding:
+            buf = buf.encode(self.file_encoding)
+        self.buffer.write(buf)
+
+    def flush(self):
+        self.buffer.flush()
+
+
+def bench(writes=100000):
+    'Compare legacy and buffered wrappers writing text and utf-8 bytes'
+    line = u'Request ended: "http://localhost/\u0444" with HTTP status 200\n'
+    factories = (('legacy', _Legacy), ('recode', RecodeStream))
+    results = {}
+    for size in (1, 100):
+        text = line * size
+        for kind, buf in (('text', text), ('bytes', text.encode('utf-8'))):
+            for name, factory in factories:
+                with open(os.devnull, 'wb') as f:
+                    stream = factory(io.TextIOWrapper(f, 'utf-8'), 'utf-8')
+                    write = stream.write
+                    start = time.time()
+                    for i in range(writes // size):
+                        write(buf)
+                    stream.flush()
+                    elapsed = time.time() - start
+                total = len(buf) * (writes // size)
+                results[name, kind, size] = total / elapsed
+    return results
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for (name, kind, size), rate in sorted(bench(n).items()):
+        print(
+            '{:<6} {:<5} {:>3} lines/write {:>8.1f} MB/s'.format(
+                name, kind, size, rate / 1e6
+            )
+        )
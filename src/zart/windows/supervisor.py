@@ -0,0 +1,157 @@
+'supervised child process runner'
+import re
+import time
+import threading
+from collections import deque
+from subprocess import Popen, PIPE, STDOUT
+from .pump import Pump
+
+READY = 'IIS Express is running'
+REGISTERED = re.compile(r'Successfully registered URL "(?P<url>[^"]+)"')
+BASE_URL = 'http://localhost:8080/'
+STABLE = 60.0  # seconds of uptime after which backoff is reset
+
+
+class Supervisor(object):
+    '''Run child process, watching its output.
+
+    Readiness is detected by `ready` marker in output, then `warmup` URLs
+    are requested in background, relative to the first URL the child
+    reported as registered. Time to ready and to first byte of every
+    warmup response are reported. If `restart` is set, child which exited
+    with non-zero code is started again after exponential backoff.
+    '''
+
+    def __init__(
+        self,
+        cmd,
+        encoding='utf-8',
+        warmup=(),
+        restart=False,
+        backoff=1.0,
+        max_backoff=30.0,
+        ready=READY,
+        timeout=60.0,
+    ):
+        self.cmd = cmd
+        self.encoding = encoding
+        self.warmup = list(warmup)
+        self.restart = restart
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.marker = ready
+        self.timeout = timeout
+        self.messages = deque()
+        self.proc = None
+        self.started = None
+        self.ready = None
+        self.urls = []
+        self.restarts = 0
+        self.warmer = None
+
+    def run(self, handle, report, restarted=None):
+        '''Run child until it exits normally.
+
+        `handle(now, lines)` is called for every batch of output lines,
+        `report(message, ok)` for supervisor events and `restarted()`
+        before child is started again, all in this thread.
+        Returns child exit code.
+        '''
+        attempt = 0
+        while True:
+            self.started, self.ready, self.urls = time.time(), None, []
+            self.proc = proc = Popen(
+                self.cmd, stdout=PIPE, stderr=STDOUT, bufsize=0
+            )
+            try:
+                pump = Pump(proc.stdout, self.encoding).start()
+                for now, lines in pump.batches():
+                    for line in lines:
+                        self.watch(now, line)
+                    handle(now, lines)
+                    while self.messages:
+                        report(*self.messages.popleft())
+                proc.stdout.close()
+                proc.wait()
+            finally:
+                if proc.returncode is None:
+                    proc.kill()
+                    proc.wait()
+            # report warmup of this child before it is restarted
+            if self.warmer is not None:
+                self.warmer.join()
+                self.warmer = None
+            while self.messages:
+                report(*self.messages.popleft())
+            if not self.restart or proc.returncode == 0:
+                return proc.returncode
+            if time.time() - self.started > STABLE:
+                attempt = 0
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt)
+            attempt += 1
+            self.restarts += 1
+            report(
+                'Exited with code 0x{:08x}, restarting in {:.1f}s'.format(
+                    proc.returncode & 0xFFFFFFFF, delay
+                ),
+                False,
+            )
+            time.sleep(delay)
+            if restarted is not None:
+                restarted()
+
+    def watch(self, now, line):
+        'Detect registered URLs and readiness'
+        if self.ready is not None:
+            return
+        match = REGISTERED.search(line)
+        if match:
+            self.urls.append(match.group('url'))
+        elif self.marker in line:
+            self.ready = now
+            self.messages.append(
+                ('Ready in {:.3f}s'.format(now - self.started), True)
+            )
+            if self.warmup:
+                self.warmer = threading.Thread(target=self.warm, name='warmup')
+                self.warmer.daemon = True
+                self.warmer.start()
+
+    def warm(self):
+        'Request warmup URLs, measuring time to first byte'
+        # urllib.request costs tens of milliseconds, import when needed
+        try:
+            from urllib.parse import urljoin
+            from urllib.request import urlopen
+            from urllib.error import HTTPError, URLError
+        except ImportError:  # py2
+            from urlparse import urljoin
+            from urllib2 import urlopen, HTTPError, URLError
+
+        base = self.urls[0] if self.urls else BASE_URL
+        for path in self.warmup:
+            url = urljoin(base, path)
+            start = time.time()
+            try:
+                try:
+                    response = urlopen(url, timeout=self.timeout)
+                except HTTPError as e:
+                    response = e
+                ttfb = time.time() - start
+                response.read()
+                response.close()
+                total = time.time() - start
+                status = response.code
+            except (URLError, OSError) as e:
+                self.messages.append(
+                    ('Warmup {} failed: {}'.format(url, e), False)
+                )
+                continue
+            self.messages.append(
+                (
+                    'Warmup {} {}: first byte {:.0f}ms, total {:.0f}ms'.format(
+                        url, status, ttfb * 1000, total * 1000
+                    ),
+                    status < 500,
+                )
+            )
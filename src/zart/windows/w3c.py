@@ -0,0 +1,257 @@
+'''streaming statistics of W3C extended log files written by IIS
+
+Files are memory mapped and scanned line by line, so multi-gigabyte logs
+are never read into memory. Offset after the last complete line is kept
+for every file, so next run resumes where this one stopped.
+'''
+import os
+import re
+import json
+import mmap
+import time
+import calendar
+from zart.windows.metrics import Histogram
+
+LOG_EXTENSION = '.log'
+CACHE_SIZE = 10000  # classified paths remembered
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # W3C date and time fields, UTC
+RELATIVE = re.compile(r'^(\d+)\s*([smhd])$')
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def log_files(paths):
+    'Log files of `paths`, directories searched recursively'
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for filename in sorted(files):
+                if filename.lower().endswith(LOG_EXTENSION):
+                    yield os.path.join(root, filename)
+
+
+def since(value, now=None):
+    '''Start of period as W3C date and time, UTC.
+
+    Accepts "YYYY-MM-DD", "YYYY-MM-DD HH:MM[:SS]" or relative "30m",
+    "12h", "7d" before `now`.
+    '''
+    value = value.strip()
+    match = RELATIVE.match(value)
+    if match:
+        now = time.time() if now is None else now
+        seconds = int(match.group(1)) * UNITS[match.group(2)]
+        return time.strftime(TIME_FORMAT, time.gmtime(now - seconds))
+    value = value.replace('T', ' ')
+    for format in ('%Y-%m-%d', '%Y-%m-%d %H:%M', TIME_FORMAT):
+        try:
+            return time.strftime(TIME_FORMAT, time.strptime(value, format))
+        except ValueError:
+            pass
+    raise ValueError('Invalid time "%s"' % value)
+
+
+class LogFile(object):
+    '''Entries of log file after `offset`, as lists of byte strings.
+
+    `fields` are names from the last "#Fields" directive read, `offset`
+    follows the last complete line; incomplete line being written is
+    left for next run.
+    '''
+
+    def __init__(self, path, offset=0, fields=None):
+        self.path = path
+        self.offset = offset
+        self.fields = fields
+
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.offset:  # truncated or replaced
+                self.offset, self.fields = 0, None
+            if size == self.offset:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                find = m.find
+                pos = self.offset
+                while True:
+                    end = find(b'\n', pos)
+                    if end < 0:
+                        break
+                    line = m[pos:end].rstrip(b'\r')
+                    pos = self.offset = end + 1
+                    if not line:
+                        continue
+                    if line[:1] == b'#':
+                        if line.startswith(b'#Fields:'):
+                            self.fields = line[8:].decode('ascii').split()
+                        continue
+                    yield line.split(b' ')
+
+
+class Group(object):
+    'Statistics of requests of one URL pattern'
+    __slots__ = ('requests', 'client_errors', 'server_errors', 'latency')
+
+    def __init__(self):
+        self.requests = 0
+        self.client_errors = 0
+        self.server_errors = 0
+        self.latency = Histogram()
+
+    @property
+    def error_rate(self):
+        return self.server_errors / float(self.requests or 1)
+
+    def as_dict(self):
+        return dict(
+            requests=self.requests,
+            client_errors=self.client_errors,
+            server_errors=self.server_errors,
+            latency=self.latency.as_dict(),
+        )
+
+
+class LogStats(object):
+    '''Requests grouped by `classify(path)`.
+
+    Entries before `since` (W3C date and time) are skipped, as are files
+    last modified before it.
+    '''
+
+    def __init__(self, classify=None, since=None):
+        self.classify = classify or (lambda path: path)
+        self.since = since.encode('ascii') if since else None
+        self.mtime = (
+            calendar.timegm(time.strptime(since, TIME_FORMAT))
+            if since
+            else None
+        )
+        self.groups = {}
+        self.cache = {}
+        self.files = 0
+        self.bytes = 0
+        self.entries = 0
+        self.skipped = 0
+
+    def group(self, stem):
+        'Group of URL path, as logged'
+        name = self.cache.get(stem)
+        if name is None:
+            if len(self.cache) >= CACHE_SIZE:
+                self.cache.clear()
+            path = stem.decode('utf-8', 'replace')
+            name = self.cache[stem] = self.classify(path)
+        group = self.groups.get(name)
+        if group is None:
+            group = self.groups[name] = Group()
+        return group
+
+    def feed(self, logfile):
+        'Account entries of LogFile'
+        if self.mtime and os.path.getmtime(logfile.path) < self.mtime:
+            return
+        start = logfile.offset
+        fields = object()  # no directive read yet
+        since = self.since
+        for values in logfile:
+            if logfile.fields is not fields:
+                fields = logfile.fields
+                index = dict((n, i) for i, n in enumerate(fields or ()))
+                date = index.get('date')
+                clock = index.get('time')
+                stem = index.get('cs-uri-stem')
+                status = index.get('sc-status')
+                taken = index.get('time-taken')
+                size = len(index)
+                dated = since and date is not None and clock is not None
+            if stem is None or status is None or len(values) != size:
+                self.skipped += 1
+                continue
+            if dated and values[date] + b' ' + values[clock] < since:
+                continue
+            try:
+                code = int(values[status])
+            except ValueError:
+                self.skipped += 1
+                continue
+            group = self.group(values[stem])
+            group.requests += 1
+            if code >= 500:
+                group.server_errors += 1
+            elif code >= 400:
+                group.client_errors += 1
+            if taken is not None and values[taken].isdigit():
+                group.latency.add(int(values[taken]))
+            self.entries += 1
+        self.files += 1
+        self.bytes += logfile.offset - start
+
+    def top(self, key='time', limit=None):
+        '(name, Group) pairs by total `time`, `requests` or `errors`'
+        order = {
+            'time': lambda item: item[1].latency.total,
+            'requests': lambda item: item[1].requests,
+            'errors': lambda item: item[1].server_errors,
+        }[key]
+        items = sorted(self.groups.items(), key=order, reverse=True)
+        return items[:limit] if limit else items
+
+    def as_dict(self):
+        return dict(
+            files=self.files,
+            bytes=self.bytes,
+            entries=self.entries,
+            skipped=self.skipped,
+            groups=dict(
+                (name, group.as_dict()) for name, group in self.groups.items()
+            ),
+        )
+
+
+def load_offsets(filename):
+    'Resume state: {path: (offset, fields)}'
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        data = json.load(f)
+    return dict(
+        (path, (item['offset'], item['fields']))
+        for path, item in data.get('files', {}).items()
+    )
+
+
+def save_offsets(offsets, filename):
+    tmp = filename + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(
+            {
+                'files': dict(
+                    (path, {'offset': offset, 'fields': fields})
+                    for path, (offset, fields) in offsets.items()
+                )
+            },
+            f,
+            indent=2,
+            sort_keys=True,
+        )
+    os.replace(tmp, filename)
+
+
+def collect(paths, classify=None, since=None, offsets=None):
+    '''LogStats of log files under `paths`.
+
+    With `offsets` dict, files are read from offsets stored in it, which
+    are then updated.
+    '''
+    stats = LogStats(classify, since)
+    for path in log_files(paths):
+        key = os.path.abspath(path)
+        offset, fields = (offsets or {}).get(key, (0, None))
+        logfile = LogFile(path, offset, fields)
+        stats.feed(logfile)
+        if offsets is not None:
+            offsets[key] = (logfile.offset, logfile.fields)
+    return stats
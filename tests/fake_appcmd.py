@@ -0,0 +1,43 @@
+'''appcmd.exe stand-in
+
+Prints its arguments, with start and end times of the run; "list OBJECT
+/xml" prints captured output of data/appcmd/list-OBJECT.xml instead.
+Options:
+
+/sleep:SECONDS  sleep before exiting
+/fail:1         print appcmd error message and exit with status 1
+/exit:CODE      exit status (default: 0)
+/endless:1      list objects over and over, until killed
+/pidfile:PATH   write process id into file
+'''
+import os
+import sys
+import time
+
+DATA = os.path.join(os.path.dirname(__file__), 'data', 'appcmd')
+
+args = [arg for arg in sys.argv[1:] if arg[:1] != '/']
+options = dict(
+    arg[1:].partition(':')[::2] for arg in sys.argv[1:] if arg[:1] == '/'
+)
+if options.get('pidfile'):
+    with open(options['pidfile'], 'w') as f:
+        f.write(str(os.getpid()))
+start = time.time()
+time.sleep(float(options.get('sleep', 0)))
+if options.get('fail'):
+    print('ERROR ( message:Failed %s. )' % ' '.join(sys.argv[1:]))
+    sys.exit(1)
+if args[:1] == ['list'] and 'xml' in options:
+    with open(os.path.join(DATA, 'list-%s.xml' % args[1]), 'rb') as f:
+        lines = f.readlines()
+    out = sys.stdout.buffer
+    if options.get('endless'):
+        out.writelines(lines[:2])
+        while True:
+            out.writelines(lines[2:-1])
+            out.flush()
+    out.writelines(lines)
+else:
+    print('%r %f %f' % (sys.argv[1:], start, time.time()))
+sys.exit(int(options.get('exit', 0)))
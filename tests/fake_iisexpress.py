@@ -0,0 +1,61 @@
+'''iisexpress.exe stand-in
+
+Prints the startup lines of IIS Express, serves HTTP on a free local
+port and exits. Options:
+
+--serve N         serve N requests before exiting (default: 0)
+--delay SECONDS   wait before answering, time to first byte
+--exit CODE       exit status (default: 0)
+--crash FILE N    exit with status 3 on first N runs, counted in FILE
+'''
+import os
+import sys
+import time
+import argparse
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--serve', type=int, default=0)
+parser.add_argument('--delay', type=float, default=0.0)
+parser.add_argument('--exit', type=int, default=0)
+parser.add_argument('--crash', nargs=2, metavar=('FILE', 'N'))
+args = parser.parse_args()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        time.sleep(args.delay)
+        status = 200 if self.path == '/' else 404
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        print(
+            'Request ended: "http://localhost%s" with HTTP status %s.0'
+            % (self.path, args[1])
+        )
+
+
+server = HTTPServer(('127.0.0.1', 0), Handler)
+print('Starting IIS Express ...')
+print(
+    'Successfully registered URL "http://127.0.0.1:%d/" for site "WebSite1"'
+    % server.server_address[1]
+)
+print('IIS Express is running.')
+sys.stdout.flush()
+for i in range(args.serve):
+    server.handle_request()
+    sys.stdout.flush()
+server.server_close()
+
+if args.crash:
+    filename, crashes = args.crash[0], int(args.crash[1])
+    runs = os.path.getsize(filename) if os.path.exists(filename) else 0
+    with open(filename, 'a') as f:
+        f.write('.')
+    if runs < crashes:
+        sys.exit(3)
+sys.exit(args.exit)
@@ -0,0 +1,89 @@
+import os
+import sys
+import time
+import pytest
+from zart.windows.appcmd import App, AppCmd, AppCmdError, Config, Site, Vdir
+
+FAKE = [
+    sys.executable,
+    os.path.join(os.path.dirname(__file__), 'fake_appcmd.py'),
+]
+
+
+@pytest.fixture
+def appcmd():
+    return AppCmd(FAKE)
+
+
+def test_list_sites(appcmd):
+    sites = appcmd.list_sites()
+    assert not isinstance(sites, list)  # streamed
+    sites = list(sites)
+    assert [type(site) for site in sites] == [Site, Site]
+    site = sites[1]
+    assert (site.name, site.id, site.state) == ('WebSite2', 2, 'Stopped')
+    assert site.bindings.split(',') == [
+        'http/:8081:localhost',
+        'https/:44300:localhost',
+    ]
+    assert site.attrs == {}
+    assert not hasattr(site, '__dict__')
+
+
+def test_list_apps(appcmd):
+    apps = list(appcmd.list_apps(site='WebSite1'))
+    assert [(app.name, app.site, app.path) for app in apps] == [
+        ('WebSite1/', 'WebSite1', '/'),
+        ('WebSite1/api', 'WebSite1', '/api'),
+    ]
+    assert isinstance(apps[0], App)
+    assert apps[0].pool == 'Clr4IntegratedAppPool'
+    # attributes without field are kept
+    assert apps[1].attrs == {'enabledProtocols': 'http'}
+
+
+def test_list_vdirs(appcmd):
+    vdirs = list(appcmd.list_vdirs(app='WebSite1/'))
+    assert [type(vdir) for vdir in vdirs] == [Vdir, Vdir]
+    assert vdirs[1].name == 'WebSite1/static'
+    assert vdirs[1].physical_path == r'C:\Users\dev\site\static'
+
+
+def test_list_config(appcmd):
+    (config,) = appcmd.list_config('staticContent', 'WebSite1/static')
+    assert isinstance(config, Config)
+    assert config.section == 'system.webServer/staticContent'
+    assert config.locked is False
+    assert config.override_mode == 'Inherit'
+    assert config.element.tag == 'system.webServer-staticContent'
+    cache = config.element.find('clientCache')
+    assert cache.get('cacheControlMaxAge') == '365.00:00:00'
+
+
+def test_close_kills(appcmd, tmp_path):
+    pidfile = str(tmp_path / 'pid')
+    sites = appcmd.list_sites(endless='1', pidfile=pidfile)
+    names = [next(sites).name for i in range(5)]
+    assert names == ['WebSite1', 'WebSite2'] * 2 + ['WebSite1']
+    pid = int(open(pidfile).read())
+    start = time.time()
+    sites.close()
+    assert time.time() - start < 5
+    with pytest.raises(OSError):
+        os.kill(pid, 0)  # killed and reaped
+
+
+def test_error_output(appcmd):
+    with pytest.raises(AppCmdError) as e:
+        list(appcmd.list_sites('Missing', fail='1'))
+    message = str(e.value)
+    assert 'list site Missing /xml' in message
+    assert 'ERROR ( message:Failed' in message
+
+
+def test_exit_code(appcmd):
+    sites = appcmd.list_sites(exit='2')
+    assert next(sites).name == 'WebSite1'
+    with pytest.raises(AppCmdError) as e:
+        list(sites)
+    assert str(e.value).endswith(': exit code 2')
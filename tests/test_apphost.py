@@ -0,0 +1,153 @@
+import os
+import shutil
+import pytest
+from zart.windows.apphost import AppHostCmd, AppHostConfig, parse
+
+TEMPLATE = os.path.join(
+    os.path.dirname(__file__), 'data', 'applicationhost.config'
+)
+
+
+@pytest.fixture
+def config(tmp_path):
+    path = str(tmp_path / 'applicationhost.config')
+    shutil.copy(TEMPLATE, path)
+    return path
+
+
+@pytest.fixture
+def appcmd(config):
+    return AppHostCmd(config=config)
+
+
+def saved(config):
+    return AppHostConfig(config).load()
+
+
+def test_unlock(appcmd, config):
+    fail, xfail, cmdline, out = appcmd.unlock('anonymousAuthentication')
+    assert not fail
+    assert 'system.webServer/security/authentication/' in out
+    assert appcmd.save()
+    document = saved(config)
+    path = document.section_path('anonymousAuthentication')
+    assert document.sections[path][1].get('overrideModeDefault') == 'Allow'
+    # already saved, nothing to write
+    assert not appcmd.save()
+
+
+def test_fastcgi(appcmd, config):
+    # delete of missing application is expected to fail
+    results = appcmd.fastcgi(
+        fullPath='python.exe',
+        arguments='-m zart.windows.fcgi',
+        env={'DJANGO_SETTINGS_MODULE': 'site.settings'},
+        params={'maxInstances': '4'},
+    )
+    assert [r[:2] for r in results] == [(True, True), (False, None)]
+    appcmd.save()
+    app = saved(config).root.find('system.webServer/fastCgi/application')
+    assert app.attrib == {
+        'fullPath': 'python.exe',
+        'arguments': '-m zart.windows.fcgi',
+        'maxInstances': '4',
+    }
+    var = app.find('environmentVariables/environmentVariable')
+    assert var.attrib == {
+        'name': 'DJANGO_SETTINGS_MODULE',
+        'value': 'site.settings',
+    }
+    # again, old application is removed with its variables
+    results = appcmd.fastcgi(
+        fullPath='python.exe', arguments='-m zart.windows.fcgi', env={}
+    )
+    assert [r[0] for r in results] == [False, False]
+    apps = appcmd.document.root.findall('system.webServer/fastCgi/application')
+    assert len(apps) == 1 and not len(apps[0])
+
+
+def test_handler_masks_inherited(appcmd):
+    fail, xfail, cmdline, out = appcmd.handler_del(
+        'WebSite1/static', 'StaticFile'
+    )
+    assert not fail
+    handlers = appcmd.document.root.find(
+        "location[@path='WebSite1/static']/system.webServer/handlers"
+    )
+    assert [(e.tag, e.get('name')) for e in handlers] == [
+        ('remove', 'StaticFile')
+    ]
+    fail, xfail, cmdline, out = appcmd.handler_del('WebSite1/static', 'Nope')
+    assert fail and out.startswith('ERROR (')
+
+
+def test_vdir(appcmd, config):
+    results = appcmd.vdir('WebSite1/', 'static', '/srv/static')
+    assert [r[:2] for r in results] == [(True, True), (False, None)]
+    results = appcmd.vdir('WebSite1/', 'static', '/srv/assets')
+    assert [r[0] for r in results] == [False, False]
+    appcmd.save()
+    document = saved(config)
+    app = document.site('WebSite1').find('application')
+    vdirs = dict(
+        (e.get('path'), e.get('physicalPath'))
+        for e in app.findall('virtualDirectory')
+    )
+    assert vdirs == {
+        '/': r'%IIS_SITES_HOME%\WebSite1',
+        '/static': '/srv/assets',
+    }
+    # added element is indented as its siblings
+    text = open(config).read()
+    assert '\n' + ' ' * 20 + '<virtualDirectory path="/static"' in text
+
+
+def test_vdir_indent_empty_application(appcmd):
+    document = appcmd.document.load()
+    app = document.site('WebSite1').find('application')
+    for vdir in list(app):
+        app.remove(vdir)
+    app.text = None
+    document.vdir_add('WebSite1/', '/static', '/srv/static')
+    assert app.text == '\n' + ' ' * 20
+    assert app[0].tail == '\n' + ' ' * 16
+
+
+def test_rollback(appcmd, config):
+    before = open(config, 'rb').read()
+    fail, xfail, cmdline, out = appcmd.cfg(
+        "/+[name='one',value='1']",
+        "/+[name='missing'].child.[name='two']",
+        section='fastcgi',
+        commit='apphost',
+    )
+    assert fail and 'ERROR ( message:' in out
+    assert appcmd.document.root.find('system.webServer/fastCgi/add') is None
+    assert not appcmd.document.dirty
+    assert not appcmd.save()
+    assert open(config, 'rb').read() == before
+
+
+def test_unsupported_command(appcmd):
+    fail, xfail, cmdline, out = appcmd('start', 'site', '/site.name:WebSite1')
+    assert fail and 'Unsupported command' in out
+
+
+def test_save_atomic(appcmd, config, monkeypatch):
+    before = open(config, 'rb').read()
+    appcmd.unlock('windowsAuthentication')
+
+    def fail(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(os, 'replace', fail)
+    with pytest.raises(OSError):
+        appcmd.save()
+    assert open(config, 'rb').read() == before
+    assert os.listdir(os.path.dirname(config)) == ['applicationhost.config']
+    monkeypatch.undo()
+    assert appcmd.save()
+    assert os.listdir(os.path.dirname(config)) == ['applicationhost.config']
+    # comments are kept
+    assert 'Trimmed IIS Express' in open(config).read()
+    parse(config)
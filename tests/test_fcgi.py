@@ -0,0 +1,245 @@
+import time
+import socket
+import threading
+import pytest
+from zart.windows import fcgi
+
+TIMEOUT = 5.0
+
+
+class Client(object):
+    'FastCGI client of web server side'
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.sock.settimeout(TIMEOUT)
+        self.stream = fcgi.Stream(sock)
+        self.stdout = {}
+
+    def send(self, type, request_id, data=b''):
+        self.sock.sendall(b''.join(fcgi.records(type, request_id, data)))
+
+    def begin(self, request_id, path='/', body=b'', keep=True, stdin=True):
+        'Send request, all of it unless `stdin` is false'
+        flags = fcgi.KEEP_CONN if keep else 0
+        self.send(
+            fcgi.BEGIN_REQUEST,
+            request_id,
+            fcgi.BEGIN_BODY.pack(fcgi.RESPONDER, flags),
+        )
+        params = {
+            b'REQUEST_METHOD': b'POST' if body else b'GET',
+            b'PATH_INFO': path.encode(),
+            b'CONTENT_LENGTH': str(len(body)).encode(),
+        }
+        self.send(fcgi.PARAMS, request_id, fcgi.write_pairs(params.items()))
+        self.send(fcgi.PARAMS, request_id)
+        if body:
+            self.send(fcgi.STDIN, request_id, body)
+        if stdin:
+            self.send(fcgi.STDIN, request_id)
+
+    def end(self):
+        'Read records up to next END_REQUEST, return (id, stdout, status)'
+        while True:
+            record = self.stream.record()
+            assert record is not None, 'connection closed'
+            type, request_id, content = record
+            if type == fcgi.STDOUT:
+                self.stdout.setdefault(request_id, []).append(content)
+            elif type == fcgi.END_REQUEST:
+                app_status, status = fcgi.END_BODY.unpack(content)
+                stdout = b''.join(self.stdout.pop(request_id, []))
+                return request_id, stdout, status
+
+    def record(self):
+        return self.stream.record()
+
+    def closed(self):
+        'Whether responder closed the connection, times out if it did not'
+        return not self.stream.buffer and self.sock.recv(1) == b''
+
+
+class App(object):
+    '''WSGI application: /echo, /wait for `release`, /stream until
+    aborted, /error raises'''
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.aborted = threading.Event()
+        self.calls = []
+
+    def __call__(self, environ, start_response):
+        path = environ['PATH_INFO']
+        self.calls.append(path)
+        if path == '/wait':
+            self.release.wait(TIMEOUT)
+        if path == '/error':
+            raise ValueError('boom')
+        if path == '/stream':
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return self.stream()
+        size = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(size)
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return [path.encode(), b':', body]
+
+    def stream(self):
+        try:
+            for i in range(int(TIMEOUT / 0.01)):
+                yield b'.'
+                time.sleep(0.01)
+        except GeneratorExit:
+            self.aborted.set()
+            raise
+
+
+@pytest.fixture
+def app():
+    return App()
+
+
+@pytest.fixture
+def server(app):
+    server = fcgi.Server(app, threads=4)
+    yield server
+    server.pool.shutdown(wait=False)
+
+
+def serve(server, sock):
+    thread = threading.Thread(target=server.serve_connection, args=(sock,))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def client(server):
+    ours, theirs = socket.socketpair()
+    client = Client(ours)
+    client.thread = serve(server, theirs)
+    yield client
+    ours.close()
+    client.thread.join(TIMEOUT)
+
+
+def body(stdout):
+    return stdout.partition(b'\r\n\r\n')[2]
+
+
+@pytest.mark.parametrize('family', ['tcp', 'unix'])
+def test_listen(server, tmp_path, family):
+    if family == 'unix':
+        if not hasattr(socket, 'AF_UNIX'):
+            pytest.skip('no unix sockets')
+        listener = fcgi.listen('unix:%s' % (tmp_path / 'fcgi.sock'))
+    else:
+        listener = fcgi.listen('127.0.0.1:0')
+    with listener:
+        sock = socket.socket(listener.family, socket.SOCK_STREAM)
+        sock.connect(listener.getsockname())
+        conn, addr = listener.accept()
+    thread = serve(server, conn)
+    client = Client(sock)
+    client.begin(1, '/echo', b'data', keep=False)
+    request_id, stdout, status = client.end()
+    assert (request_id, status) == (1, fcgi.REQUEST_COMPLETE)
+    assert stdout.startswith(b'Status: 200 OK\r\n')
+    assert body(stdout) == b'/echo:data'
+    # without KEEP_CONN, responder closes connection
+    assert client.closed()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive()
+    sock.close()
+
+
+def test_get_values(client):
+    client.send(
+        fcgi.GET_VALUES,
+        0,
+        fcgi.write_pairs(
+            (name, b'')
+            for name in (
+                b'FCGI_MAX_CONNS',
+                b'FCGI_MAX_REQS',
+                b'FCGI_MPXS_CONNS',
+                b'FCGI_UNKNOWN',
+            )
+        ),
+    )
+    type, request_id, content = client.record()
+    assert (type, request_id) == (fcgi.GET_VALUES_RESULT, 0)
+    assert dict(fcgi.read_pairs(content)) == {
+        b'FCGI_MAX_CONNS': b'4',
+        b'FCGI_MAX_REQS': b'4',
+        b'FCGI_MPXS_CONNS': b'1',
+    }
+
+
+def test_multiplexed(client, app):
+    client.begin(1, '/wait')
+    client.begin(2, '/echo', b'x' * 100000)
+    # second request is answered while first one is running
+    request_id, stdout, status = client.end()
+    assert request_id == 2
+    assert body(stdout) == b'/echo:' + b'x' * 100000
+    app.release.set()
+    request_id, stdout, status = client.end()
+    assert (request_id, body(stdout)) == (1, b'/wait:')
+    # connection is kept, request ids are reused
+    client.begin(1, '/echo', b'again')
+    request_id, stdout, status = client.end()
+    assert (request_id, body(stdout)) == (1, b'/echo:again')
+
+
+def test_close_after_running_requests(client, app):
+    client.begin(1, '/wait')
+    client.begin(2, '/wait')
+    # web server closes its end, reader stops, requests still complete
+    client.sock.shutdown(socket.SHUT_WR)
+    client.thread.join(TIMEOUT)
+    app.release.set()
+    assert sorted(client.end()[0] for i in range(2)) == [1, 2]
+    assert client.closed()
+
+
+def test_abort_before_stdin(client, app):
+    client.begin(1, '/echo', b'partial', stdin=False)
+    client.send(fcgi.ABORT_REQUEST, 1)
+    request_id, stdout, status = client.end()
+    assert (request_id, stdout, status) == (1, b'', fcgi.REQUEST_COMPLETE)
+    assert app.calls == []
+    # connection is still usable
+    client.begin(2, '/echo')
+    assert client.end()[0] == 2
+
+
+def test_abort_running(client, app):
+    client.begin(1, '/stream')
+    type, request_id, content = client.record()
+    assert (type, request_id) == (fcgi.STDOUT, 1)
+    client.send(fcgi.ABORT_REQUEST, 1)
+    request_id, stdout, status = client.end()
+    assert request_id == 1
+    assert app.aborted.wait(TIMEOUT)
+
+
+def test_unknown_role(client):
+    client.send(fcgi.BEGIN_REQUEST, 1, fcgi.BEGIN_BODY.pack(3, 0))
+    request_id, stdout, status = client.end()
+    assert (request_id, status) == (1, fcgi.UNKNOWN_ROLE)
+
+
+def test_application_error(client):
+    client.begin(1, '/error')
+    errors = []
+    while True:
+        type, request_id, content = client.record()
+        if type == fcgi.STDERR:
+            errors.append(content)
+        elif type == fcgi.STDOUT:
+            if content:
+                assert content.startswith(b'Status: 500 ')
+        elif type == fcgi.END_REQUEST:
+            break
+    assert b'ValueError: boom' in b''.join(errors)
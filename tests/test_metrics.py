@@ -0,0 +1,43 @@
+from zart.windows.metrics import RequestStats
+
+STARTED = 'Request started: "GET" http://localhost:8080/%s'
+ENDED = 'Request ended: "http://localhost:8080/%s" with HTTP status 200.0'
+
+
+def test_latency():
+    stats = RequestStats(clock=lambda: 0.0)
+    assert stats.feed(STARTED % 'a', 1.0) is None
+    request = stats.feed(ENDED % 'a', 1.25)
+    assert (request.method, request.path, request.status) == ('GET', '/a', 200)
+    assert request.time == 250.0
+    assert stats.pending == {}
+
+
+def test_pending_capped():
+    stats = RequestStats(clock=lambda: 0.0, max_pending=3)
+    for i in range(10):
+        stats.feed(STARTED % 'a', float(i))
+    assert len(stats.pending['http://localhost:8080/a']) == 3
+    # oldest were dropped
+    assert stats.feed(ENDED % 'a', 10.0).time == 3000.0
+
+
+def test_pending_expire():
+    stats = RequestStats(clock=lambda: 0.0, timeout=60.0)
+    stats.feed(STARTED % 'a', 1.0)
+    stats.feed(STARTED % 'b', 1.0)
+    # aborted request is not paired with later one
+    stats.feed(STARTED % 'a', 100.0)
+    assert list(stats.pending) == ['http://localhost:8080/a']
+    assert stats.feed(ENDED % 'a', 100.5).time == 500.0
+    assert stats.pending == {}
+    # ended request without start has no latency
+    assert stats.feed(ENDED % 'b', 101.0).time is None
+
+
+def test_clear_pending():
+    stats = RequestStats(clock=lambda: 0.0)
+    stats.feed(STARTED % 'a', 1.0)
+    stats.clear_pending()
+    assert stats.feed(ENDED % 'a', 2.0).time is None
+    assert stats.requests == 1
@@ -0,0 +1,61 @@
+import os
+import sys
+from zart.windows.appcmd import AppCmd
+from zart.windows.plan import Plan
+
+FAKE = [
+    sys.executable,
+    os.path.join(os.path.dirname(__file__), 'fake_appcmd.py'),
+]
+
+
+def times(result):
+    'start and end time printed by fake appcmd'
+    return tuple(float(x) for x in result[3].split()[-2:])
+
+
+def test_independent_steps_overlap():
+    plan = Plan()
+    appcmd = plan.bind(AppCmd(FAKE))
+    for path in ('WebSite1/static', 'WebSite1/media'):
+        appcmd.cfg(path, section='staticContent', sleep='0.5')
+    assert [step.deps for step in plan.steps] == [[], []]
+    results = list(plan.run(workers=2))
+    assert [r[0] for r in results] == [False, False]
+    (start1, end1), (start2, end2) = map(times, results)
+    assert start2 < end1 and start1 < end2
+
+
+def test_results_in_submission_order():
+    plan = Plan()
+    appcmd = plan.bind(AppCmd(FAKE))
+    appcmd.cfg('WebSite1/slow', section='staticContent', sleep='0.5')
+    appcmd.cfg('WebSite1/fast', section='staticContent')
+    results = list(plan.run(workers=2))
+    assert ['slow' in r[2] for r in results] == [True, False]
+    # second step finished first
+    assert times(results[1])[1] < times(results[0])[1]
+
+
+def test_failure_stops_dependent_steps():
+    plan = Plan()
+    appcmd = plan.bind(AppCmd(FAKE))
+    appcmd.cfg('WebSite1/static', section='staticContent', fail='1')
+    appcmd.cfg('WebSite1/media', section='staticContent', sleep='0.3')
+    appcmd.cfg('WebSite1/static', section='staticContent')
+    assert [step.deps for step in plan.steps] == [[], [], [0]]
+    results = list(plan.run(workers=2))
+    assert [(r[0], r[1]) for r in results] == [(True, None), (False, None)]
+    assert results[0][3].startswith('ERROR (')
+    assert 'media' in results[1][2]
+
+
+def test_expected_failure_does_not_stop():
+    plan = Plan()
+    appcmd = plan.bind(AppCmd(FAKE))
+    appcmd.cfg(
+        'WebSite1/static', section='staticContent', fail='1', _xfail=True
+    )
+    appcmd.cfg('WebSite1/static', section='staticContent')
+    results = list(plan.run(workers=2))
+    assert [(r[0], r[1]) for r in results] == [(True, True), (False, None)]
@@ -0,0 +1,81 @@
+import socket
+import threading
+import pytest
+from zart.djsite.server import Handler, Worker, bind
+
+
+def echo(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response(
+        '200 OK',
+        [('Content-Type', 'text/plain'), ('Content-Length', str(len(body)))],
+    )
+    return [body]
+
+
+@pytest.fixture
+def worker():
+    listener = bind('127.0.0.1:0')
+    yield Worker(listener, echo)
+    listener.close()
+
+
+def exchange(worker, data):
+    'Serve raw request on connection, return (response, kept)'
+    ours, theirs = socket.socketpair()
+    ours.settimeout(5.0)
+    handler = Handler(theirs, ('127.0.0.1', 0), worker)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(handler.serve()))
+    thread.start()
+    ours.sendall(data)
+    thread.join(5.0)
+    handler.close()
+    response = b''
+    while True:
+        chunk = ours.recv(65536)
+        if not chunk:
+            break
+        response += chunk
+    ours.close()
+    return response, result[0]
+
+
+def request(*headers, body=b''):
+    return b'\r\n'.join(
+        (b'POST / HTTP/1.1', b'Host: localhost') + headers + (b'', body)
+    )
+
+
+def test_content_length(worker):
+    response, kept = exchange(
+        worker, request(b'Content-Length: 5', body=b'hello')
+    )
+    assert response.startswith(b'HTTP/1.1 200 ')
+    assert response.endswith(b'\r\n\r\nhello')
+    assert kept
+
+
+def test_repeated_content_length(worker):
+    response, kept = exchange(
+        worker,
+        request(b'Content-Length: 5', b'Content-Length: 5', body=b'hello'),
+    )
+    assert response.endswith(b'\r\n\r\nhello')
+
+
+@pytest.mark.parametrize(
+    'headers',
+    [
+        (b'Content-Length: abc',),
+        (b'Content-Length: -5',),
+        (b'Content-Length: +5',),
+        (b'Content-Length: 5, 6',),
+        (b'Content-Length: 5', b'Content-Length: 6'),
+    ],
+)
+def test_bad_content_length(worker, headers):
+    response, kept = exchange(worker, request(*headers, body=b'hello'))
+    assert response.startswith(b'HTTP/1.1 400 ')
+    assert b'\r\nConnection: close\r\n' in response
+    assert not kept
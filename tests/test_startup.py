@@ -0,0 +1,49 @@
+import os
+import sys
+import subprocess
+import pytest
+from zart.djsite import startup
+
+SRC = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(startup.__file__)))
+)
+
+
+def importtime_supported():
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import json'],
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    return 'import time:' in process.stderr
+
+
+@pytest.fixture
+def environment(monkeypatch, tmp_path):
+    'Package importable by child interpreters, command cache of its own'
+    path = os.getenv('PYTHONPATH')
+    monkeypatch.setenv(
+        'PYTHONPATH', SRC + (os.pathsep + path if path else '')
+    )
+    monkeypatch.setenv(
+        'DJSITE_COMMAND_CACHE', str(tmp_path / 'commands.json')
+    )
+
+
+@pytest.mark.skipif(
+    not importtime_supported(), reason='-X importtime is not supported'
+)
+def test_budgets(environment):
+    results = startup.bench(repeat=3)
+    assert len(results) == len(startup.STARTUPS)
+    for name, (imports, wall, modules, budget) in sorted(results.items()):
+        assert imports is not None, '%s failed:\n%s' % (name, modules)
+        slowest = '\n'.join(
+            '%7.1f ms %s' % (ms, module) for module, ms in modules
+        )
+        assert imports <= budget, '%s: %.1f ms of imports, over %.1f:\n%s' % (
+            name,
+            imports,
+            budget,
+            slowest,
+        )
@@ -0,0 +1,95 @@
+import os
+import re
+import sys
+from zart.windows.supervisor import Supervisor
+
+FAKE = [
+    sys.executable,
+    '-u',
+    os.path.join(os.path.dirname(__file__), 'fake_iisexpress.py'),
+]
+
+
+def run(supervisor):
+    'Run supervisor, return output lines and reported events'
+    lines, events = [], []
+    returncode = supervisor.run(
+        lambda now, batch: lines.extend(batch),
+        lambda message, ok: events.append((message, ok)),
+    )
+    return returncode, lines, events
+
+
+def test_ready():
+    supervisor = Supervisor(FAKE + ['--exit', '1'])
+    returncode, lines, events = run(supervisor)
+    assert returncode == 1
+    assert 'IIS Express is running.' in lines
+    assert supervisor.ready >= supervisor.started
+    assert re.match(r'http://127\.0\.0\.1:\d+/$', supervisor.urls[0])
+    assert len(events) == 1
+    message, ok = events[0]
+    assert re.match(r'Ready in \d+\.\d{3}s$', message) and ok
+
+
+def test_warmup():
+    supervisor = Supervisor(
+        FAKE + ['--serve', '2', '--delay', '0.1'],
+        warmup=['/', 'missing'],
+    )
+    returncode, lines, events = run(supervisor)
+    assert returncode == 0
+    base = supervisor.urls[0]
+    assert [ok for message, ok in events] == [True, True, True]
+    first, second = [message for message, ok in events[1:]]
+    match = re.match(
+        r'Warmup (\S+) 200: first byte (\d+)ms, total (\d+)ms$', first
+    )
+    assert match.group(1) == base
+    assert 100 <= int(match.group(2)) <= int(match.group(3))
+    assert second.startswith('Warmup %smissing 404: ' % base)
+
+
+def test_warmup_failure():
+    supervisor = Supervisor(FAKE, warmup=['/'], timeout=5.0)
+    returncode, lines, events = run(supervisor)
+    assert returncode == 0
+    message, ok = events[-1]
+    assert message.startswith('Warmup http://127.0.0.1:') and not ok
+    assert 'failed' in message
+
+
+def test_restart_backoff(tmp_path):
+    counter = str(tmp_path / 'runs')
+    supervisor = Supervisor(
+        FAKE + ['--crash', counter, '4'],
+        restart=True,
+        backoff=0.1,
+        max_backoff=0.4,
+    )
+    restarted = []
+    events = []
+    returncode = supervisor.run(
+        lambda now, batch: None,
+        lambda message, ok: events.append((message, ok)),
+        lambda: restarted.append(supervisor.restarts),
+    )
+    assert returncode == 0
+    assert supervisor.restarts == 4
+    assert restarted == [1, 2, 3, 4]
+    delays = [
+        float(m.group(1))
+        for m in (
+            re.match(r'Exited with code 0x00000003, restarting in (\S+)s', e)
+            for e, ok in events
+        )
+        if m
+    ]
+    assert delays == [0.1, 0.2, 0.4, 0.4]
+    assert sum(e.startswith('Ready') for e, ok in events) == 5
+
+
+def test_no_restart_on_success():
+    supervisor = Supervisor(FAKE, restart=True)
+    returncode, lines, events = run(supervisor)
+    assert returncode == 0 and supervisor.restarts == 0